@@ -0,0 +1,243 @@
+"""
+Microbenchmarks for the DB layer and the HTTP endpoints
+
+Builds synthetic narrow and wide tables in a scratch database, times DBHandler methods and the
+Flask routes (through the test client), writes the timings as JSON and optionally compares them
+against a stored baseline.
+
+Usage (from the repository root):
+    python benchmarks/notelab/benchmark.py --rows 1000,100000 --output results.json
+    python benchmarks/notelab/benchmark.py --baseline benchmarks/baseline.json --fail-on-regression
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, List, Optional
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+# Table shapes: column definitions after the integer primary key
+SHAPES = {
+    'narrow': ['category INTEGER', 'value REAL', 'label TEXT'],
+    'wide': [f'int_{i} INTEGER' for i in range(10)] + [f'real_{i} REAL' for i in range(10)] + [f'text_{i} TEXT' for i in range(10)],
+}
+
+# Above this many rows, benchmarks that materialise a whole table are skipped
+MAX_MATERIALISED_ROWS = 1_000_000
+GENERATION_CHUNK = 50_000
+WRITE_BATCH = 1_000
+
+
+def prepare_environment(workdir: str, cache: bool) -> str:
+    # AppConfig reads .env and res/endpoints.yml from the working directory, so the scratch
+    # directory gets its own .env pointing at the benchmark database
+    db_path = os.path.join(workdir, 'benchmark.db')
+    sqlite3.connect(db_path).close()
+    with open(os.path.join(workdir, '.env'), 'w') as env:
+        env.write(f"HOST=localhost\nFLASK_PORT=5000\nDB_PATH={db_path}\nLOG_LEVEL=WARNING\n")
+        if not cache:
+            env.write("RESULT_CACHE_MAX_BYTES=0\n")
+    os.symlink(os.path.join(REPO_ROOT, 'res'), os.path.join(workdir, 'res'))
+    os.chdir(workdir)
+    sys.path.insert(0, os.path.join(REPO_ROOT, 'src'))
+    return db_path
+
+
+def generate_rows(shape: str, start: int, count: int, seed: int) -> Iterator[List[list]]:
+    rng = random.Random(seed + start)
+    columns = SHAPES[shape]
+    for chunk_start in range(start, start + count, GENERATION_CHUNK):
+        chunk = []
+        for row_id in range(chunk_start, min(chunk_start + GENERATION_CHUNK, start + count)):
+            row = [row_id]
+            for column in columns:
+                declared = column.split()[1]
+                if declared == 'INTEGER':
+                    row.append(rng.randrange(100))
+                elif declared == 'REAL':
+                    row.append(rng.random() * 1000)
+                else:
+                    row.append(f"label-{rng.randrange(1000)}")
+            chunk.append(row)
+        yield chunk
+
+
+def time_call(func: Callable[[], object], repeat: int, warmup: int = 1) -> Dict[str, float]:
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {
+        "min": samples[0],
+        "median": statistics.median(samples),
+        "mean": statistics.fmean(samples),
+        "max": samples[-1],
+        "repeat": repeat,
+    }
+
+
+def checked(result, expected_status: int = 200):
+    status = result[1] if isinstance(result, tuple) else result.status_code
+    if status != expected_status:
+        raise RuntimeError(f"Unexpected status {status}: {result}")
+    return result
+
+
+def run_db_benchmarks(db, table: str, shape: str, rows: int, repeat: int, results: dict, seed: int) -> None:
+    rng = random.Random(seed)
+    filter_column = 'category' if shape == 'narrow' else 'int_0'
+    key = f"{shape},{rows}"
+    next_id = [rows]
+
+    def record(name: str, func: Callable[[], object]) -> None:
+        results[f"db.{name}[{key}]"] = time_call(func, repeat)
+
+    record('get_row', lambda: checked(db.get_row(table, rng.randrange(rows))))
+    record('get_rows_filtered', lambda: checked(db.get_rows(table, filters=[(filter_column, str(rng.randrange(100)))])))
+    record('get_rows_page', lambda: checked(db.get_rows(table, limit=100)))
+    if rows <= MAX_MATERIALISED_ROWS:
+        record('get_table', lambda: checked(db.get_table(table)))
+        record('stream_table', lambda: sum(len(batch) for batch in checked(db.stream_table(table))[0].batches()))
+
+    def insert_batch():
+        batch = next(generate_rows(shape, next_id[0], WRITE_BATCH, seed))
+        next_id[0] += WRITE_BATCH
+        checked(db.insert_rows(table, batch), 201)
+
+    def update_batch():
+        ids = rng.sample(range(rows), min(WRITE_BATCH, rows))
+        checked(db.update_rows(table, [{'id': row_id, filter_column: rng.randrange(100)} for row_id in ids]))
+
+    record(f'insert_rows_{WRITE_BATCH}', insert_batch)
+    record(f'update_rows_{WRITE_BATCH}', update_batch)
+
+
+def run_http_benchmarks(client, table: str, shape: str, rows: int, repeat: int, results: dict, seed: int) -> None:
+    rng = random.Random(seed)
+    filter_column = 'category' if shape == 'narrow' else 'int_0'
+    key = f"{shape},{rows}"
+    root = '/api/db'
+
+    def get(url: str, headers: Optional[dict] = None):
+        return checked(client.get(root + url, base_url='https://localhost', headers=headers or {}))
+
+    def record(name: str, func: Callable[[], object]) -> None:
+        results[f"http.{name}[{key}]"] = time_call(func, repeat)
+
+    record('GET row', lambda: get(f"/{table}/{rng.randrange(rows)}"))
+    record('GET rows filtered', lambda: get(f"/{table}/rows?{filter_column}={rng.randrange(100)}"))
+    record('GET rows page', lambda: get(f"/{table}/rows?limit=100"))
+    if rows <= MAX_MATERIALISED_ROWS:
+        record('GET table json', lambda: get(f"/{table}"))
+        record('GET table ndjson', lambda: get(f"/{table}?format=ndjson").get_data())
+
+    def put_rows():
+        ids = rng.sample(range(rows), min(WRITE_BATCH, rows))
+        body = {"rows": [{'id': row_id, filter_column: rng.randrange(100)} for row_id in ids]}
+        checked(client.put(f"{root}/{table}/rows", json=body, base_url='https://localhost'))
+
+    record(f'PUT rows {WRITE_BATCH}', put_rows)
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> List[dict]:
+    report = []
+    for name, timing in sorted(results.items()):
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        ratio = timing["median"] / previous["median"] if previous["median"] else float('inf')
+        report.append({"name": name, "baseline": previous["median"], "current": timing["median"], "ratio": ratio,
+                       "regressed": ratio > 1 + threshold})
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', default='1000,100000', help='Comma-separated table sizes, e.g. 1000,100000,10000000')
+    parser.add_argument('--shapes', default='narrow,wide', help='Comma-separated table shapes: narrow, wide')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per benchmark')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--no-http', action='store_true', help='Only time DBHandler methods')
+    parser.add_argument('--cache', action='store_true', help='Keep the result cache enabled (disabled by default)')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--baseline', help='Compare the results against this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Median slowdown counted as a regression (0.2 = 20%%)')
+    parser.add_argument('--fail-on-regression', action='store_true', help='Exit with status 1 if a benchmark regressed')
+    args = parser.parse_args(argv)
+
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    output_path = os.path.abspath(args.output) if args.output else None
+
+    with tempfile.TemporaryDirectory(prefix='notelab-bench-') as workdir:
+        prepare_environment(workdir, args.cache)
+        from notelab.db.db_handler import DBHandler
+        db = DBHandler('database')
+        client = None
+        if not args.no_http:
+            from notelab.app.app import app
+            client = app.test_client()
+
+        results: Dict[str, dict] = {}
+        for shape in args.shapes.split(','):
+            for rows in (int(size) for size in args.rows.split(',')):
+                table = f"bench_{shape}_{rows}"
+                start = time.perf_counter()
+                checked(db.create_table(table, ['id INTEGER PRIMARY KEY'] + SHAPES[shape]), 201)
+                report, _ = checked(db.bulk_insert(table, ['id'] + [column.split()[0] for column in SHAPES[shape]],
+                                                   generate_rows(shape, 0, rows, args.seed)), 201)
+                print(f"Generated {table}: {rows} rows in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+                results[f"db.bulk_insert[{shape},{rows}]"] = {"min": report["seconds"], "median": report["seconds"],
+                                                             "mean": report["seconds"], "max": report["seconds"], "repeat": 1}
+
+                run_db_benchmarks(db, table, shape, rows, args.repeat, results, args.seed)
+                if client is not None:
+                    run_http_benchmarks(client, table, shape, rows, args.repeat, results, args.seed)
+                db.drop_table(table)
+        db.close()
+
+    output = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    for name, timing in results.items():
+        print(f"{name:60s} median {timing['median'] * 1000:10.3f} ms")
+
+    if output_path:
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        with open(output_path, 'w') as file:
+            json.dump(output, file, indent=2)
+        print(f"Results written to {output_path}", file=sys.stderr)
+
+    if baseline_path:
+        with open(baseline_path) as file:
+            baseline = json.load(file)["results"]
+        comparison = compare(results, baseline, args.threshold)
+        for entry in comparison:
+            flag = 'REGRESSED' if entry["regressed"] else ''
+            print(f"{entry['name']:60s} {entry['ratio']:6.2f}x {flag}")
+        if args.fail_on_regression and any(entry["regressed"] for entry in comparison):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,25 @@
+#!/bin/bash
+
+echo "Running benchmarks..."
+
+PYTHONPATH=$(pwd)/src
+export PYTHONPATH
+
+RESULTS_DIR=benchmarks/results
+BASELINE=benchmarks/baseline.json
+mkdir -p "$RESULTS_DIR"
+output="$RESULTS_DIR/$(date +%Y%m%d-%H%M%S).json"
+
+args=(--output "$output" "$@")
+if [ -f "$BASELINE" ]; then
+  args+=(--baseline "$BASELINE")
+else
+  echo "No baseline found, copy a results file to $BASELINE to compare future runs against it."
+fi
+
+python benchmarks/notelab/benchmark.py "${args[@]}"
+status=$?
+
+echo "Benchmark results written to $output"
+
+exit $status
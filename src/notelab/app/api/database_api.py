@@ -3,80 +3,305 @@ This class is responsible for formulating and making requests to the server.
 It is used for internal API requests
 """
 
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import pandas as pd
 import requests
-from utils.app_config import AppConfig
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from notelab.utils.app_config import AppConfig
+from notelab.utils.app_logger import setup_logger
+from notelab.utils.pandas_to_sql import apply_schema_dtypes
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - depends on the environment
+    pa = None
 
 config = AppConfig()
 server_url = config.server_url
 endpoints = config.database_endpoints
 root = endpoints.root
+logger = setup_logger('DatabaseAPI')
 
-method_to_request_function_map = {
-    'get': requests.get,
-    'post': requests.post,
-    'delete': requests.delete,
-    'put': requests.put,
-}
+# The API blueprint prefix in app.py
+API_PREFIX = '/api'
 
-"""Replaces parameter placeholders with the corresponding values"""
+# Only idempotent requests are retried once sent; a connection that failed before sending is always retried
+RETRY_METHODS = frozenset({'GET', 'PUT', 'DELETE'})
+RETRY_STATUSES = (502, 503, 504)
+
+"""Replaces parameter placeholders, e.g. <string:table_name> or <int:row_id>, with the corresponding values"""
 def format_endpoint_template(endpoint_template: str, **params) -> str:
     for key, value in params.items():
-        placeholder = f"<string:{key}>"
-        endpoint_template = endpoint_template.replace(placeholder, value)
+        placeholder = re.compile(rf"<(?:\w+:)?{key}>")
+        endpoint_template = placeholder.sub(requests.utils.quote(str(value), safe=''), endpoint_template)
     return endpoint_template
 
-"""Makes the request to the server"""
-def _make_request(endpoint, method, params=None) -> tuple[dict, int]:
-    try:
-        request_url = f"{server_url}{endpoint}"
-        request_func = method_to_request_function_map.get(method.lower())
-        if not request_func:
-            raise ValueError(f"Unsupported HTTP method: {method}")
-        response = request_func(url=request_url, json=params)
+
+class DatabaseClient:
+    """
+    Keeps a requests.Session so calls reuse pooled keep-alive connections instead of opening a new TLS
+    connection each, retries failed requests with exponential backoff, and fans bulk operations out over a thread pool
+    """
+
+    def __init__(self, base_url: Optional[str] = None, connect_timeout: Optional[float] = None, read_timeout: Optional[float] = None,
+                 retries: Optional[int] = None, backoff_factor: Optional[float] = None, pool_size: Optional[int] = None,
+                 max_workers: Optional[int] = None, verify: Any = None):
+        self.base_url = (base_url or server_url).rstrip('/')
+        self.timeout = (connect_timeout or config.api_connect_timeout, read_timeout or config.api_read_timeout)
+        self.max_workers = max_workers or config.api_max_workers
+        retries = config.api_retries if retries is None else retries
+        retry = Retry(
+            total=retries, connect=retries, read=retries, status=retries,
+            backoff_factor=config.api_backoff_factor if backoff_factor is None else backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=RETRY_METHODS,
+            raise_on_status=False,
+        )
+        # Every fan-out worker may hold a connection at once, so the pool is at least that large
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(pool_size or config.api_pool_size, self.max_workers), max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        # Passed with every request: a session-level setting loses to REQUESTS_CA_BUNDLE in the environment
+        self.verify = verify if verify is not None else (config.api_ca_bundle or True)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    def __enter__(self) -> 'DatabaseClient':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    """Closes the pooled connections and stops the fan-out threads"""
+    def close(self) -> None:
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+        self.session.close()
+
+    def _url(self, endpoint: str) -> str:
+        return f"{self.base_url}{API_PREFIX}{root}{endpoint}"
+
+    def _send(self, method: str, request_url: str, params: Optional[dict] = None, query: Optional[dict] = None,
+              stream: bool = False) -> requests.Response:
+        return self.session.request(method.upper(), request_url, json=params, params=query, timeout=self.timeout,
+                                    verify=self.verify, stream=stream)
+
+    """Makes the request to the server"""
+    def _make_request(self, endpoint: str, method: str, params: Optional[dict] = None, query: Optional[dict] = None) -> Tuple[Any, int]:
+        request_url = self._url(endpoint)
+        try:
+            response = self._send(method, request_url, params, query)
+            response.raise_for_status()
+            return response.json(), response.status_code
+
+        except requests.exceptions.HTTPError as http_err:
+            logger.error("Request %s %s failed: %s", method, request_url, http_err)
+            try:
+                body = http_err.response.json()
+            except ValueError:
+                body = http_err.response.text
+            return {"error": str(http_err), "response": body}, http_err.response.status_code
+
+        except requests.exceptions.RequestException as req_err:
+            logger.error("Request %s %s failed: %s", method, request_url, req_err)
+            return {"error": str(req_err)}, 500
+
+        except Exception as e:
+            logger.error("Request %s %s failed: %s", method, request_url, e)
+            return {"error": str(e)}, 500
+
+    """
+    Runs a call for every item on the client's thread pool
+    Parameters:
+        func (Callable) - Called with each item, typically one of the request methods below
+        items (Iterable) - The arguments, one call each
+    Returns:
+        The results in the order of the items
+    """
+    def map_concurrent(self, func: Callable[[Any], Tuple[Any, int]], items: Iterable[Any]) -> List[Tuple[Any, int]]:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='notelab-api')
+            executor = self._executor
+        return list(executor.map(func, items))
+
+    """Requests a list of tables from the Database"""
+    def get_tables(self) -> Tuple[Any, int]:
+        return self._make_request(endpoints.tables, 'GET')
+
+    """Requests the rows of a table from the Database"""
+    def get_table(self, table_name: str) -> Tuple[Any, int]:
+        endpoint = format_endpoint_template(endpoints.table, table_name=table_name)
+        return self._make_request(endpoint, 'GET')
+
+    """Requests the rows of a table matching the filters, e.g. {"age__gt": 30, "limit": 100}"""
+    def get_rows(self, table_name: str, filters: Optional[dict] = None) -> Tuple[Any, int]:
+        endpoint = format_endpoint_template(endpoints.rows, table_name=table_name)
+        return self._make_request(endpoint, 'GET', query=filters)
+
+    """Requests a table's column definitions: (cid, name, type, notnull, default, pk) rows"""
+    def get_table_schema(self, table_name: str) -> Tuple[Any, int]:
+        endpoint = format_endpoint_template(endpoints.table_schema, table_name=table_name)
+        return self._make_request(endpoint, 'GET')
+
+    """
+    Reads a whole table into a DataFrame typed from the table schema
+    Parameters:
+        table_name (str) - The table to read
+    Returns:
+        - A DataFrame, or an error message
+        - HTTP Status Code (int)
+    """
+    def read_table_df(self, table_name: str) -> Tuple[Any, int]:
+        endpoint = format_endpoint_template(endpoints.table, table_name=table_name)
+        return self._read_df(table_name, endpoint, {})
+
+    """
+    Reads the rows of a table matching the filters, e.g. {"age__gt": 30}, into a DataFrame typed from the table schema
+    Returns:
+        - A DataFrame, or an error message
+        - HTTP Status Code (int)
+    """
+    def read_rows_df(self, table_name: str, filters: Optional[dict] = None) -> Tuple[Any, int]:
+        endpoint = format_endpoint_template(endpoints.rows, table_name=table_name)
+        return self._read_df(table_name, endpoint, dict(filters or {}))
+
+    # Streams Arrow record batches when pyarrow is installed on both ends, the columnar JSON layout otherwise
+    def _read_df(self, table_name: str, endpoint: str, query: dict) -> Tuple[Any, int]:
+        schema, status = self.get_table_schema(table_name)
+        if status != 200:
+            return schema, status
+        request_url = self._url(endpoint)
+        try:
+            df = None
+            if pa is not None:
+                df = self._read_arrow(request_url, query)
+            if df is None:
+                df = self._read_columnar(request_url, query)
+            return apply_schema_dtypes(df, schema), 200
+
+        except requests.exceptions.HTTPError as http_err:
+            logger.error("Request GET %s failed: %s", request_url, http_err)
+            return {"error": str(http_err)}, http_err.response.status_code
+
+        except Exception as e:
+            logger.error("Request GET %s failed: %s", request_url, e)
+            return {"error": str(e)}, 500
+
+    def _read_arrow(self, request_url: str, query: dict) -> Optional[pd.DataFrame]:
+        with self._send('GET', request_url, query={**query, 'format': 'arrow'}, stream=True) as response:
+            # The server answers 406 when it has no pyarrow
+            if response.status_code == 406:
+                return None
+            response.raise_for_status()
+            response.raw.decode_content = True
+            table = pa.ipc.open_stream(response.raw).read_all()
+        # self_destruct frees each Arrow column once converted, so the Arrow and pandas copies are not both held in full
+        return table.to_pandas(self_destruct=True, split_blocks=True, types_mapper={pa.int64(): pd.Int64Dtype()}.get)
+
+    def _read_columnar(self, request_url: str, query: dict) -> pd.DataFrame:
+        # One list per column, so the frame is built without a dictionary per row
+        response = self._send('GET', request_url, query={**query, 'format': 'columnar'})
         response.raise_for_status()
-        return response.json(), response.status_code
+        body = response.json()
+        return pd.DataFrame(body['data'], columns=body['columns'])
+
+    """Creates a table's column definitions in the Database"""
+    def create_table(self, table_name: str, columns: List[str]) -> Tuple[Any, int]:
+        endpoint = format_endpoint_template(endpoints.table, table_name=table_name)
+        return self._make_request(endpoint, 'POST', {'columns': columns})
 
-    except requests.exceptions.RequestException as req_err:
-        print(f"Request failed: {req_err}")
-        return {"error": str(req_err)}, 500
+    """Erases a table from the Database"""
+    def drop_table(self, table_name: str) -> Tuple[Any, int]:
+        endpoint = format_endpoint_template(endpoints.table, table_name=table_name)
+        return self._make_request(endpoint, 'DELETE')
 
-    except Exception as e:
-        print('Error occurred:', e)
-        return {"error": str(e)}, 500
+    """Inserts new rows into an existing table in the Database"""
+    def insert_rows(self, table_name: str, rows: list) -> Tuple[Any, int]:
+        endpoint = format_endpoint_template(endpoints.rows, table_name=table_name)
+        return self._make_request(endpoint, 'POST', {'rows': rows})
+
+    """Updates existing rows in an existing table in the Database, inserting unmatched rows if upsert is set"""
+    def update_rows(self, table_name: str, rows: list, upsert: bool = False) -> Tuple[Any, int]:
+        endpoint = format_endpoint_template(endpoints.rows, table_name=table_name)
+        return self._make_request(endpoint, 'PUT', {'rows': rows, 'upsert': upsert})
+
+    """
+    Inserts rows in chunks sent concurrently
+    Parameters:
+        table_name (str) - The table to insert into
+        rows (Sequence) - The rows to insert
+        chunk_size (int) - Rows per request
+    Returns:
+        One (result, status) per chunk, in order; chunks are independent, so a failed chunk does not undo the others
+    """
+    def insert_rows_concurrent(self, table_name: str, rows: Sequence, chunk_size: int = 1000) -> List[Tuple[Any, int]]:
+        chunks = [rows[start:start + chunk_size] for start in range(0, len(rows), chunk_size)]
+        return self.map_concurrent(lambda chunk: self.insert_rows(table_name, chunk), chunks)
+
+    """
+    Updates rows in chunks sent concurrently
+    Returns:
+        One (report, status) per chunk, in order
+    """
+    def update_rows_concurrent(self, table_name: str, rows: Sequence, chunk_size: int = 1000, upsert: bool = False) -> List[Tuple[Any, int]]:
+        chunks = [rows[start:start + chunk_size] for start in range(0, len(rows), chunk_size)]
+        return self.map_concurrent(lambda chunk: self.update_rows(table_name, chunk, upsert), chunks)
+
+    """
+    Fetches several tables concurrently
+    Returns:
+        A dictionary of table name to (rows, status)
+    """
+    def get_tables_concurrent(self, table_names: Iterable[str]) -> Dict[str, Tuple[Any, int]]:
+        table_names = list(table_names)
+        return dict(zip(table_names, self.map_concurrent(self.get_table, table_names)))
+
+
+_client: Optional[DatabaseClient] = None
+_client_lock = threading.Lock()
+
+"""Returns the shared client used by the module-level functions below"""
+def get_client() -> DatabaseClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = DatabaseClient()
+        return _client
 
 """Requests a list of tables from the Database"""
 def get_tables():
-    endpoint = root + endpoints['database']['tables']
-    method = 'GET'
-    return _make_request(endpoint, method)
+    return get_client().get_tables()
+
+"""Reads a whole table into a typed DataFrame"""
+def read_table_df(table_name):
+    return get_client().read_table_df(table_name)
+
+"""Reads the rows of a table matching the filters into a typed DataFrame"""
+def read_rows_df(table_name, filters=None):
+    return get_client().read_rows_df(table_name, filters)
 
 """Creates a table's column definitions in the Database"""
 def create_table(table_name, columns):
-    endpoint_template = root + endpoints['database']['table']
-    endpoint = format_endpoint_template(endpoint_template, table_name=table_name)
-    method = 'POST'
-    params = {'columns': columns}
-    return _make_request(endpoint, method, params)
+    return get_client().create_table(table_name, columns)
 
 """Erases a table from the Database"""
 def drop_table(table_name):
-    endpoint_template = root + endpoints['database']['table']
-    endpoint = format_endpoint_template(endpoint_template, table_name=table_name)
-    method = 'DELETE'
-    return _make_request(endpoint, method)
+    return get_client().drop_table(table_name)
 
 """Inserts new rows into an existing table in the Database"""
 def insert_rows(table_name, rows):
-    endpoint_template = root + endpoints['database']['rows']
-    endpoint = format_endpoint_template(endpoint_template, table_name=table_name)
-    method = 'POST'
-    params = {'rows': rows}
-    return _make_request(endpoint, method, params)
+    return get_client().insert_rows(table_name, rows)
 
 """Updates existing rows in an existing table in the Database"""
 def update_rows(table_name, rows):
-    endpoint_template = root + endpoints['database']['rows']
-    endpoint = format_endpoint_template(endpoint_template, table_name=table_name)
-    method = 'PUT'
-    params = {'rows': rows}
-    return _make_request(endpoint, method, params)
\ No newline at end of file
+    return get_client().update_rows(table_name, rows)
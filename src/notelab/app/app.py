@@ -1,13 +1,17 @@
 import logging
 import os
+import time
 from functools import wraps
 import flask
-from flask import Flask, request, redirect
+from flask import Flask, Response, g, request, redirect
 from flask_restx import Api
+from flask_restx.representations import output_json
 from flask_talisman import Talisman
 from notelab.app.routes import db_routes
+from notelab.app.routes.db import table_routes
 from notelab.utils.app_config import AppConfig
 from notelab.utils.app_logger import setup_logger
+from notelab.utils.metrics import http_request_seconds, http_response_bytes, registry, serialization_seconds
 
 config = AppConfig()
 app = Flask(__name__)
@@ -19,6 +23,11 @@ api = Api(
     doc='/docs'
 )
 
+@api.representation('application/json')
+def timed_output_json(data, code, headers=None):
+    with serialization_seconds.time(format='json'):
+        return output_json(data, code, headers)
+
 app.register_blueprint(api_bp)
 
 # Content Security Policy for Talisman
@@ -39,12 +48,13 @@ logger = setup_logger('App')
 app.logger.handlers = logger.handlers
 
 db_routes.init_routes(api)
+table_routes.init_routes(api)
 
 # Log all registered routes
 routes_logged = False
 if not routes_logged:
     for rule in app.url_map.iter_rules():
-        app.logger.info(f"Registered route: {rule}")
+        app.logger.info("Registered route: %s", rule)
     routes_logged = True
 
 reload_detected = False
@@ -52,6 +62,7 @@ reload_detected = False
 @app.before_request
 def before_request():
     global reload_detected
+    g.request_start = time.perf_counter()
     if 'werkzeug.server.shutdown' in request.environ:
         reload_detected = True
 
@@ -61,8 +72,22 @@ def after_request(response):
     if reload_detected:
         app.logger.info("Application reloaded")
         reload_detected = False
+    record_request(response)
     return response
 
+def record_request(response):
+    if 'request_start' not in g:
+        return
+    # The rule template, not the path, so the label set stays bounded
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    http_request_seconds.observe(time.perf_counter() - g.request_start, route=route, method=request.method, status=response.status_code)
+    if not response.is_streamed:
+        http_response_bytes.observe(response.calculate_content_length() or 0, route=route)
+
+@app.route('/metrics')
+def metrics():
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
 # Custom decorator to log route access with more details
 def log_route_access(log_level=logging.INFO, log_headers=False, log_body=False):
     def decorator(func):
@@ -2,8 +2,11 @@ from flask_restx import Namespace
 from flask_restx import Resource
 from flask_restx import fields
 from flask import request
-from utils.app_config import AppConfig
-from utils.app_logger import setup_logger
+from flask_restx import Api
+from notelab.app.routes.db_routes import db, generic_response_model
+from notelab.app.routes.representations import check_format, not_modified, response_format, stream_response, with_etag
+from notelab.utils.app_config import AppConfig
+from notelab.utils.app_logger import setup_logger
 
 config = AppConfig()
 logger = setup_logger('DBRoutes')
@@ -12,22 +15,35 @@ endpoints = config.database_endpoints
 
 table_ns = Namespace('Table', path=root, description='Operations for a single table')
 
+def init_routes(flask_api: Api):
+    flask_api.add_namespace(table_ns)
+
 @table_ns.route(endpoints.table)
 class TableResource(Resource):
 
-    # GET Response model
-    get_response_model = tables_ns.model('TableGetResponse', {
-        "tables": fields.List(fields.String, description="List of table names"),
-        "status": fields.Integer(description="HTTP status code"),
+    @table_ns.doc(params={
+        'format': 'json (default), ndjson, columnar or arrow; also negotiated from the Accept header',
+        'stream': 'Set to 1 to stream rows as NDJSON (same as Accept: application/x-ndjson)',
     })
-
-    @table_ns.marshal_with(get_response_model)
     def get(self, table_name):
-        logger.info(f"Fetching table {table_name} from {request.url}")
-        return db.get_table(table_name)
+        logger.info("Fetching table %s from %s", table_name, request.url)
+        fmt = response_format()
+        error = check_format(fmt)
+        if error is not None:
+            return error
+        etag = db.table_etag(table_name, f"table:{fmt}")
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+        if fmt == 'json':
+            return with_etag(db.get_table(table_name), etag)
+        stream, status = db.stream_table(table_name)
+        if status != 200:
+            return stream, status
+        return with_etag(stream_response(stream, fmt), etag)
 
     # POST Request model
-    post_request_model = tables_ns.model('TablePostRequest', {
+    post_request_model = table_ns.model('TablePostRequest', {
         'columns': fields.List(
             fields.String,
             required=True,
@@ -39,7 +55,7 @@ class TableResource(Resource):
     @table_ns.expect(post_request_model)
     @table_ns.marshal_with(generic_response_model)
     def post(self, table_name):
-        logger.info(f"Creating table {table_name} from {request.url}")
+        logger.info("Creating table %s from %s", table_name, request.url)
         if not request.is_json:
             return {"message": "Error: Request must be JSON", "status": 400}
         data = request.get_json()
@@ -50,10 +66,10 @@ class TableResource(Resource):
             message, status = db.create_table(table_name, columns=columns)
             return {"message": message, "status": status}
         except Exception as e:
-            return {"message": e, "status": 500}
+            return {"message": str(e), "status": 500}
 
     @table_ns.marshal_with(generic_response_model)
     def delete(self, table_name):
-        logger.info(f"Deleting table {table_name} from {request.url}")
+        logger.info("Deleting table %s from %s", table_name, request.url)
         message, status = db.drop_table(table_name)
-        return {"message": message, "status": status}
\ No newline at end of file
+        return {"message": message, "status": status}
@@ -3,6 +3,8 @@ from flask import request
 from notelab.utils.app_logger import setup_logger
 from notelab.utils.app_config import AppConfig
 from notelab.db.db_handler import DBHandler
+from notelab.utils.metrics import registry
+from notelab.app.routes.representations import check_format, not_modified, response_format, stream_response, with_etag
 from flask_restx import Api
 
 config = AppConfig()
@@ -15,15 +17,46 @@ tables_ns = Namespace('Tables', path=root, description='Operations related to ta
 schema_ns = Namespace('Table Schema', path=root, description='Schema-related operations')
 row_ns = Namespace('Row', path=root, description='Operations for a single row')
 rows_ns = Namespace('Rows', path=root, description='Operations for multiple rows')
+pool_ns = Namespace('Connection Pool', path=root, description='Connection pool monitoring')
+cache_ns = Namespace('Result Cache', path=root, description='Query result cache monitoring')
+profile_ns = Namespace('SQLite Profile', path=root, description='The SQLite performance profile applied to pooled connections')
+stats_ns = Namespace('Column Statistics', path=root, description='Per-column statistics maintained as rows are written')
+slow_query_ns = Namespace('Slow Queries', path=root, description='Queries slower than the SLOW_QUERY_MS threshold')
+index_ns = Namespace('Indexes', path=root, description='Index management and recommendations')
 
-db = DBHandler('database')
 db_path = config.db_path
+db = DBHandler('database', db_path)
+
+def pool_metrics():
+    stats, _ = db.get_pool_stats()
+    cache, _ = db.get_cache_stats()
+    samples = []
+    pools = [('read' if 'writer' in stats else 'shared', stats)] + ([('writer', stats['writer'])] if 'writer' in stats else [])
+    for name, help_text in (('open', 'Open pooled connections.'), ('in_use', 'Borrowed pooled connections.'), ('idle', 'Idle pooled connections.'),
+                            ('max_size', 'Pool capacity.'), ('hits', 'Connections reused from the pool.'), ('misses', 'Connections opened by the pool.'),
+                            ('waits', 'Waits for a free connection.'), ('timeouts', 'Borrows that timed out.'), ('evictions', 'Idle connections closed.')):
+        samples.append((f"notelab_pool_{name}", help_text, [({"pool": pool}, pool_stats.get(name, 0)) for pool, pool_stats in pools]))
+    if cache.get("enabled"):
+        for name in ('hits', 'misses', 'evictions', 'invalidations', 'entries', 'bytes'):
+            samples.append((f"notelab_result_cache_{name}", f"Result cache {name}.", [({}, cache[name])]))
+    if 'write_queue' in stats:
+        for name in ('writes', 'rows', 'commits', 'pending'):
+            samples.append((f"notelab_write_queue_{name}", f"Write queue {name}.", [({}, stats['write_queue'][name])]))
+    return samples
+
+registry.add_collector(pool_metrics)
 
 def init_routes(flask_api: Api):
     flask_api.add_namespace(tables_ns)
     flask_api.add_namespace(schema_ns)
     flask_api.add_namespace(row_ns)
     flask_api.add_namespace(rows_ns)
+    flask_api.add_namespace(pool_ns)
+    flask_api.add_namespace(cache_ns)
+    flask_api.add_namespace(profile_ns)
+    flask_api.add_namespace(slow_query_ns)
+    flask_api.add_namespace(stats_ns)
+    flask_api.add_namespace(index_ns)
 
 # POST Response model
 generic_response_model = tables_ns.model('TablePostResponse', {
@@ -33,44 +66,223 @@ generic_response_model = tables_ns.model('TablePostResponse', {
 
 @tables_ns.route(endpoints.tables)
 class TablesResource(Resource):
+    @tables_ns.doc(params={
+        'include': 'Set to rows to also return the full contents of every table',
+        'format': 'json (default) or columnar, the layout of the contents with include=rows',
+    })
     def get(self):
-        logger.info(f"Fetching tables from {request.url}")
-        return db.get_tables()
+        logger.info("Fetching tables from %s", request.url)
+        fmt = response_format()
+        error = check_format(fmt, ('json', 'columnar'))
+        if error is not None:
+            return error
+        include_rows = request.args.get('include') == 'rows'
+        return db.get_tables(include_rows=include_rows, layout='columnar' if fmt == 'columnar' else 'rows')
 
 
 
 @schema_ns.route(endpoints.table_schema)
 class TableSchemaResource(Resource):
     def get(self, table_name):
-        logger.info(f"Fetching schema for table {table_name} from {request.url}")
+        logger.info("Fetching schema for table %s from %s", table_name, request.url)
         return db.get_table_schema(table_name)
 
 @row_ns.route(endpoints.row)
 class RowResource(Resource):
     def get(self, table_name, row_id):
-        logger.info(f"Fetching row {row_id} from {request.url}")
+        logger.info("Fetching row %s from %s", row_id, request.url)
         return db.get_row(table_name, row_id)
 
+# Query arguments that control the response rather than filter rows
+reserved_args = {'stream', 'limit', 'after', 'format'}
+
 @rows_ns.route(endpoints.rows)
 class RowsResource(Resource):
+    @rows_ns.doc(params={
+        'limit': 'Page size; enables keyset pagination',
+        'after': 'The "next" cursor returned by the previous page',
+        'stream': 'Set to 1 to stream rows as NDJSON (same as Accept: application/x-ndjson)',
+        'format': 'json (default), ndjson, columnar or arrow; also negotiated from the Accept header',
+        'order_by': 'Comma-separated columns, prefix with - for descending',
+        '<column>[__op]': 'Filter, op is one of eq (default), ne, lt, le, gt, ge, in, isnull, prefix',
+    })
     def get(self, table_name):
-        logger.info(f"Fetching rows from {request.url}")
-        conditions = []
-        for key, value in request.args.items():
-            condition = f"{key}='{value}'"
-            conditions.append(condition)
-        return db.get_rows(table_name, conditions)
+        logger.info("Fetching rows from %s", request.url)
+        filters = [(key, value) for key, value in request.args.items(multi=True) if key not in reserved_args]
+        limit = request.args.get('limit')
+        after = request.args.get('after')
+        paginated = limit is not None or after is not None
+        fmt = response_format()
+        error = check_format(fmt, ('json', 'columnar') if paginated else ('json', 'ndjson', 'columnar', 'arrow'))
+        if error is not None:
+            return error
+        # The tag is taken before any data is read, so a concurrent write can only make it older than the body
+        etag = db.table_etag(table_name, f"rows:{fmt}:{request.query_string.decode()}")
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+        if paginated:
+            if limit is not None:
+                try:
+                    limit = int(limit)
+                except ValueError:
+                    return {"error": "limit must be an integer"}, 400
+            return with_etag(db.get_rows(table_name, limit=limit, after=after, layout='columnar' if fmt == 'columnar' else 'rows', filters=filters), etag)
+        if fmt == 'json':
+            return with_etag(db.get_rows(table_name, filters=filters), etag)
+        stream, status = db.stream_rows(table_name, filters=filters)
+        if status != 200:
+            return stream, status
+        return with_etag(stream_response(stream, fmt), etag)
 
     def post(self, table_name):
-        logger.info(f"Inserting rows into {table_name} from {request.url}")
+        logger.info("Inserting rows into %s from %s", table_name, request.url)
         if not request.is_json:
             return {"error": "Request must be JSON"}, 400
         data = request.get_json()["rows"]
         return db.insert_rows(table_name, data)
 
+    @rows_ns.doc(description='Body: {"rows": [...], "upsert": false}. Rows are full rows in column order, or objects '
+                             'with the primary key (rowid if none) and the columns to update. Set upsert to insert unmatched rows.')
     def put(self, table_name):
-        logger.info(f"Updating rows in {table_name} from {request.url}")
+        logger.info("Updating rows in %s from %s", table_name, request.url)
         if not request.is_json:
             return {"error": "Request must be JSON"}, 400
-        data = request.get_json()["rows"]
-        return db.update_rows(table_name, data)
\ No newline at end of file
+        body = request.get_json()
+        return db.update_rows(table_name, body["rows"], upsert=bool(body.get("upsert", False)))
+
+@stats_ns.route(endpoints.column_stats)
+class ColumnStatsResource(Resource):
+    @stats_ns.doc(params={'recompute': 'Set to true to rebuild the statistics with a full table scan, e.g. once they are stale'})
+    def get(self, table_name):
+        recompute = request.args.get('recompute', 'false').lower() in ('1', 'true', 'yes')
+        return db.get_column_stats(table_name, recompute)
+
+aggregate_args = {'group_by', 'agg', 'order_by', 'limit', 'index'}
+
+@rows_ns.route(endpoints.aggregate)
+class AggregateResource(Resource):
+    @rows_ns.doc(params={
+        'group_by': 'Comma-separated columns to group by; omit for one row over all matching rows',
+        'agg': 'Comma-separated aggregates: count, count:col, count_distinct:col, sum:col, total:col, avg:col, min:col, '
+               'max:col, median:col or a percentile such as p95:col (default count)',
+        'order_by': 'Comma-separated group_by columns or aggregate aliases (e.g. -sum_price), prefix with - for descending',
+        'limit': 'Maximum number of groups to return',
+        'index': 'Index to force with INDEXED BY, e.g. one covering the filtered, grouped and aggregated columns',
+        '<column>[__op]': 'Filter, the same as for the rows endpoint',
+    })
+    def get(self, table_name):
+        logger.info("Aggregating rows from %s", request.url)
+        filters = [(key, value) for key, value in request.args.items(multi=True) if key not in aggregate_args and key not in reserved_args]
+        group_by = request.args.get('group_by', '').split(',')
+        aggregates = request.args.get('agg', '').split(',')
+        limit = request.args.get('limit')
+        if limit is not None:
+            try:
+                limit = int(limit)
+            except ValueError:
+                return {"error": "limit must be an integer"}, 400
+        etag = db.table_etag(table_name, f"aggregate:{request.query_string.decode()}")
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+        return with_etag(db.aggregate_rows(table_name, group_by, aggregates, filters, request.args.get('order_by'), limit,
+                                           request.args.get('index')), etag)
+
+sample_args = {'method', 'n', 'fraction', 'by', 'seed'}
+
+@rows_ns.route(endpoints.sample)
+class SampleResource(Resource):
+    @rows_ns.doc(params={
+        'method': 'uniform (default) for n rows, bernoulli for each row with probability fraction, or stratified for '
+                  'up to n rows per distinct value of by',
+        'n': 'Sample size, per stratum when stratified',
+        'fraction': 'Inclusion probability of a bernoulli sample, in (0, 1]',
+        'by': 'Column to stratify by; an index on it keeps small strata cheap',
+        'seed': 'Integer seed, the same seed returns the same rows while the table is unchanged. The seed of an '
+                'unseeded draw is returned with the sample',
+        '<column>[__op]': 'Filter, the same as for the rows endpoint',
+    })
+    def get(self, table_name):
+        logger.info("Sampling rows from %s", request.url)
+        filters = [(key, value) for key, value in request.args.items(multi=True) if key not in sample_args and key not in reserved_args]
+        parsed = {}
+        for arg, convert in (('n', int), ('fraction', float), ('seed', int)):
+            value = request.args.get(arg)
+            try:
+                parsed[arg] = convert(value) if value is not None else None
+            except ValueError:
+                return {"error": f"{arg} must be a number"}, 400
+        args = (table_name, request.args.get('method', 'uniform'), parsed['n'], parsed['fraction'], request.args.get('by'), parsed['seed'], filters)
+        if parsed['seed'] is None:
+            return db.sample_rows(*args)
+        etag = db.table_etag(table_name, f"sample:{request.query_string.decode()}")
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+        return with_etag(db.sample_rows(*args), etag)
+
+@pool_ns.route(endpoints.pool)
+class PoolResource(Resource):
+    def get(self):
+        return db.get_pool_stats()
+
+@cache_ns.route(endpoints.cache)
+class CacheResource(Resource):
+    def get(self):
+        return db.get_cache_stats()
+
+@profile_ns.route(endpoints.profile)
+class ProfileResource(Resource):
+    def get(self):
+        return db.get_profile()
+
+@slow_query_ns.route(endpoints.slow_queries)
+class SlowQueriesResource(Resource):
+    @slow_query_ns.doc(params={'limit': 'Number of query shapes to return, slowest first (default 20)'})
+    def get(self):
+        limit = request.args.get('limit', default=20, type=int)
+        return db.get_slow_queries(limit)
+
+index_request_model = index_ns.model('IndexPostRequest', {
+    'columns': fields.List(fields.String, required=True, description='Indexed columns, in order', example=["age", "name"]),
+    'name': fields.String(description='Index name, defaults to idx_<table>_<columns>'),
+    'unique': fields.Boolean(description='Create a UNIQUE index', default=False),
+})
+
+@index_ns.route(endpoints.indexes)
+class IndexesResource(Resource):
+    def get(self, table_name):
+        logger.info("Fetching indexes of %s from %s", table_name, request.url)
+        return db.list_indexes(table_name)
+
+    @index_ns.expect(index_request_model)
+    def post(self, table_name):
+        logger.info("Creating index on %s from %s", table_name, request.url)
+        if not request.is_json:
+            return {"error": "Request must be JSON"}, 400
+        data = request.get_json()
+        return db.create_index(table_name, data.get('columns'), data.get('name'), bool(data.get('unique', False)))
+
+@index_ns.route(endpoints.index)
+class IndexResource(Resource):
+    def delete(self, table_name, index_name):
+        logger.info("Deleting index %s from %s", index_name, request.url)
+        return db.drop_index(table_name, index_name)
+
+@index_ns.route(endpoints.index_advice)
+class IndexAdviceResource(Resource):
+    @index_ns.doc(params={
+        'limit': 'Maximum number of recommendations (default 10)',
+        'min_hits': 'Ignore query shapes executed fewer times (default 1)',
+        'apply': 'Set to 1 to build the recommended indexes',
+    })
+    def get(self):
+        logger.info("Fetching index advice from %s", request.url)
+        try:
+            limit = int(request.args.get('limit', 10))
+            min_hits = int(request.args.get('min_hits', 1))
+        except ValueError:
+            return {"error": "limit and min_hits must be integers"}, 400
+        apply = request.args.get('apply', '').lower() in ('1', 'true', 'yes')
+        return db.get_index_advice(limit=limit, min_hits=min_hits, apply=apply)
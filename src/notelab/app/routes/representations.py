@@ -0,0 +1,107 @@
+"""
+Helpers for choosing and building alternative response representations
+"""
+
+import json
+from typing import Iterable, Optional, Tuple, Union
+from flask import Response, request
+from werkzeug.http import quote_etag
+from notelab.db.arrow_ipc import ARROW_STREAM_MIMETYPE, arrow_available, iter_ipc_stream
+from notelab.db.result_stream import ResultStream
+from notelab.utils.metrics import serialization_seconds
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+COLUMNAR_MIMETYPE = 'application/vnd.notelab.columnar+json'
+
+# Response formats by name, in order of preference when the Accept header allows several
+FORMAT_MIMETYPES = {
+    'json': 'application/json',
+    'ndjson': NDJSON_MIMETYPE,
+    'columnar': COLUMNAR_MIMETYPE,
+    'arrow': ARROW_STREAM_MIMETYPE,
+}
+
+"""
+Chooses the response format from ?format=, ?stream=1 or the Accept header, in that order
+Returns:
+    One of json, ndjson, columnar, arrow, or the unrecognised ?format= value
+"""
+def response_format() -> str:
+    requested = request.args.get('format')
+    if requested:
+        return requested.lower()
+    if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+        return 'ndjson'
+    best = request.accept_mimetypes.best_match(list(FORMAT_MIMETYPES.values()))
+    for name, mimetype in FORMAT_MIMETYPES.items():
+        if mimetype == best:
+            return name
+    return 'json'
+
+"""
+Checks that a format can be served by the current endpoint
+Returns:
+    None if the format is supported, otherwise an error body and HTTP Status Code 406
+"""
+def check_format(response_format: str, supported: Iterable[str] = tuple(FORMAT_MIMETYPES)) -> Optional[Tuple[dict, int]]:
+    supported = list(supported)
+    if response_format not in supported:
+        return {"error": f"Unsupported format '{response_format}', expected one of {', '.join(supported)}"}, 406
+    if response_format == 'arrow' and not arrow_available():
+        return {"error": "Arrow responses require pyarrow to be installed on the server"}, 406
+    return None
+
+"""Builds the response for a streamed result in the given format (ndjson, columnar or arrow)"""
+def stream_response(stream: ResultStream, response_format: str) -> Response:
+    if response_format == 'columnar':
+        body = stream.to_columnar()
+        with serialization_seconds.time(format='columnar'):
+            body = json.dumps(body, default=str)
+        response = Response(body, mimetype='application/json')
+    elif response_format == 'arrow':
+        response = Response(iter_ipc_stream(stream), mimetype=ARROW_STREAM_MIMETYPE)
+    else:
+        return ndjson_response(stream)
+    response.call_on_close(stream.close)
+    return response
+
+"""Streams a result as newline-delimited JSON, one object per row, one chunk per fetched batch"""
+def ndjson_response(stream: ResultStream) -> Response:
+    columns = stream.columns
+
+    def generate():
+        for batch in stream.batches():
+            with serialization_seconds.time(format='ndjson'):
+                chunk = ''.join(json.dumps(dict(zip(columns, row)), default=str) + '\n' for row in batch)
+            yield chunk
+
+    response = Response(generate(), mimetype=NDJSON_MIMETYPE)
+    # Releases the connection even if the client disconnects before the first chunk
+    response.call_on_close(stream.close)
+    return response
+
+"""
+Checks the request's If-None-Match header against the current tag of the resource
+Returns:
+    A 304 response if the client's copy is current, None otherwise
+"""
+def not_modified(etag: str) -> Optional[Response]:
+    if not request.if_none_match.contains(etag):
+        return None
+    response = Response(status=304)
+    response.headers['ETag'] = quote_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+"""
+Adds the ETag of a successful read to its response, either a Response or a (body, status) pair
+"""
+def with_etag(result: Union[Response, Tuple], etag: str) -> Union[Response, Tuple]:
+    headers = {'ETag': quote_etag(etag), 'Cache-Control': 'no-cache'}
+    if isinstance(result, Response):
+        result.headers.update(headers)
+        return result
+    body, status = result
+    if status != 200:
+        return body, status
+    return body, status, headers
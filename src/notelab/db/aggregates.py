@@ -0,0 +1,145 @@
+"""
+This module compiles aggregation requests into a single GROUP BY query run inside SQLite
+
+Aggregates are given as function or function:column terms, usually straight from the query string:
+    count                   COUNT(*)
+    count:column            COUNT(column), the non-null values
+    count_distinct:column   COUNT(DISTINCT column)
+    sum:column              SUM(column) (also avg, min, max, total)
+    median:column           percentile(column, 0.5)
+    p95:column              percentile(column, 0.95), any p0 to p100 including fractions such as p99.9
+
+Each aggregate is returned under the alias function_column (count for COUNT(*)). Percentiles use the
+percentile aggregate registered on every pooled connection, interpolating linearly between the closest
+ranks like numpy's default. Filters are the same as for get_rows and order_by may name group-by
+columns or aggregate aliases.
+"""
+
+import math
+import re
+from typing import Iterable, List, Optional, Tuple
+
+from .filters import FilterError
+from .schema_catalog import TableInfo
+
+FUNCTIONS = {
+    'count': 'COUNT({})',
+    'count_distinct': 'COUNT(DISTINCT {})',
+    'sum': 'SUM({})',
+    'total': 'TOTAL({})',
+    'avg': 'AVG({})',
+    'min': 'MIN({})',
+    'max': 'MAX({})',
+}
+
+_PERCENTILE = re.compile(r"p(\d{1,3}(?:\.\d+)?)")
+
+
+class CompiledAggregate:
+
+    def __init__(self, select: List[str], aliases: List[str], group_by: List[str], params: list, order_by: List[Tuple[str, str]]):
+        self.select = select
+        self.aliases = aliases
+        self.group_by = group_by
+        # Percentile fractions, bound ahead of the filter values
+        self.params = params
+        self.order_by = order_by
+
+    @property
+    def group_by_clause(self) -> str:
+        return " GROUP BY " + ", ".join(self.group_by) if self.group_by else ""
+
+    @property
+    def order_by_clause(self) -> str:
+        # Groups come back in a stable order unless asked otherwise
+        terms = self.order_by or [(column, 'ASC') for column in self.group_by]
+        return " ORDER BY " + ", ".join(f"{column} {direction}" for column, direction in terms) if terms else ""
+
+
+class Percentile:
+    """SQLite aggregate computing a percentile with linear interpolation, registered as percentile(value, fraction)"""
+
+    def __init__(self):
+        self.values = []
+        self.fraction = 0.5
+
+    def step(self, value, fraction):
+        # Like the built-in aggregates, NULL and non-numeric values are skipped
+        if isinstance(value, (int, float)):
+            self.values.append(value)
+        self.fraction = fraction
+
+    def finalize(self):
+        if not self.values:
+            return None
+        self.values.sort()
+        position = (len(self.values) - 1) * self.fraction
+        lower = math.floor(position)
+        upper = min(lower + 1, len(self.values) - 1)
+        return self.values[lower] + (self.values[upper] - self.values[lower]) * (position - lower)
+
+
+"""
+Registers the aggregate functions used by compiled aggregations on a connection
+"""
+def register_functions(connection) -> None:
+    connection.create_aggregate('percentile', 2, Percentile)
+
+def _aggregate(term: str, table_info: TableInfo) -> Tuple[str, str, list]:
+    function, _, column = term.partition(':')
+    function = function.lower()
+    if column and column not in table_info.types:
+        raise FilterError(f"Unknown column '{column}' for table '{table_info.name}'")
+
+    if function == 'count' and not column:
+        return 'COUNT(*)', 'count', []
+    if not column:
+        raise FilterError(f"Aggregate '{function}' needs a column, e.g. {function}:column")
+    if function in FUNCTIONS:
+        return FUNCTIONS[function].format(column), f"{function}_{column}", []
+    if function == 'median':
+        return f"percentile({column}, ?)", f"median_{column}", [0.5]
+
+    match = _PERCENTILE.fullmatch(function)
+    if match is None or float(match.group(1)) > 100:
+        raise FilterError(f"Unknown aggregate '{function}', expected one of {', '.join(FUNCTIONS)}, median or p0 to p100")
+    return f"percentile({column}, ?)", f"{function.replace('.', '_')}_{column}", [float(match.group(1)) / 100]
+
+"""
+Compiles an aggregation against a table schema
+Parameters:
+    group_by (Iterable[str]) - The columns to group by, none for a single row over all matching rows
+    aggregates (Iterable[str]) - Aggregate terms, see the module docstring; defaults to count
+    order_by (str) - Comma-separated group-by columns or aggregate aliases, prefix with - for descending
+    table_info (TableInfo) - The cached schema of the aggregated table
+Returns:
+    CompiledAggregate with the select list, GROUP BY columns, bound percentile fractions and ORDER BY terms
+Raises:
+    FilterError if a column, function or ordering term is unknown
+"""
+def compile_aggregate(group_by: Iterable[str], aggregates: Iterable[str], order_by: Optional[str], table_info: TableInfo) -> CompiledAggregate:
+    group_by = [column.strip() for column in group_by if column.strip()]
+    for column in group_by:
+        if column not in table_info.types:
+            raise FilterError(f"Unknown group_by column '{column}' for table '{table_info.name}'")
+
+    select, aliases, params = list(group_by), list(group_by), []
+    for term in [term.strip() for term in aggregates if term.strip()] or ['count']:
+        expression, alias, term_params = _aggregate(term, table_info)
+        if alias in aliases:
+            raise FilterError(f"Aggregate '{term}' is requested twice")
+        select.append(f"{expression} AS {alias}")
+        aliases.append(alias)
+        params += term_params
+
+    ordering = []
+    for term in (order_by or '').split(','):
+        term = term.strip()
+        if not term:
+            continue
+        name = term.lstrip('+-')
+        if name not in aliases:
+            raise FilterError(f"Cannot order by '{name}', expected a group_by column or one of {', '.join(aliases)}")
+        ordering.append((name, 'DESC' if term.startswith('-') else 'ASC'))
+
+    return CompiledAggregate(select, aliases, group_by, params, ordering)
@@ -0,0 +1,81 @@
+"""
+This module converts streamed query results to the Apache Arrow IPC stream format.
+pyarrow is an optional dependency (pip install notelab[arrow]).
+"""
+
+import io
+from typing import Dict, Iterator, List, Optional
+
+from .result_stream import ResultStream
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - depends on the environment
+    pa = None
+
+ARROW_STREAM_MIMETYPE = 'application/vnd.apache.arrow.stream'
+
+
+def arrow_available() -> bool:
+    return pa is not None
+
+"""
+Maps a declared SQLite column type to an Arrow type using SQLite's type affinity rules
+Returns None when the affinity does not pin down a type (NUMERIC or no declared type)
+"""
+def arrow_type(declared_type: Optional[str]):
+    declared_type = (declared_type or '').upper()
+    if 'INT' in declared_type:
+        return pa.int64()
+    if any(token in declared_type for token in ('CHAR', 'CLOB', 'TEXT')):
+        return pa.string()
+    if any(token in declared_type for token in ('REAL', 'FLOA', 'DOUB')):
+        return pa.float64()
+    if declared_type == 'BLOB':
+        return pa.binary()
+    return None
+
+def _schema(columns: List[str], types: Dict[str, str], first_batch: List[tuple]):
+    fields = []
+    for index, column in enumerate(columns):
+        column_type = arrow_type(types.get(column))
+        if column_type is None:
+            column_type = pa.array([row[index] for row in first_batch]).type if first_batch else pa.string()
+            if pa.types.is_null(column_type):
+                column_type = pa.string()
+        fields.append(pa.field(column, column_type))
+    return pa.schema(fields)
+
+"""
+Encodes a ResultStream as an Arrow IPC stream, one record batch per fetched cursor batch
+The schema comes from the declared column types, falling back to the values of the first batch.
+Values that do not fit the schema (SQLite does not enforce column types) raise pyarrow.ArrowInvalid.
+Yields:
+    bytes - The schema message followed by one encoded record batch at a time
+"""
+def iter_ipc_stream(stream: ResultStream) -> Iterator[bytes]:
+    if pa is None:
+        raise ImportError("pyarrow is required for Arrow responses")
+
+    batches = stream.batches()
+    first_batch = next(batches, [])
+    schema = _schema(stream.columns, stream.types, first_batch)
+
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        pending = [first_batch] if first_batch else []
+        for batch in _chain(pending, batches):
+            arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*batch), schema)]
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+            yield _drain(sink)
+    yield _drain(sink)
+
+def _chain(pending: List[List[tuple]], batches: Iterator[List[tuple]]) -> Iterator[List[tuple]]:
+    yield from pending
+    yield from batches
+
+def _drain(sink: io.BytesIO) -> bytes:
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return data
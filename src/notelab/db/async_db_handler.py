@@ -0,0 +1,179 @@
+"""
+This class is responsible for exposing DBHandler operations as coroutines for asyncio callers
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, List, Optional, Tuple
+
+from .db_handler import DBHandler
+from .result_stream import ResultStream
+
+
+class AsyncResultStream:
+
+    def __init__(self, stream: ResultStream, executor: ThreadPoolExecutor):
+        self.stream = stream
+        self.columns = stream.columns
+        self.types = stream.types
+        self._executor = executor
+        self._batches = stream.batches()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
+    """
+    Yields the result as lists of row tuples, each batch is fetched on the executor
+    """
+    async def batches(self) -> AsyncIterator[List[tuple]]:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await loop.run_in_executor(self._executor, next, self._batches, None)
+            if batch is None:
+                break
+            yield batch
+
+    """
+    Yields the result one row at a time as dictionaries keyed by column name
+    """
+    async def __aiter__(self) -> AsyncIterator[dict]:
+        columns = self.columns
+        async for batch in self.batches():
+            for row in batch:
+                yield dict(zip(columns, row))
+
+    """
+    Releases the cursor and the connection behind it. Safe to call more than once.
+    """
+    async def aclose(self) -> None:
+        await asyncio.get_running_loop().run_in_executor(self._executor, self.stream.close)
+
+
+class AsyncDBHandler:
+
+    """
+    Starts the bounded executor that runs the blocking DBHandler calls
+    The default handler is the DBHandler singleton that also serves the HTTP routes, so both draw on the same
+    connection pool. Workers are capped below the pool size so async callers can never hold every connection;
+    an open AsyncResultStream keeps its connection after its call returns, until it is closed.
+    Parameters:
+        db_handler (DBHandler) - The handler to run calls on, defaults to the DBHandler singleton
+        max_workers (int) - Threads running database calls; defaults to half the pool size, at most the pool size - 1
+    """
+    def __init__(self, db_handler: Optional[DBHandler] = None, max_workers: Optional[int] = None):
+        self.db = db_handler or DBHandler('database')
+        pool_size = self.db.connection_handler.pool_size
+        self.max_workers = max(1, min(max_workers or pool_size // 2, pool_size - 1))
+        # Each worker thread borrows its own pooled connection, so concurrent coroutines never share a cursor
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='notelab-async-db')
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    async def _run(self, func: Callable, *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def _stream(self, func: Callable, *args, **kwargs) -> Tuple[Any, int]:
+        stream, status = await self._run(func, *args, **kwargs)
+        if status != 200:
+            return stream, status
+        return AsyncResultStream(stream, self._executor), status
+
+    async def get_pool_stats(self) -> Tuple[dict, int]:
+        return await self._run(self.db.get_pool_stats)
+
+    async def get_cache_stats(self) -> Tuple[dict, int]:
+        return await self._run(self.db.get_cache_stats)
+
+    async def get_slow_queries(self, limit: int = 20) -> Tuple[dict, int]:
+        return await self._run(self.db.get_slow_queries, limit)
+
+    async def get_profile(self) -> Tuple[dict, int]:
+        return await self._run(self.db.get_profile)
+
+    async def get_tables(self, include_rows: bool = False, layout: str = 'rows') -> Tuple[Any, int]:
+        return await self._run(self.db.get_tables, include_rows, layout)
+
+    async def get_table(self, table_name: str) -> Tuple[Any, int]:
+        return await self._run(self.db.get_table, table_name)
+
+    """
+    Streams a table in batches
+    Returns:
+        - An AsyncResultStream to iterate with async for, or an error message
+        - HTTP Status Code (int)
+    """
+    async def stream_table(self, table_name: str, batch_size: Optional[int] = None) -> Tuple[Any, int]:
+        return await self._stream(self.db.stream_table, table_name, batch_size)
+
+    async def create_table(self, table_name: str, columns: List[str]) -> Tuple[Any, int]:
+        return await self._run(self.db.create_table, table_name, columns)
+
+    async def get_table_schema(self, table_name: str) -> Tuple[Any, int]:
+        return await self._run(self.db.get_table_schema, table_name)
+
+    async def drop_table(self, table_name: str) -> Tuple[Any, int]:
+        return await self._run(self.db.drop_table, table_name)
+
+    async def get_row(self, table_name: str, row_id) -> Tuple[Any, int]:
+        return await self._run(self.db.get_row, table_name, row_id)
+
+    async def get_rows(self, table_name: str, conditions=None, limit: Optional[int] = None, after: Optional[str] = None,
+                       layout: str = 'rows', filters=None) -> Tuple[Any, int]:
+        return await self._run(self.db.get_rows, table_name, conditions, limit, after, layout, filters)
+
+    async def get_column_stats(self, table_name: str, recompute: bool = False) -> Tuple[Any, int]:
+        return await self._run(self.db.get_column_stats, table_name, recompute)
+
+    async def aggregate_rows(self, table_name: str, group_by=None, aggregates=None, filters=None, order_by: Optional[str] = None,
+                             limit: Optional[int] = None, index: Optional[str] = None) -> Tuple[Any, int]:
+        return await self._run(self.db.aggregate_rows, table_name, group_by, aggregates, filters, order_by, limit, index)
+
+    async def sample_rows(self, table_name: str, method: str = 'uniform', n: Optional[int] = None, fraction: Optional[float] = None,
+                          by: Optional[str] = None, seed: Optional[int] = None, filters=None) -> Tuple[Any, int]:
+        return await self._run(self.db.sample_rows, table_name, method, n, fraction, by, seed, filters)
+
+    """
+    Streams the rows matching the filters in batches
+    Returns:
+        - An AsyncResultStream to iterate with async for, or an error message
+        - HTTP Status Code (int)
+    """
+    async def stream_rows(self, table_name: str, conditions=None, batch_size: Optional[int] = None, filters=None) -> Tuple[Any, int]:
+        return await self._stream(self.db.stream_rows, table_name, conditions, batch_size, filters)
+
+    async def insert_rows(self, table_name: str, data: List[List]) -> Tuple[Any, int]:
+        return await self._run(self.db.insert_rows, table_name, data)
+
+    async def bulk_insert(self, table_name: str, columns: List[str], row_chunks, transaction_rows: Optional[int] = None,
+                          defer_indexes: bool = True) -> Tuple[Any, int]:
+        return await self._run(self.db.bulk_insert, table_name, columns, row_chunks, transaction_rows, defer_indexes)
+
+    async def update_rows(self, table_name: str, data: list, upsert: bool = False) -> Tuple[Any, int]:
+        return await self._run(self.db.update_rows, table_name, data, upsert)
+
+    async def delete_rows(self, table_name: str, conditions: List[str]) -> Tuple[Any, int]:
+        return await self._run(self.db.delete_rows, table_name, conditions)
+
+    async def list_indexes(self, table_name: str) -> Tuple[Any, int]:
+        return await self._run(self.db.list_indexes, table_name)
+
+    async def create_index(self, table_name: str, columns: List[str], index_name: Optional[str] = None, unique: bool = False) -> Tuple[Any, int]:
+        return await self._run(self.db.create_index, table_name, columns, index_name, unique)
+
+    async def drop_index(self, table_name: str, index_name: str) -> Tuple[Any, int]:
+        return await self._run(self.db.drop_index, table_name, index_name)
+
+    async def get_index_advice(self, limit: int = 10, min_hits: int = 1, apply: bool = False) -> Tuple[Any, int]:
+        return await self._run(self.db.get_index_advice, limit, min_hits, apply)
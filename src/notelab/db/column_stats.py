@@ -0,0 +1,373 @@
+"""
+This class is responsible for maintaining per-column statistics and mergeable sketches in a side table
+
+Each column keeps its null count, min/max, mean and variance (merged with Chan's parallel update of
+Welford's moments), a HyperLogLog sketch for the distinct count and a KLL-style quantile sketch.
+All of them can be merged, so every inserted batch is summarised on its own and folded into the
+stored statistics without reading the table. Updates and deletes cannot be subtracted from the
+sketches, so they mark the statistics stale until the next full recompute, and so do bulk loads,
+for which summarising every value would cost more than the load. The statistics are opt-in
+(COLUMN_STATS_ENABLED) since they add that summary to every insert.
+"""
+
+import base64
+import hashlib
+import json
+import math
+import random
+import sqlite3
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Union
+
+from .schema_catalog import TableInfo
+
+# The _notelab_ prefix hides the side table from get_tables
+STATS_TABLE = '_notelab_column_stats'
+
+QUANTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+
+
+class HyperLogLog:
+    """Approximate distinct counter, about 1.04 / sqrt(2 ** precision) relative error (1.6% at the default 12)"""
+
+    def __init__(self, precision: int = 12, registers: Optional[bytearray] = None):
+        self.precision = precision
+        self.registers = registers if registers is not None else bytearray(1 << precision)
+
+    @staticmethod
+    def _key(value: Any) -> bytes:
+        # The type tag keeps the text '1' apart from the number 1
+        if isinstance(value, str):
+            return ('s:' + value).encode()
+        if isinstance(value, bytes):
+            return b'b:' + value
+        # SQLite stores 1.0 as 1 in INTEGER and NUMERIC columns, so integral floats hash like integers
+        if isinstance(value, float) and not value.is_integer():
+            return f"f:{value!r}".encode()
+        return f"i:{int(value)}".encode()
+
+    def update(self, values: Iterable[Any]) -> None:
+        registers, bits, blake2b = self.registers, 64 - self.precision, hashlib.blake2b
+        mask = (1 << bits) - 1
+        # Repeated values set the same register, so each is hashed once per batch; 1, 1.0 and True
+        # compare equal in a set just as they share a key
+        for value in set(values):
+            # The common types are keyed inline, this loop dominates bulk loads
+            cls = type(value)
+            key = ('s:' + value).encode() if cls is str else f"i:{value}".encode() if cls is int else self._key(value)
+            hashed = int.from_bytes(blake2b(key, digest_size=8).digest(), 'big')
+            rank = bits - (hashed & mask).bit_length() + 1
+            if rank > registers[hashed >> bits]:
+                registers[hashed >> bits] = rank
+
+    def merge(self, other: 'HyperLogLog') -> None:
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+
+    def estimate(self) -> int:
+        m = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate while many registers are still empty
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+    def to_dict(self) -> dict:
+        return {"precision": self.precision, "registers": base64.b64encode(bytes(self.registers)).decode()}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'HyperLogLog':
+        return cls(data["precision"], bytearray(base64.b64decode(data["registers"])))
+
+
+class QuantileSketch:
+    """
+    KLL-style quantile sketch: level h holds items of weight 2 ** h, and a full level is sorted and every other
+    item is promoted, so memory grows with log(n) while rank error stays around 1 / k
+    """
+
+    def __init__(self, k: int = 200, levels: Optional[List[list]] = None):
+        self.k = k
+        self.levels = levels or [[]]
+
+    def _capacity(self, level: int) -> int:
+        # Lower levels get geometrically smaller buffers, the top level holds k items
+        return max(2, math.ceil(self.k * (2 / 3) ** (len(self.levels) - 1 - level)))
+
+    def update(self, values: Iterable[float]) -> None:
+        self.levels[0].extend(values)
+        self._compress()
+
+    def merge(self, other: 'QuantileSketch') -> None:
+        for level, items in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append([])
+            self.levels[level].extend(items)
+        self._compress()
+
+    def _compress(self) -> None:
+        while True:
+            full = next((level for level, items in enumerate(self.levels) if len(items) > self._capacity(level)), None)
+            if full is None:
+                return
+            items = sorted(self.levels[full])
+            # An odd item out stays at its level, the others are halved with a random offset
+            kept = [items.pop()] if len(items) % 2 else []
+            if full + 1 == len(self.levels):
+                self.levels.append([])
+            self.levels[full + 1].extend(items[random.getrandbits(1)::2])
+            self.levels[full] = kept
+
+    def quantiles(self, fractions: Iterable[float]) -> Dict[float, Optional[float]]:
+        weighted = sorted((value, 1 << level) for level, items in enumerate(self.levels) for value in items)
+        total = sum(weight for _, weight in weighted)
+        result = {}
+        for fraction in fractions:
+            if not weighted:
+                result[fraction] = None
+                continue
+            target, cumulative = fraction * total, 0
+            for value, weight in weighted:
+                cumulative += weight
+                if cumulative >= target:
+                    break
+            result[fraction] = value
+        return result
+
+    def to_dict(self) -> dict:
+        return {"k": self.k, "levels": self.levels}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'QuantileSketch':
+        return cls(data["k"], data["levels"])
+
+
+class ColumnStats:
+
+    def __init__(self, hll_precision: int = 12, quantile_k: int = 200):
+        self.count = 0
+        self.nulls = 0
+        # Moments of the numeric values only
+        self.numeric = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        self.text_min = None
+        self.text_max = None
+        self.distinct = HyperLogLog(hll_precision)
+        self.quantiles = QuantileSketch(quantile_k)
+
+    """
+    Folds a batch of values of the column into the statistics
+    """
+    def update(self, values: Iterable[Any]) -> None:
+        present, numbers, texts = [], [], []
+        for value in values:
+            # SQLite stores NaN as NULL
+            if value is None or isinstance(value, float) and math.isnan(value):
+                self.nulls += 1
+                continue
+            present.append(value)
+            if isinstance(value, (int, float)):
+                numbers.append(value)
+            elif isinstance(value, str):
+                texts.append(value)
+        self.count += len(present)
+        self.distinct.update(present)
+        if numbers:
+            count = len(numbers)
+            mean = math.fsum(numbers) / count
+            self._merge_moments(count, mean, math.fsum((number - mean) ** 2 for number in numbers))
+            self.min = min(numbers) if self.min is None else min(self.min, min(numbers))
+            self.max = max(numbers) if self.max is None else max(self.max, max(numbers))
+            self.quantiles.update(numbers)
+        if texts:
+            self.text_min = min(texts) if self.text_min is None else min(self.text_min, min(texts))
+            self.text_max = max(texts) if self.text_max is None else max(self.text_max, max(texts))
+
+    def _merge_moments(self, count: int, mean: float, m2: float) -> None:
+        # Chan et al.: combine the moments of two disjoint sets without revisiting their values
+        total = self.numeric + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.numeric * count / total
+        self.numeric = total
+
+    def merge(self, other: 'ColumnStats') -> None:
+        self.count += other.count
+        self.nulls += other.nulls
+        if other.numeric:
+            self._merge_moments(other.numeric, other.mean, other.m2)
+        for attribute, pick in (('min', min), ('max', max), ('text_min', min), ('text_max', max)):
+            mine, theirs = getattr(self, attribute), getattr(other, attribute)
+            setattr(self, attribute, theirs if mine is None else mine if theirs is None else pick(mine, theirs))
+        self.distinct.merge(other.distinct)
+        self.quantiles.merge(other.quantiles)
+
+    """
+    Summarises the statistics like DataFrame.describe(), with the sample variance (ddof=1)
+    """
+    def summary(self) -> dict:
+        numeric = self.numeric > 0
+        variance = self.m2 / (self.numeric - 1) if self.numeric > 1 else None
+        rows = self.count + self.nulls
+        return {
+            "count": self.count,
+            "nulls": self.nulls,
+            "null_fraction": self.nulls / rows if rows else None,
+            "distinct": min(self.distinct.estimate(), self.count),
+            "min": self.min if numeric else self.text_min,
+            "max": self.max if numeric else self.text_max,
+            "mean": self.mean if numeric else None,
+            "variance": variance,
+            "std": math.sqrt(variance) if variance is not None else None,
+            "quantiles": {f"p{round(fraction * 100)}": value for fraction, value in self.quantiles.quantiles(QUANTILES).items()} if numeric else None,
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count, "nulls": self.nulls, "numeric": self.numeric, "mean": self.mean, "m2": self.m2,
+            "min": self.min, "max": self.max, "text_min": self.text_min, "text_max": self.text_max,
+            "distinct": self.distinct.to_dict(), "quantiles": self.quantiles.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'ColumnStats':
+        stats = cls()
+        for attribute in ("count", "nulls", "numeric", "mean", "m2", "min", "max", "text_min", "text_max"):
+            setattr(stats, attribute, data[attribute])
+        stats.distinct = HyperLogLog.from_dict(data["distinct"])
+        stats.quantiles = QuantileSketch.from_dict(data["quantiles"])
+        return stats
+
+
+class ColumnStatsStore:
+
+    def __init__(self, hll_precision: int = 12, quantile_k: int = 200):
+        self.hll_precision = hll_precision
+        self.quantile_k = quantile_k
+
+    def new_stats(self) -> ColumnStats:
+        return ColumnStats(self.hll_precision, self.quantile_k)
+
+    """
+    Summarises rows column by column
+    Parameters:
+        columns (List[str]) - The column names, in the order of the row values
+        rows (Iterable[list]) - Positional rows
+    Returns:
+        A dictionary of column name to ColumnStats
+    """
+    def summarize_rows(self, columns: List[str], rows: Iterable[list]) -> Dict[str, ColumnStats]:
+        stats = {column: self.new_stats() for column in columns}
+        rows = list(rows)
+        if rows:
+            for column, values in zip(columns, zip(*rows)):
+                stats[column].update(values)
+        return stats
+
+    def _ensure_table(self, cursor: sqlite3.Cursor) -> None:
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {STATS_TABLE} (table_name TEXT NOT NULL, column_name TEXT NOT NULL, "
+                       "stats TEXT NOT NULL, stale INTEGER NOT NULL DEFAULT 0, updated_at REAL NOT NULL, "
+                       "PRIMARY KEY (table_name, column_name)) WITHOUT ROWID")
+
+    """
+    Reads the stored statistics of a table
+    Returns:
+        A dictionary of column name to (ColumnStats, stale, updated_at), empty if nothing is stored
+    """
+    def load(self, cursor: sqlite3.Cursor, table_name: str) -> Dict[str, tuple]:
+        try:
+            cursor.execute(f"SELECT column_name, stats, stale, updated_at FROM {STATS_TABLE} WHERE table_name = ?", (table_name,))
+        except sqlite3.OperationalError:
+            # The side table is only created by the first write
+            return {}
+        return {column: (ColumnStats.from_dict(json.loads(stats)), bool(stale), updated_at) for column, stats, stale, updated_at in cursor.fetchall()}
+
+    """
+    Replaces the statistics of a table's columns
+    Parameters:
+        stats (Dict[str, ColumnStats]) - The statistics per column; columns left out keep what is stored
+        stale (bool or Set[str]) - Whether the statistics are known to be out of date, or the columns that are
+    """
+    def save(self, cursor: sqlite3.Cursor, table_name: str, stats: Dict[str, ColumnStats], stale: Union[bool, Set[str]] = False) -> None:
+        self._ensure_table(cursor)
+        now = time.time()
+        cursor.executemany(f"INSERT OR REPLACE INTO {STATS_TABLE} (table_name, column_name, stats, stale, updated_at) VALUES (?, ?, ?, ?, ?)",
+                           [(table_name, column, json.dumps(column_stats.to_dict()), int(column in stale if isinstance(stale, set) else stale), now)
+                            for column, column_stats in stats.items()])
+
+    """
+    Folds the statistics of newly inserted rows into the stored ones
+    Columns without stored statistics, e.g. of a table that existed before any were kept, are stored as stale
+    Parameters:
+        table_info (TableInfo) - The schema of the table the rows were inserted into
+        batch (Dict[str, ColumnStats]) - The statistics of the inserted values, per inserted column
+    """
+    def merge(self, cursor: sqlite3.Cursor, table_info: TableInfo, batch: Dict[str, ColumnStats]) -> None:
+        stored = self.load(cursor, table_info.name)
+        merged, stale = {}, set()
+        for column in table_info.columns:
+            entry = stored.get(column)
+            column_stats = entry[0] if entry is not None else self.new_stats()
+            if column in batch:
+                column_stats.merge(batch[column])
+            if entry is None or entry[1] or column not in batch:
+                # Values the batch did not set come from defaults the statistics cannot see
+                stale.add(column)
+            merged[column] = column_stats
+        self.save(cursor, table_info.name, merged, stale)
+
+    """
+    Starts empty, up to date statistics for a new table
+    """
+    def reset(self, cursor: sqlite3.Cursor, table_info: TableInfo) -> None:
+        self.drop(cursor, table_info.name)
+        self.save(cursor, table_info.name, {column: self.new_stats() for column in table_info.columns})
+
+    def mark_stale(self, cursor: sqlite3.Cursor, table_name: str) -> None:
+        self._ensure_table(cursor)
+        cursor.execute(f"UPDATE {STATS_TABLE} SET stale = 1 WHERE table_name = ?", (table_name,))
+
+    def drop(self, cursor: sqlite3.Cursor, table_name: str) -> None:
+        self._ensure_table(cursor)
+        cursor.execute(f"DELETE FROM {STATS_TABLE} WHERE table_name = ?", (table_name,))
+
+    """
+    Computes the statistics of a table with a full scan
+    Parameters:
+        cursor (sqlite3.Cursor) - A cursor to scan with, a reader is enough
+        table_info (TableInfo) - The schema of the table
+        batch_size (int) - Rows fetched and summarised at a time
+    Returns:
+        A dictionary of column name to ColumnStats
+    """
+    def compute(self, cursor: sqlite3.Cursor, table_info: TableInfo, batch_size: int = 10000) -> Dict[str, ColumnStats]:
+        stats = {column: self.new_stats() for column in table_info.columns}
+        cursor.execute(f"SELECT {', '.join(table_info.columns)} FROM {table_info.name}")
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return stats
+            for column, batch in self.summarize_rows(table_info.columns, rows).items():
+                stats[column].merge(batch)
+
+    """
+    Builds the statistics response of a table
+    Returns:
+        The table summary with one describe()-style entry per column, or None if some column has no statistics
+    """
+    def describe(self, stored: Dict[str, tuple], table_info: TableInfo) -> Optional[dict]:
+        if any(column not in stored for column in table_info.columns):
+            return None
+        updated_at = max((entry[2] for entry in stored.values()), default=None)
+        first = stored[table_info.columns[0]][0] if table_info.columns else None
+        return {
+            "table": table_info.name,
+            "rows": first.count + first.nulls if first is not None else 0,
+            "stale": any(stored[column][1] for column in table_info.columns),
+            "updated_at": datetime.fromtimestamp(updated_at, timezone.utc).isoformat() if updated_at else None,
+            "columns": {column: {"type": table_info.types[column], **stored[column][0].summary()} for column in table_info.columns},
+        }
@@ -1,21 +1,51 @@
 import os
 import sqlite3
-from typing import Tuple
+import threading
+from pathlib import Path
+from typing import Optional, Tuple
+from notelab.db.aggregates import register_functions
+from notelab.db.connection_pool import ConnectionPool, PoolTimeoutError
+from notelab.db.slow_query_log import SlowQueryLog
+from notelab.db.sqlite_profiles import SqliteProfile
+from notelab.db.timed_cursor import TimedCursor
 from notelab.db.utils import to_snake_case, verify_name
+from notelab.utils.app_logger import LazyMessage, sampled
 
 class ConnectionHandler:
 
-    def __init__(self, logger, db_name, messages):
-        self.connected = None
-        self.db = None
+    def __init__(self, logger, db_name, messages, pool_size: int = 5, pool_timeout: float = 5.0, pool_idle_timeout: float = 300.0,
+                 statement_cache_size: int = 128, concurrency_mode: str = 'shared', writer_timeout: float = 30.0,
+                 timed_cursors: bool = True, slow_query_log: Optional[SlowQueryLog] = None, profile: Optional[SqliteProfile] = None):
         self.db_path = None
-        self.cursor = None
+        self.pool = None
+        # In wal mode the pool above holds read-only connections and every write goes through this single connection
+        self.writer_pool = None
+        self.concurrency_mode = concurrency_mode
+        self.writer_timeout = writer_timeout
+        # TimedCursor records execute and fetch latencies for /metrics
+        # Slow queries are measured by the timed cursor, so recording them enables it
+        self.cursor_factory = TimedCursor if timed_cursors or slow_query_log is not None else sqlite3.Cursor
+        self.slow_query_log = slow_query_log
         self.logger = logger
+        # Connects and disconnects happen on every request, only a sample of them is logged
+        self.request_logger = sampled(logger)
         self.db_name = db_name
         self.MESSAGES = messages
+        self.pool_size = pool_size
+        self.pool_timeout = pool_timeout
+        self.pool_idle_timeout = pool_idle_timeout
+        self.statement_cache_size = statement_cache_size
+        # PRAGMAs applied to every connection as the pools open it, None leaves them at SQLite's defaults
+        self.profile = profile
+        if profile is not None and concurrency_mode == 'wal' and profile.settings['journal_mode'] not in (None, 'WAL'):
+            logger.warning("Profile %s sets journal_mode=%s, wal concurrency mode keeps the database in WAL",
+                           profile.name, profile.settings['journal_mode'])
+        self._pool_lock = threading.Lock()
+        # Each thread borrows its own connection so concurrent requests never share a cursor
+        self._local = threading.local()
 
     def __del__(self):
-        self.disconnect()
+        self.close()
         self.logger.info(self.MESSAGES["SQLITE_DISCONNECTED"])
 
     def __enter__(self):
@@ -23,66 +53,89 @@ class ConnectionHandler:
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.disconnect()
+        self.close()
         self.logger.info(self.MESSAGES["SQLITE_DISCONNECTED"])
 
+    @property
+    def connected(self) -> bool:
+        return getattr(self._local, 'db', None) is not None
+
+    @property
+    def db(self) -> Optional[sqlite3.Connection]:
+        return getattr(self._local, 'db', None)
+
+    @property
+    def cursor(self) -> Optional[sqlite3.Cursor]:
+        return getattr(self._local, 'cursor', None)
+
+    @property
+    def writable(self) -> bool:
+        return self.connected and (self.writer_pool is None or self._local.pool is self.writer_pool)
+
     """
-    Connect to SQLite Database
+    Connect to SQLite Database by borrowing a pooled connection for the current thread
     Parameters:
         db_path (str) - The path to the database file
         force_connect (bool) - Whether to force a connection if already connected
+        write (bool) - Whether the connection will write; in wal mode it is then the single writer connection
     Returns:
         Response message (str)
         HTTP Status Code (int)
     """
-    def connect(self, db_path: str, force_connect: bool = False) -> Tuple[str, int]:
-        self.logger.info(self.MESSAGES["INITIALIZING_CONNECTION"].format(db_name=db_path))
-        db_name = os.path.basename(db_path).split('.')[0]
+    def connect(self, db_path: str, force_connect: bool = False, write: bool = False) -> Tuple[str, int]:
+        self.request_logger.debug(LazyMessage(self.MESSAGES["INITIALIZING_CONNECTION"], db_name=db_path))
+        db_name = os.path.basename(db_path or '').split('.')[0]
 
         try:
-            db_name = to_snake_case(db_name)
-            if not verify_name(db_name):
-                message = self.MESSAGES["INVALID_DB_NAME"].format(db_name=db_name)
-                self.logger.error(message)
-                return message, 400
-
-            db_path = db_path.strip()
-            if not os.path.exists(db_path):
-                message = self.MESSAGES["DB_PATH_NOT_FOUND"].format(db_path=db_path)
-                self.logger.error(message)
-                return message, 404
-
-            if self.connected:
+            db_path = (db_path or '').strip()
+            if self.pool is None or self.pool.db_path != db_path:
+                db_name = to_snake_case(db_name)
+                if not verify_name(db_name):
+                    message = self.MESSAGES["INVALID_DB_NAME"].format(db_name=db_name)
+                    self.logger.error(message)
+                    return message, 400
+
+                if not os.path.exists(db_path):
+                    message = self.MESSAGES["DB_PATH_NOT_FOUND"].format(db_path=db_path)
+                    self.logger.error(message)
+                    return message, 404
+
+            # A write nested in a read borrows the writer on top of the read connection until it disconnects
+            nested = self.connected and write and not self.writable
+            if self.connected and not nested:
                 message = self.MESSAGES["ALREADY_CONNECTED"].format(db_name=self.db_name)
                 self.logger.warning(message)
                 if force_connect:
-                    self.logger.info(f"Force connecting to database {db_name}...")
+                    self.logger.info("Force connecting to database %s...", db_name)
                     self.disconnect()
                 else:
                     return message, 409
 
-            self.db_path = db_path
-            self.db_name = db_name
-            self.db = sqlite3.connect(db_path, check_same_thread=False)
-            self.cursor = self.db.cursor()
-            self.connected = True
+            self._get_pool(db_path, db_name)
+            pool = self.writer_pool if write and self.writer_pool is not None else self.pool
+            connection = pool.acquire()
+            if nested:
+                self._local.outer = (self._local.pool, self._local.db, self._local.cursor)
+            self._local.pool = pool
+            self._local.db = connection
+            self._local.cursor = self.new_cursor(connection)
 
             message = self.MESSAGES["CONNECT_SUCCESS"].format(db_name=self.db_name)
-            self.logger.info(message)
+            self.request_logger.debug(message)
             return message, 200
 
+        except PoolTimeoutError as e:
+            message = f"{self.MESSAGES['POOL_EXHAUSTED'].format(db_name=db_name)}: {str(e)}"
+            self.logger.error(message)
+            return message, 503
+
         except Exception as e:
-            self.db = None
-            self.db_path = None
-            self.db_name = None
-            self.cursor = None
-            self.connected = False
             message = f"{self.MESSAGES['CONNECT_FAIL'].format(db_name=db_name)}: {str(e)}"
             self.logger.error(message)
             return message, 500
 
     """
-    Disconnect from SQLite Database
+    Disconnect from SQLite Database by returning the current thread's connection to the pool
     Parameters:
         force_disconnect (bool) - Whether to force a disconnect if not connected
     Returns:
@@ -91,30 +144,134 @@ class ConnectionHandler:
     """
 
     def disconnect(self, force_disconnect: bool = False) -> Tuple[str, int]:
-        self.logger.info(self.MESSAGES["TERMINATING_CONNECTION"].format(db_name=self.db_name))
+        self.request_logger.debug(LazyMessage(self.MESSAGES["TERMINATING_CONNECTION"], db_name=self.db_name))
         db_name = self.db_name
 
         try:
             if not self.connected:
                 message = self.MESSAGES["NOT_CONNECTED"]
-                self.logger.info(message)
+                self.logger.debug(message)
                 if not force_disconnect:
-                    self.logger.warning(self.MESSAGES["ALREADY_DISCONNECTED"])
+                    self.logger.debug(self.MESSAGES["ALREADY_DISCONNECTED"])
                     return message, 409
+                return message, 200
 
-            self.cursor.close()
-            self.db.close()
-            self.cursor = None
-            self.db = None
-            self.db_path = None
-            self.db_name = None
-            self.connected = False
+            connection, pool = self._local.db, self._local.pool
+            self._local.cursor.close()
+            self._local.pool, self._local.db, self._local.cursor = getattr(self._local, 'outer', None) or (None, None, None)
+            self._local.outer = None
+            pool.release(connection)
 
             message = self.MESSAGES["DISCONNECT_SUCCESS"].format(db_name=db_name)
-            self.logger.info(message)
+            self.request_logger.debug(message)
             return message, 200
 
         except Exception as e:
             message = f"{self.MESSAGES['DISCONNECT_FAIL'].format(db_name=db_name)}: {str(e)}"
             self.logger.error(message)
-            return message, 500
\ No newline at end of file
+            return message, 500
+
+    """
+    Borrow a pooled connection that is not bound to the current thread, e.g. for a streamed result
+    Returns:
+        An open sqlite3.Connection, to be handed back with release_connection
+    """
+    def acquire_connection(self) -> sqlite3.Connection:
+        if self.pool is None:
+            raise sqlite3.ProgrammingError(self.MESSAGES["NOT_CONNECTED"])
+        return self.pool.acquire()
+
+    def new_cursor(self, connection: sqlite3.Connection) -> sqlite3.Cursor:
+        cursor = connection.cursor(self.cursor_factory)
+        if self.slow_query_log is not None:
+            cursor.slow_query_log = self.slow_query_log
+        return cursor
+
+    def release_connection(self, connection: sqlite3.Connection) -> None:
+        if self.pool is not None:
+            self.pool.release(connection)
+        else:
+            connection.close()
+
+    """
+    Close every pooled connection
+    """
+    def close(self) -> None:
+        while self.connected:
+            self.disconnect()
+        with self._pool_lock:
+            if self.pool is not None:
+                self.pool.close()
+                self.pool = None
+            if self.writer_pool is not None:
+                self.writer_pool.close()
+                self.writer_pool = None
+
+    """
+    Retrieves the connection pool statistics
+    Returns:
+        A dictionary of pool counters (hits, misses, waits, timeouts, evictions, open, in_use, idle, max_size),
+        the concurrency mode and, in wal mode, the counters of the writer connection
+    """
+    def pool_stats(self) -> dict:
+        pool, writer_pool = self.pool, self.writer_pool
+        stats = pool.stats() if pool is not None else {"open": 0, "in_use": 0, "idle": 0, "max_size": self.pool_size}
+        stats["mode"] = self.concurrency_mode
+        if writer_pool is not None:
+            stats["writer"] = writer_pool.stats()
+        return stats
+
+    def _get_pool(self, db_path: str, db_name: str) -> ConnectionPool:
+        with self._pool_lock:
+            if self.pool is None or self.pool.db_path != db_path:
+                if self.pool is not None:
+                    self.pool.close()
+                if self.writer_pool is not None:
+                    self.writer_pool.close()
+                    self.writer_pool = None
+                factory = self._shared_factory
+                if self.concurrency_mode == 'wal':
+                    # The writer switches the database to WAL before any read-only connection opens it
+                    self.writer_pool = ConnectionPool(db_path, max_size=1, timeout=self.writer_timeout, idle_timeout=self.pool_idle_timeout,
+                                                      factory=self._writer_factory, statement_cache_size=self.statement_cache_size)
+                    self.writer_pool.release(self.writer_pool.acquire())
+                    factory = self._reader_factory
+                self.pool = ConnectionPool(db_path, max_size=self.pool_size, timeout=self.pool_timeout, idle_timeout=self.pool_idle_timeout,
+                                           factory=factory, statement_cache_size=self.statement_cache_size)
+                self.db_path = db_path
+                self.db_name = db_name
+                self.logger.info(LazyMessage(self.MESSAGES["POOL_CREATED"], db_name=db_name, max_size=self.pool_size))
+            return self.pool
+
+    def _shared_factory(self, db_path: str) -> sqlite3.Connection:
+        connection = sqlite3.connect(db_path, check_same_thread=False, cached_statements=self.statement_cache_size)
+        register_functions(connection)
+        self._configure(connection)
+        return connection
+
+    def _writer_factory(self, db_path: str) -> sqlite3.Connection:
+        connection = sqlite3.connect(db_path, check_same_thread=False, cached_statements=self.statement_cache_size)
+        register_functions(connection)
+        # journal_mode=WAL is persistent and required whatever the profile says
+        self._configure(connection, journal_mode='WAL')
+        if self.profile is None or self.profile.settings['synchronous'] is None:
+            # synchronous=NORMAL only syncs at checkpoints, which is safe in WAL mode
+            connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _reader_factory(self, db_path: str) -> sqlite3.Connection:
+        # Read-only connections never take the write lock, so under WAL they read their own snapshot while the writer commits
+        uri = f"{Path(db_path).resolve().as_uri()}?mode=ro"
+        connection = sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=self.statement_cache_size)
+        register_functions(connection)
+        self._configure(connection, read_only=True)
+        return connection
+
+    def _configure(self, connection: sqlite3.Connection, read_only: bool = False, journal_mode: Optional[str] = None) -> None:
+        if self.profile is None:
+            if journal_mode is not None:
+                connection.execute(f"PRAGMA journal_mode={journal_mode}")
+            return
+        for pragma, error in self.profile.apply(connection, read_only, journal_mode).items():
+            # The connection stays usable with SQLite's value, e.g. when another connection keeps the journal mode locked
+            self.logger.warning("Could not set PRAGMA %s for profile %s: %s", pragma, self.profile.name, error)
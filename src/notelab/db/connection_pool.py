@@ -0,0 +1,158 @@
+"""
+This class is responsible for pooling SQLite connections so they can be reused across requests
+"""
+
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection could be borrowed from the pool in time"""
+
+
+class ConnectionPool:
+
+    def __init__(self, db_path: str, max_size: int = 5, timeout: float = 5.0, idle_timeout: float = 300.0,
+                 health_check_after: float = 30.0, factory: Optional[Callable[[str], sqlite3.Connection]] = None,
+                 statement_cache_size: int = 128):
+        self.db_path = db_path
+        self.max_size = max(1, int(max_size))
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.health_check_after = health_check_after
+        self.statement_cache_size = statement_cache_size
+        self.factory = factory or self._default_factory
+        self._idle: Deque[Tuple[sqlite3.Connection, float]] = deque()
+        self._open = 0
+        self._in_use = 0
+        self._closed = False
+        self._condition = threading.Condition(threading.Lock())
+        self._stats = {"hits": 0, "misses": 0, "waits": 0, "timeouts": 0, "evictions": 0, "failed_health_checks": 0}
+
+    def _default_factory(self, db_path: str) -> sqlite3.Connection:
+        # Each connection keeps up to statement_cache_size prepared statements, keyed on the SQL text
+        return sqlite3.connect(db_path, check_same_thread=False, cached_statements=self.statement_cache_size)
+
+    """
+    Borrow a connection from the pool, opening a new one if the pool is not full
+    Parameters:
+        timeout (float) - Seconds to wait for a free connection, defaults to the pool timeout
+    Returns:
+        An open sqlite3.Connection
+    """
+    def acquire(self, timeout: Optional[float] = None) -> sqlite3.Connection:
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._condition:
+                if self._closed:
+                    raise sqlite3.ProgrammingError("Connection pool is closed.")
+                self._evict_idle()
+                if self._idle:
+                    # LIFO so the most recently used connection (warmest page cache) is reused first
+                    connection, last_used = self._idle.pop()
+                    self._in_use += 1
+                    self._stats["hits"] += 1
+                elif self._open < self.max_size:
+                    connection, last_used = None, None
+                    self._open += 1
+                    self._in_use += 1
+                    self._stats["misses"] += 1
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeoutError(f"No connection available after {timeout}s (max size {self.max_size}).")
+                    self._stats["waits"] += 1
+                    self._condition.wait(remaining)
+                    continue
+
+            if connection is None:
+                try:
+                    return self.factory(self.db_path)
+                except Exception:
+                    self._discard()
+                    raise
+
+            if time.monotonic() - last_used >= self.health_check_after and not self._is_healthy(connection):
+                self._stats["failed_health_checks"] += 1
+                self._close_quietly(connection)
+                self._discard()
+                continue
+
+            return connection
+
+    """
+    Return a borrowed connection to the pool
+    Parameters:
+        connection (sqlite3.Connection) - The connection previously returned by acquire
+    """
+    def release(self, connection: sqlite3.Connection) -> None:
+        try:
+            if connection.in_transaction:
+                connection.rollback()
+        except sqlite3.Error:
+            self._close_quietly(connection)
+            self._discard()
+            return
+
+        with self._condition:
+            self._in_use -= 1
+            if self._closed:
+                self._open -= 1
+                self._close_quietly(connection)
+            else:
+                self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    def close(self) -> None:
+        with self._condition:
+            self._closed = True
+            while self._idle:
+                connection, _ = self._idle.popleft()
+                self._close_quietly(connection)
+                self._open -= 1
+            self._condition.notify_all()
+
+    def stats(self) -> Dict[str, int]:
+        with self._condition:
+            return {
+                **self._stats,
+                "open": self._open,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "max_size": self.max_size,
+            }
+
+    def _evict_idle(self) -> None:
+        # Idle connections are ordered oldest first, so stop at the first one still within the timeout
+        now = time.monotonic()
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            connection, _ = self._idle.popleft()
+            self._close_quietly(connection)
+            self._open -= 1
+            self._stats["evictions"] += 1
+
+    def _discard(self) -> None:
+        with self._condition:
+            self._open -= 1
+            self._in_use -= 1
+            self._condition.notify()
+
+    @staticmethod
+    def _is_healthy(connection: sqlite3.Connection) -> bool:
+        try:
+            connection.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    @staticmethod
+    def _close_quietly(connection: sqlite3.Connection) -> None:
+        try:
+            connection.close()
+        except sqlite3.Error:
+            pass
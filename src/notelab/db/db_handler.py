@@ -2,86 +2,461 @@
 This class is responsible for handling SQL database operations
 """
 
+from contextlib import contextmanager
 from functools import wraps
-from typing import Tuple, Any, Callable
+from typing import Tuple, Any, Callable, Optional
 import json
 import os
+import time
 
+from .column_stats import ColumnStatsStore
 from .connection_handler import ConnectionHandler
+from .index_advisor import IndexAdvisor
+from .result_cache import ResultCache
+from .slow_query_log import SlowQueryLog
+from .sqlite_profiles import PRAGMAS, resolve_profile
 from .row_handler import RowHandler
 from .table_handler import TableHandler
+from .table_versions import TableVersions
+from .write_queue import WriteQueue
+from ..utils.app_config import AppConfig
 from ..utils.app_logger import setup_logger
+from ..utils.metrics import db_method_seconds
 
 
-def connection_required(func: Callable):
-    @wraps(func)
-    def wrapper(self, *args, **kwargs):
-        self._connect(self.db_name)
-        try:
-            result = func(self, *args, **kwargs)
-        finally:
-            self._disconnect()
-        return result
-    return wrapper
+# Borrows a connection for the call; with write=True it is the single writer connection when running in wal mode
+def connection_required(func: Optional[Callable] = None, write: bool = False):
+    def decorator(func: Callable):
+        # Cached reads go through _get_rows and _get_table, reported under their public names
+        method = func.__name__.lstrip('_')
+
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            # Nested calls reuse the connection already borrowed by this thread, unless a write is nested in a read
+            if self.connection_handler.connected and (not write or self.connection_handler.writable):
+                return func(self, *args, **kwargs)
+            with db_method_seconds.time(method=method):
+                message, status = self._connect(self.db_path, write)
+                if status != 200:
+                    return message, status
+                try:
+                    result = func(self, *args, **kwargs)
+                finally:
+                    self._disconnect()
+                return result
+        return wrapper
+    return decorator(func) if func is not None else decorator
 
 class DBHandler:
 
     _instance = None
 
-    def __new__(cls, db_name: str):
+    def __new__(cls, db_name: str, db_path: Optional[str] = None):
         if cls._instance is None:
             cls._instance = super(DBHandler, cls).__new__(cls)
-            cls._instance._initialize(db_name)
+            cls._instance._initialize(db_name, db_path)
         return cls._instance
 
-    def _initialize(self, db_name: str):
-        self.logger = setup_logger()
+    def _initialize(self, db_name: str, db_path: Optional[str] = None):
+        config = AppConfig()
+        self.logger = setup_logger('DBHandler')
+        self.db_name = db_name
+        self.db_path = db_path or config.db_path
+        self.stream_batch_size = config.stream_batch_size
         self.messages = json.load(open(os.path.join(os.path.dirname(__file__), 'messages.json')))
-        self.connection_handler = ConnectionHandler(self.logger, db_name, self.messages)
+        self.slow_query_log = SlowQueryLog(config.slow_query_ms) if config.slow_query_ms > 0 else None
+        self.profile = resolve_profile(config.db_profile, config.db_profile_overrides)
+        self.connection_handler = ConnectionHandler(
+            self.logger, db_name, self.messages,
+            pool_size=config.db_pool_size,
+            pool_timeout=config.db_pool_timeout,
+            pool_idle_timeout=config.db_pool_idle_timeout,
+            statement_cache_size=self.profile.statement_cache_size,
+            concurrency_mode=config.db_concurrency_mode,
+            writer_timeout=config.db_writer_timeout,
+            timed_cursors=config.metrics_enabled,
+            slow_query_log=self.slow_query_log,
+            profile=self.profile,
+        )
         self.table_handler = TableHandler(self.logger, db_name, self.messages, self.connection_handler)
-        self.row_handler = RowHandler(self.logger, db_name, self.messages, self.connection_handler, self.table_handler)
+        self.index_advisor = IndexAdvisor(max_covering_columns=config.index_advisor_max_covering_columns)
+        self.row_handler = RowHandler(
+            self.logger, db_name, self.messages, self.connection_handler, self.table_handler,
+            page_size=config.page_size,
+            index_advisor=self.index_advisor,
+            bulk_pragmas=config.bulk_pragmas,
+            update_batch_rows=config.update_batch_rows,
+        )
+        self.bulk_transaction_rows = config.bulk_transaction_rows
+        # Bumped by every write path below, they drive both cache invalidation and the HTTP ETags
+        self.table_versions = TableVersions(self.db_path if config.db_external_writers else None)
+        self.result_cache = ResultCache(config.result_cache_max_bytes, self.table_versions) if config.result_cache_max_bytes > 0 else None
+        self.column_stats = ColumnStatsStore() if config.column_stats_enabled else None
+        self.write_queue = None
+        if config.write_queue_enabled:
+            self.write_queue = WriteQueue(self.insert_row_batches, max_delay_ms=config.write_queue_max_delay_ms,
+                                          max_rows=config.write_queue_max_rows)
+        if self.db_path and os.path.exists(self.db_path):
+            self._restore_deferred_indexes()
 
     def validate_table_status(self, table_name: str, exist_condition: bool = False) -> Tuple[str, int]:
         return self.table_handler.validate_table_status(table_name, exist_condition)
 
-    def _connect(self, db_path) -> Tuple[str, int]:
-        return self.connection_handler.connect(db_path)
+    def _connect(self, db_path, write: bool = False) -> Tuple[str, int]:
+        return self.connection_handler.connect(db_path, write=write)
 
     def _disconnect(self) -> Tuple[str, int]:
         return self.connection_handler.disconnect()
 
+    def get_pool_stats(self) -> Tuple[dict, int]:
+        stats = self.connection_handler.pool_stats()
+        if self.write_queue is not None:
+            stats["write_queue"] = self.write_queue.stats()
+        return stats, 200
+
+    def get_cache_stats(self) -> Tuple[dict, int]:
+        if self.result_cache is None:
+            return {"enabled": False}, 200
+        return {"enabled": True, **self.result_cache.stats()}, 200
+
+    """
+    Retrieves the slowest query shapes recorded since startup
+    Parameters:
+        limit (int) - The number of shapes to return
+    Returns:
+        The threshold and the shapes ordered by their slowest execution, each with its latest captured query plan
+    """
+    def get_slow_queries(self, limit: int = 20) -> Tuple[dict, int]:
+        if self.slow_query_log is None:
+            return {"enabled": False}, 200
+        return {"enabled": True, "threshold_ms": self.slow_query_log.threshold * 1000, "queries": self.slow_query_log.top(limit)}, 200
+
+    """
+    Retrieves the active SQLite performance profile
+    Returns:
+        The profile name, its settings and which of them were overridden, with the values the PRAGMAs actually
+        have on a pooled connection (a read-only one in wal concurrency mode)
+    """
     @connection_required
-    def get_tables(self) -> Tuple[Any, int]:
-        return self.table_handler.get_tables()
+    def get_profile(self) -> Tuple[dict, int]:
+        cursor = self.connection_handler.cursor
+        effective = {}
+        for pragma in PRAGMAS:
+            cursor.execute(f"PRAGMA {pragma}")
+            effective[pragma] = cursor.fetchone()[0]
+        return {**self.profile.to_dict(), "mode": self.connection_handler.concurrency_mode, "effective": effective}, 200
+
+    """
+    Returns a cached result, or computes it and caches it if it succeeds
+    Parameters:
+        table_name (str) - The table the result is read from, whose writes invalidate it
+        key (tuple) - Identifies the result, made of the operation name and all of its arguments
+        compute (callable) - Computes the (result, HTTP Status Code) pair on a miss
+    """
+    def _cached(self, table_name: str, key: tuple, compute: Callable[[], Tuple[Any, int]]) -> Tuple[Any, int]:
+        if self.result_cache is None:
+            return compute()
+        result = self.result_cache.get(key)
+        if result is not None:
+            return result, 200
+        version = self.result_cache.version(table_name)
+        result, status = compute()
+        if status == 200:
+            self.result_cache.put(key, table_name, result, version)
+        return result, status
+
+    """
+    Builds the ETag of a read of a table, without touching the table
+    Parameters:
+        table_name (str) - The table the response is read from
+        query_key (str) - Everything else that shapes the response
+    Returns:
+        An unquoted entity tag that changes after every write to the table through this handler
+    """
+    def table_etag(self, table_name: str, query_key: str = '') -> str:
+        return self.table_versions.etag(table_name, query_key)
+
+    @contextmanager
+    def _writing(self, *table_names: str):
+        # Versions are bumped before the write as well as after it, so neither a read racing the write nor one
+        # between its commit and the final bump can be cached or tagged as the post-write state
+        for table_name in table_names:
+            self.table_versions.bump(table_name)
+        try:
+            yield
+        finally:
+            for table_name in table_names:
+                self.table_versions.bump(table_name)
+                if self.result_cache is not None:
+                    self.result_cache.invalidate(table_name)
+
+    def close(self) -> None:
+        if self.write_queue is not None:
+            self.write_queue.close()
+            self.write_queue = None
+        self.table_versions.close()
+        self.connection_handler.close()
 
     @connection_required
+    def get_tables(self, include_rows: bool = False, layout: str = 'rows') -> Tuple[Any, int]:
+        return self.table_handler.get_tables(include_rows, layout)
+
     def get_table(self, table_name: str) -> Tuple[Any, int]:
+        return self._cached(table_name, ('get_table', table_name), lambda: self._get_table(table_name))
+
+    @connection_required
+    def _get_table(self, table_name: str) -> Tuple[Any, int]:
         return self.table_handler.get_table(table_name)
 
     @connection_required
+    def stream_table(self, table_name: str, batch_size: Optional[int] = None) -> Tuple[Any, int]:
+        return self.table_handler.stream_table(table_name, batch_size or self.stream_batch_size)
+
+    @connection_required(write=True)
     def create_table(self, table_name, columns) -> Tuple[Any, int]:
-        return self.table_handler.create_table(table_name, columns)
+        with self._writing(table_name):
+            message, status = self.table_handler.create_table(table_name, columns)
+            if status == 201:
+                self._update_column_stats(lambda cursor: self.column_stats.reset(cursor, self.table_handler.table_info(table_name)))
+            return message, status
 
     @connection_required
     def get_table_schema(self, table_name) -> Tuple[Any, int]:
         return self.table_handler.get_table_schema(table_name)
 
-    @connection_required
+    @connection_required(write=True)
     def drop_table(self, table_name) -> Tuple[Any, int]:
-        return self.table_handler.drop_table(table_name)
+        with self._writing(table_name):
+            message, status = self.table_handler.drop_table(table_name)
+            if status == 200:
+                self._update_column_stats(lambda cursor: self.column_stats.drop(cursor, table_name))
+            return message, status
 
     @connection_required
     def get_row(self, table_name, row_id):
         return self.row_handler.get_row(table_name, row_id)
 
+    def get_rows(self, table_name, conditions=None, limit: Optional[int] = None, after: Optional[str] = None, layout: str = 'rows', filters=None):
+        key = ('get_rows', table_name, tuple(conditions or ()), limit, after, layout, tuple(tuple(item) for item in filters or ()))
+        return self._cached(table_name, key, lambda: self._get_rows(table_name, conditions, limit, after, layout, filters))
+
+    @connection_required
+    def _get_rows(self, table_name, conditions=None, limit: Optional[int] = None, after: Optional[str] = None, layout: str = 'rows', filters=None):
+        return self.row_handler.get_rows(table_name, conditions, limit, after, layout, filters)
+
+    def aggregate_rows(self, table_name, group_by=None, aggregates=None, filters=None, order_by: Optional[str] = None,
+                       limit: Optional[int] = None, index: Optional[str] = None):
+        key = ('aggregate_rows', table_name, tuple(group_by or ()), tuple(aggregates or ()), tuple(tuple(item) for item in filters or ()),
+               order_by, limit, index)
+        return self._cached(table_name, key, lambda: self._aggregate_rows(table_name, group_by, aggregates, filters, order_by, limit, index))
+
+    @connection_required
+    def _aggregate_rows(self, table_name, group_by=None, aggregates=None, filters=None, order_by: Optional[str] = None,
+                        limit: Optional[int] = None, index: Optional[str] = None):
+        return self.row_handler.aggregate_rows(table_name, group_by, aggregates, filters, order_by, limit, index)
+
+    def sample_rows(self, table_name, method: str = 'uniform', n: Optional[int] = None, fraction: Optional[float] = None,
+                    by: Optional[str] = None, seed: Optional[int] = None, filters=None):
+        if seed is None:
+            # Each unseeded request is a fresh draw
+            return self._sample_rows(table_name, method, n, fraction, by, seed, filters)
+        key = ('sample_rows', table_name, method, n, fraction, by, seed, tuple(tuple(item) for item in filters or ()))
+        return self._cached(table_name, key, lambda: self._sample_rows(table_name, method, n, fraction, by, seed, filters))
+
     @connection_required
-    def get_rows(self, table_name, conditions):
-        return self.row_handler.get_rows(table_name, conditions)
+    def _sample_rows(self, table_name, method: str = 'uniform', n: Optional[int] = None, fraction: Optional[float] = None,
+                     by: Optional[str] = None, seed: Optional[int] = None, filters=None):
+        return self.row_handler.sample_rows(table_name, method, n, fraction, by, seed, filters)
 
     @connection_required
+    def stream_rows(self, table_name, conditions=None, batch_size: Optional[int] = None, filters=None):
+        return self.row_handler.stream_rows(table_name, conditions, batch_size or self.stream_batch_size, filters)
+
+    """
+    Insert rows into a table, through the group-commit write queue when it is enabled
+    The queued call returns once the group holding its rows is committed; the connection is only held by the queue.
+    """
     def insert_rows(self, table_name, data):
-        return self.row_handler.insert_rows(table_name, data)
+        # A caller that already holds a connection writes directly, waiting on the queue could deadlock on the writer
+        if self.write_queue is None or self.connection_handler.connected:
+            return self._insert_rows(table_name, data)
+        return self.write_queue.submit(table_name, data).result()
+
+    @connection_required(write=True)
+    def _insert_rows(self, table_name, data):
+        with self._writing(table_name):
+            return self.row_handler.insert_rows(table_name, data, before_commit=lambda: self._record_inserts(table_name, [data]))
+
+    @connection_required(write=True)
+    def insert_row_batches(self, batches):
+        with self._writing(*{table_name for table_name, _ in batches}):
+            return self.row_handler.insert_row_batches(batches, before_commit=lambda results: self._record_batch_inserts(batches, results)), 200
+
+    @connection_required(write=True)
+    def bulk_insert(self, table_name, columns, row_chunks, transaction_rows: Optional[int] = None, defer_indexes: bool = True):
+        with self._writing(table_name):
+            # Summarising every value would cost more than the load itself, the statistics are marked stale instead
+            # and rebuilt by the next recompute
+            result, status = self.row_handler.bulk_insert(table_name, columns, row_chunks, transaction_rows or self.bulk_transaction_rows, defer_indexes,
+                                                          before_commit=lambda: self._mark_column_stats_stale_in_write(table_name))
+            if status == 500:
+                # Rows committed before the failure are not in the statistics
+                self._mark_column_stats_stale(table_name)
+            return result, status
+
+    # A bulk load that died midway leaves its deferred indexes dropped, they are rebuilt on startup
+    @connection_required(write=True)
+    def _restore_deferred_indexes(self):
+        return self.row_handler.restore_deferred_indexes(), 200
+
+    @connection_required(write=True)
+    def update_rows(self, table_name, data, upsert: bool = False):
+        with self._writing(table_name):
+            def mark_stale(report):
+                if report["changed"] or report["inserted"]:
+                    self._mark_column_stats_stale_in_write(table_name)
+            return self.row_handler.update_rows(table_name, data, upsert, before_commit=mark_stale)
+
+    @connection_required(write=True)
+    def delete_rows(self, table_name, conditions):
+        with self._writing(table_name):
+            return self.row_handler.delete_rows(table_name, conditions, before_commit=lambda: self._mark_column_stats_stale_in_write(table_name))
+
+    """
+    Retrieves describe()-style statistics of every column of a table, maintained as rows are written
+    Parameters:
+        table_name (str) - The table to describe
+        recompute (bool) - Whether to rebuild the statistics with a full scan first
+    Returns:
+        - The table row count, a stale flag set after updates or deletes, and count, nulls, distinct (approximate),
+          min, max, mean, variance, std and approximate quantiles per column; or an error message
+        - HTTP Status Code (int)
+    """
+    def get_column_stats(self, table_name: str, recompute: bool = False) -> Tuple[Any, int]:
+        if self.column_stats is None:
+            return "Column statistics are disabled (COLUMN_STATS_ENABLED=false).", 404
+        if not recompute:
+            result, status = self._read_column_stats(table_name)
+            # Tables written before statistics were kept have none yet, they are computed once
+            if status != 200 or result is not None:
+                return result, status
+        return self._recompute_column_stats(table_name)
+
+    @connection_required
+    def _read_column_stats(self, table_name: str) -> Tuple[Any, int]:
+        status = self.validate_table_status(table_name, exist_condition=True)
+        if status is not None:
+            return status
+        table_info = self.table_handler.table_info(table_name)
+        return self.column_stats.describe(self.column_stats.load(self.connection_handler.cursor, table_name), table_info), 200
+
+    @connection_required
+    def _recompute_column_stats(self, table_name: str) -> Tuple[Any, int]:
+        status = self.validate_table_status(table_name, exist_condition=True)
+        if status is not None:
+            return status
+        table_info = self.table_handler.table_info(table_name)
+        # The scan runs on a reader; a write that lands while it runs may be missing from it
+        version = self.table_versions.get(table_name)
+        stats = self.column_stats.compute(self.connection_handler.cursor, table_info, self.stream_batch_size)
+        stale = self.table_versions.get(table_name) != version
+        self._store_column_stats(table_name, stats, stale)
+        now = time.time()
+        return self.column_stats.describe({column: (column_stats, stale, now) for column, column_stats in stats.items()}, table_info), 200
+
+    @connection_required(write=True)
+    def _store_column_stats(self, table_name: str, stats, stale: bool) -> None:
+        self._update_column_stats(lambda cursor: self.column_stats.save(cursor, table_name, stats, stale))
+
+    def _record_batch_inserts(self, batches, results) -> None:
+        inserted = {}
+        for (table_name, rows), (_, status) in zip(batches, results):
+            if status == 201:
+                inserted.setdefault(table_name, []).append(rows)
+        for table_name, row_lists in inserted.items():
+            self._record_inserts(table_name, row_lists)
+
+    def _record_inserts(self, table_name: str, row_lists) -> None:
+        if self.column_stats is None:
+            return
+        table_info = self.table_handler.table_info(table_name)
+        inserted = {column: self.column_stats.new_stats() for column in table_info.columns}
+        for rows in row_lists:
+            for column, column_stats in self.column_stats.summarize_rows(table_info.columns, rows).items():
+                inserted[column].merge(column_stats)
+        self._update_column_stats_in_write(table_name, lambda cursor: self.column_stats.merge(cursor, table_info, inserted))
+
+    def _mark_column_stats_stale(self, table_name: str) -> None:
+        self._update_column_stats(lambda cursor: self.column_stats.mark_stale(cursor, table_name))
+
+    def _mark_column_stats_stale_in_write(self, table_name: str) -> None:
+        self._update_column_stats_in_write(table_name, lambda cursor: self.column_stats.mark_stale(cursor, table_name))
+
+    # Runs inside the write's own transaction, so the statistics commit with the rows at no extra commit. An update
+    # that fails is rolled back to its savepoint and the table marked stale instead, it never fails the write itself
+    def _update_column_stats_in_write(self, table_name: str, update: Callable) -> None:
+        if self.column_stats is None:
+            return
+        cursor = self.connection_handler.cursor
+        cursor.execute("SAVEPOINT column_stats")
+        try:
+            update(cursor)
+        except Exception as e:
+            cursor.execute("ROLLBACK TO column_stats")
+            self.logger.error("Failed to update column statistics of %s, marking them stale: %s", table_name, e)
+            try:
+                self.column_stats.mark_stale(cursor, table_name)
+            except Exception as e:
+                self.logger.error("Failed to mark column statistics of %s stale: %s", table_name, e)
+        finally:
+            cursor.execute("RELEASE column_stats")
+
+    # Runs on the writer in a transaction of its own, for schema changes and recomputed statistics
+    def _update_column_stats(self, update: Callable) -> None:
+        if self.column_stats is None:
+            return
+        try:
+            update(self.connection_handler.cursor)
+            self.connection_handler.db.commit()
+        except Exception as e:
+            self.connection_handler.db.rollback()
+            self.logger.error("Failed to update column statistics: %s", e)
+
+    @connection_required
+    def list_indexes(self, table_name):
+        return self.table_handler.list_indexes(table_name)
+
+    @connection_required(write=True)
+    def create_index(self, table_name, columns, index_name: Optional[str] = None, unique: bool = False):
+        message, status = self.table_handler.create_index(table_name, columns, index_name, unique)
+        if status == 201:
+            self.index_advisor.reset_plans(table_name)
+        return message, status
+
+    @connection_required(write=True)
+    def drop_index(self, table_name, index_name):
+        message, status = self.table_handler.drop_index(table_name, index_name)
+        if status == 200:
+            self.index_advisor.reset_plans(table_name)
+        return message, status
 
+    """
+    Recommends indexes for the hottest filtered query shapes that SQLite answers with a full table scan
+    Parameters:
+        limit (int) - The maximum number of recommendations
+        min_hits (int) - Ignore query shapes executed fewer times than this
+        apply (bool) - Whether to build the recommended indexes
+    Returns:
+        - A dictionary with the "recommendations" and, when applied, the "created" index results
+        - HTTP Status Code (int)
+    """
     @connection_required
-    def update_rows(self, table_name, data):
-        return self.row_handler.update_rows(table_name, data)
\ No newline at end of file
+    def get_index_advice(self, limit: int = 10, min_hits: int = 1, apply: bool = False):
+        recommendations = self.index_advisor.recommendations(self.table_handler.table_info, limit=limit, min_hits=min_hits)
+        result = {"recommendations": recommendations}
+        if apply:
+            result["created"] = []
+            for recommendation in recommendations:
+                message, status = self.create_index(recommendation["table"], recommendation["columns"])
+                result["created"].append({"table": recommendation["table"], "message": message, "status": status})
+        return result, 200
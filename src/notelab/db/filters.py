@@ -0,0 +1,167 @@
+"""
+This module compiles structured row filters into parameterized SQL
+
+Filters are (key, value) pairs, usually straight from the query string:
+    column=value            column = value
+    column__eq=value        column = value
+    column__ne=value        column != value, rows where column is NULL never match (see isnull)
+    column__lt=value        column < value (also __le, __gt, __ge)
+    column__in=a,b,c        column IN (a, b, c)
+    column__isnull=true     column IS NULL (false for IS NOT NULL)
+    column__prefix=abc      column >= 'abc' AND column < 'abd' on TEXT columns, column GLOB 'abc*' otherwise
+    order_by=-col1,col2     ORDER BY col1 DESC, col2 ASC
+
+Values are converted to the column's type affinity so numeric columns compare as numbers and
+can use their indexes. Prefixes match case-sensitively; on TEXT columns the range can seek an
+index with the default BINARY collation, which a case-insensitive LIKE cannot. Every value is a
+bound parameter, so the SQL text only depends on the shape of the filter and SQLite's statement
+cache can reuse the prepared statement.
+"""
+
+import json
+import sys
+from typing import Iterable, List, Optional, Tuple
+
+from .schema_catalog import TableInfo
+
+OPERATORS = {
+    'eq': '=',
+    'ne': '!=',
+    'lt': '<',
+    'le': '<=',
+    'gt': '>',
+    'ge': '>=',
+}
+
+ORDER_BY_KEY = 'order_by'
+
+
+class FilterError(ValueError):
+    """Raised when a filter does not match the table schema or cannot be parsed"""
+
+
+class CompiledFilter:
+
+    def __init__(self, where: List[str], params: list, order_by: List[Tuple[str, str]], predicates: List[Tuple[str, str]]):
+        self.where = where
+        self.params = params
+        self.order_by = order_by
+        # (column, operator) pairs, the shape of the filter independently of its values
+        self.predicates = predicates
+
+    @property
+    def where_clause(self) -> str:
+        return " AND ".join(self.where) if self.where else "1=1"
+
+    @property
+    def order_by_clause(self) -> str:
+        if not self.order_by:
+            return ""
+        return " ORDER BY " + ", ".join(f"{column} {direction}" for column, direction in self.order_by)
+
+
+"""
+Returns the SQLite type affinity (INTEGER, TEXT, BLOB, REAL or NUMERIC) of a declared column type
+"""
+def affinity(declared_type: Optional[str]) -> str:
+    declared_type = (declared_type or '').upper()
+    if 'INT' in declared_type:
+        return 'INTEGER'
+    if any(token in declared_type for token in ('CHAR', 'CLOB', 'TEXT')):
+        return 'TEXT'
+    if not declared_type or 'BLOB' in declared_type:
+        return 'BLOB'
+    if any(token in declared_type for token in ('REAL', 'FLOA', 'DOUB')):
+        return 'REAL'
+    return 'NUMERIC'
+
+def coerce(value: str, declared_type: Optional[str], column: str):
+    column_affinity = affinity(declared_type)
+    try:
+        if column_affinity == 'INTEGER':
+            return int(value)
+        if column_affinity == 'REAL':
+            return float(value)
+    except ValueError:
+        raise FilterError(f"Value '{value}' is not valid for {column_affinity} column '{column}'")
+    if column_affinity == 'NUMERIC':
+        for convert in (int, float):
+            try:
+                return convert(value)
+            except ValueError:
+                pass
+    return value
+
+# The smallest string greater than every string starting with the prefix, None if there is none.
+# BINARY collation compares UTF-8 bytes, which sort in code point order.
+def _prefix_upper_bound(prefix: str) -> Optional[str]:
+    prefix = prefix.rstrip(chr(sys.maxunicode))
+    if not prefix:
+        return None
+    code_point = ord(prefix[-1]) + 1
+    if 0xD800 <= code_point <= 0xDFFF:
+        # Surrogates cannot be encoded in UTF-8
+        code_point = 0xE000
+    return prefix[:-1] + chr(code_point)
+
+def _escape_glob(value: str) -> str:
+    return ''.join(f'[{char}]' if char in '*?[' else char for char in value)
+
+"""
+Compiles filters against a table schema
+Parameters:
+    filters (Iterable[Tuple[str, str]]) - (key, value) pairs, see the module docstring
+    table_info (TableInfo) - The cached schema of the filtered table
+Returns:
+    CompiledFilter with the WHERE predicates, bound parameters and ORDER BY terms
+Raises:
+    FilterError if a column or operator is unknown or a value does not fit its column
+"""
+def compile_filters(filters: Iterable[Tuple[str, str]], table_info: TableInfo) -> CompiledFilter:
+    where, params, order_by, predicates = [], [], [], []
+
+    for key, value in filters:
+        if key == ORDER_BY_KEY:
+            for term in value.split(','):
+                term = term.strip()
+                if not term:
+                    continue
+                direction = 'DESC' if term.startswith('-') else 'ASC'
+                column = term.lstrip('+-')
+                if column not in table_info.types:
+                    raise FilterError(f"Unknown column '{column}' in order_by")
+                order_by.append((column, direction))
+            continue
+
+        column, _, operator = key.partition('__')
+        operator = operator or 'eq'
+        if column not in table_info.types:
+            raise FilterError(f"Unknown column '{column}' for table '{table_info.name}'")
+        declared_type = table_info.types[column]
+
+        if operator in OPERATORS:
+            where.append(f"{column} {OPERATORS[operator]} ?")
+            params.append(coerce(value, declared_type, column))
+        elif operator == 'in':
+            # A single JSON array parameter keeps the SQL text the same whatever the list length
+            values = [coerce(item.strip(), declared_type, column) for item in value.split(',') if item.strip()]
+            where.append(f"{column} IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(values))
+        elif operator == 'isnull':
+            if value.lower() not in ('true', 'false', '1', '0'):
+                raise FilterError(f"isnull expects true or false, got '{value}'")
+            where.append(f"{column} IS NULL" if value.lower() in ('true', '1') else f"{column} IS NOT NULL")
+        elif operator == 'prefix':
+            if affinity(declared_type) == 'TEXT':
+                upper_bound = _prefix_upper_bound(value)
+                where.append(f"{column} >= ?" + (f" AND {column} < ?" if upper_bound is not None else ""))
+                params += [value] + ([upper_bound] if upper_bound is not None else [])
+            else:
+                # Numbers are matched on their text form, as LIKE did
+                where.append(f"{column} GLOB ?")
+                params.append(_escape_glob(value) + '*')
+        else:
+            raise FilterError(f"Unknown filter operator '{operator}' on column '{column}'")
+        predicates.append((column, operator))
+
+    return CompiledFilter(where, params, order_by, predicates)
@@ -0,0 +1,143 @@
+"""
+This class is responsible for recording filtered query shapes and recommending indexes for the ones SQLite scans
+"""
+
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+from .filters import CompiledFilter, affinity
+from .schema_catalog import TableInfo
+
+# Operators that an index can serve with an equality lookup, in front of at most one range column
+EQUALITY_OPERATORS = {'eq', 'in', 'isnull'}
+RANGE_OPERATORS = {'lt', 'le', 'gt', 'ge'}
+# prefix is a range on TEXT columns only, elsewhere it compiles to a GLOB that no index serves
+TEXT_RANGE_OPERATORS = {'prefix'}
+
+
+class QueryShape:
+
+    def __init__(self, table_name: str, sql: str, compiled: CompiledFilter):
+        self.table_name = table_name
+        self.sql = sql
+        self.predicates = compiled.predicates
+        self.order_by = compiled.order_by
+        self.hits = 0
+        self.plan: Optional[List[str]] = None
+        self.full_scan = False
+
+
+class IndexAdvisor:
+
+    def __init__(self, max_shapes: int = 1000, max_covering_columns: int = 4):
+        self.max_shapes = max_shapes
+        self.max_covering_columns = max_covering_columns
+        self._shapes: Dict[str, QueryShape] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    """
+    Records one execution of a filtered query, explaining its plan the first time the shape is seen
+    Parameters:
+        cursor (sqlite3.Cursor) - A cursor on the connection that runs the query
+        table_name (str) - The filtered table
+        compiled (CompiledFilter) - The compiled filters of the query
+        sql (str) - The SQL text, which identifies the shape since all values are bound
+        params (list) - The bound values, needed to explain the query
+    """
+    def observe(self, cursor: sqlite3.Cursor, table_name: str, compiled: CompiledFilter, sql: str, params: list) -> None:
+        if not compiled.predicates:
+            return
+        with self._lock:
+            shape = self._shapes.get(sql)
+            if shape is None:
+                if len(self._shapes) >= self.max_shapes:
+                    return
+                shape = QueryShape(table_name, sql, compiled)
+                self._shapes[sql] = shape
+            shape.hits += 1
+            needs_plan = shape.plan is None
+            generation = self._generation
+
+        if needs_plan:
+            # EXPLAIN never opens a read transaction, so neither it nor a cached EXPLAIN statement notices
+            # DDL from other connections. Reading sqlite_master refreshes the schema, and the generation
+            # comment gives the statement a new text after every reset so it is not served from the cache.
+            cursor.execute("SELECT count(*) FROM sqlite_master")
+            cursor.fetchone()
+            cursor.execute(f"EXPLAIN QUERY PLAN /* plan {generation} */ {sql}", params)
+            plan = [row[3] for row in cursor.fetchall()]
+            with self._lock:
+                shape.plan = plan
+                shape.full_scan = any(detail == f"SCAN {table_name}" or detail.startswith(f"SCAN {table_name} ") for detail in plan)
+
+    """
+    Forgets the plans of a table's shapes, e.g. after its indexes changed, so they are explained again
+    """
+    def reset_plans(self, table_name: Optional[str] = None) -> None:
+        with self._lock:
+            self._generation += 1
+            for shape in self._shapes.values():
+                if table_name is None or shape.table_name == table_name:
+                    shape.plan = None
+                    shape.full_scan = False
+
+    """
+    Recommends one index per scanned query shape, hottest first
+    Parameters:
+        table_info_for (callable) - Returns the TableInfo of a table name, used to decide on covering indexes
+        limit (int) - The maximum number of recommendations
+        min_hits (int) - Ignore shapes executed fewer times than this
+    Returns:
+        A list of dictionaries with the table, index columns, hits, covering flag and the observed plan
+    """
+    def recommendations(self, table_info_for, limit: int = 10, min_hits: int = 1) -> List[dict]:
+        with self._lock:
+            scanned = [shape for shape in self._shapes.values() if shape.full_scan and shape.hits >= min_hits]
+            scanned.sort(key=lambda shape: shape.hits, reverse=True)
+
+        advice, seen = [], set()
+        for shape in scanned:
+            table_info: Optional[TableInfo] = table_info_for(shape.table_name)
+            columns = self._index_columns(shape, table_info) if table_info is not None else []
+            if not columns:
+                continue
+            covering = False
+            # Narrow tables, of at most max_covering_columns columns, get covering indexes so SELECT * never has to
+            # visit the table b-tree; such an index holds a second copy of every column of the table
+            if len(table_info.columns) <= self.max_covering_columns:
+                columns += [column for column in table_info.columns if column not in columns]
+                covering = True
+            key = (shape.table_name, tuple(columns))
+            if key in seen:
+                continue
+            seen.add(key)
+            advice.append({
+                "table": shape.table_name,
+                "columns": columns,
+                "covering": covering,
+                "hits": shape.hits,
+                "sql": shape.sql,
+                "plan": shape.plan,
+            })
+            if len(advice) >= limit:
+                break
+        return advice
+
+    @staticmethod
+    def _index_columns(shape: QueryShape, table_info: TableInfo) -> List[str]:
+        # Equality columns first, then a single range column, then the sort columns
+        columns: List[str] = []
+        for column, operator in shape.predicates:
+            if operator in EQUALITY_OPERATORS and column not in columns:
+                columns.append(column)
+        for column, operator in shape.predicates:
+            is_range = operator in RANGE_OPERATORS or (operator in TEXT_RANGE_OPERATORS and affinity(table_info.types.get(column)) == 'TEXT')
+            if is_range and column not in columns:
+                columns.append(column)
+                break
+        for column, _ in shape.order_by:
+            if column not in columns:
+                columns.append(column)
+        return columns
@@ -0,0 +1,116 @@
+"""
+This class is responsible for caching query results per table within a memory budget, evicting least recently used entries
+"""
+
+import sys
+import threading
+from collections import OrderedDict
+from itertools import islice
+from typing import Any, Dict, Hashable, Optional, Set
+
+from .table_versions import TableVersions
+
+
+"""
+Estimates the memory held by a result, extrapolating from a sample of each container's items
+"""
+def estimate_size(value: Any, sample: int = 8) -> int:
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        items = list(islice(value.items(), sample))
+        if items:
+            size += len(value) * sum(estimate_size(key, sample) + estimate_size(item, sample) for key, item in items) // len(items)
+    elif isinstance(value, (list, tuple)):
+        items = value[:sample]
+        if items:
+            size += len(value) * sum(estimate_size(item, sample) for item in items) // len(items)
+    return size
+
+
+class ResultCache:
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, versions: Optional[TableVersions] = None):
+        self.max_bytes = max_bytes
+        # key -> (table_name, value, size, version), least recently used first
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._keys_by_table: Dict[str, Set[Hashable]] = {}
+        # Bumped on every write to a table so results computed before the write are never stored after it
+        self.versions = versions or TableVersions()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    """
+    Retrieves a cached result
+    Returns:
+        The cached value, or None on a miss
+    """
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            # Writes by other processes are not invalidated, they only show in the table version
+            if entry is not None and self.versions.get(entry[0]) != entry[3]:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[1]
+
+    def version(self, table_name: str) -> int:
+        return self.versions.get(table_name)
+
+    """
+    Caches a result, evicting least recently used entries until it fits the memory budget
+    Parameters:
+        key (Hashable) - The cache key, including the table name and every argument that shapes the result
+        table_name (str) - The table the result was read from
+        value (Any) - The result; callers share it, so it must not be mutated
+        version (int) - The table version read before the query ran; a write since then discards the result
+    """
+    def put(self, key: Hashable, table_name: str, value: Any, version: int) -> None:
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if self.versions.get(table_name) != version:
+                return
+            if key in self._entries:
+                self._remove(key)
+            while self._entries and self._bytes + size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._stats["evictions"] += 1
+            self._entries[key] = (table_name, value, size, version)
+            self._keys_by_table.setdefault(table_name, set()).add(key)
+            self._bytes += size
+
+    """
+    Drops every cached result of a table, called after each write to it
+    The table version must be bumped first, so a result read before the write cannot be stored afterwards
+    """
+    def invalidate(self, table_name: str) -> None:
+        with self._lock:
+            keys = self._keys_by_table.pop(table_name, set())
+            for key in keys:
+                self._remove(key)
+            self._stats["invalidations"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_table.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+    def _remove(self, key: Hashable) -> None:
+        table_name, _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+        keys = self._keys_by_table.get(table_name)
+        if keys is not None:
+            keys.discard(key)
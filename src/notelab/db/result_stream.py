@@ -0,0 +1,80 @@
+"""
+This class is responsible for iterating a query result in bounded batches instead of fetching it all at once
+"""
+
+import sqlite3
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+
+"""
+Builds a columnar layout {"columns": [...], "data": {column: [values]}} from batches of row tuples
+"""
+def columnar(columns: List[str], batches: Iterable[List[tuple]]) -> dict:
+    data = {column: [] for column in columns}
+    values = [data[column] for column in columns]
+    for batch in batches:
+        if not batch:
+            continue
+        for column_values, batch_values in zip(values, zip(*batch)):
+            column_values.extend(batch_values)
+    return {"columns": columns, "data": data}
+
+
+class ResultStream:
+
+    def __init__(self, cursor: sqlite3.Cursor, batch_size: int = 1000, on_close: Optional[Callable[[], None]] = None, types: Optional[Dict[str, str]] = None):
+        self.cursor = cursor
+        self.batch_size = batch_size
+        self.columns = [description[0] for description in cursor.description]
+        # Declared SQLite column types, when the stream reads straight from a table
+        self.types = types or {}
+        self._on_close = on_close
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    """
+    Yields the result as lists of row tuples of at most batch_size rows
+    The stream closes itself once the cursor is exhausted
+    """
+    def batches(self) -> Iterator[List[tuple]]:
+        try:
+            while not self._closed:
+                rows = self.cursor.fetchmany(self.batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            self.close()
+
+    """
+    Yields the result one row at a time as dictionaries keyed by column name
+    """
+    def __iter__(self) -> Iterator[dict]:
+        columns = self.columns
+        for batch in self.batches():
+            for row in batch:
+                yield dict(zip(columns, row))
+
+    """
+    Consumes the stream into the columnar layout
+    """
+    def to_columnar(self) -> dict:
+        return columnar(self.columns, self.batches())
+
+    """
+    Releases the cursor and the connection behind it. Safe to call more than once.
+    """
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self.cursor.close()
+        finally:
+            if self._on_close is not None:
+                self._on_close()
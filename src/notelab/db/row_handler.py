@@ -1,13 +1,32 @@
 import logging
+import random
 import sqlite3
-from typing import List, Optional, Tuple
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+from notelab.db.aggregates import compile_aggregate
 from notelab.db.connection_handler import ConnectionHandler
+from notelab.db.filters import CompiledFilter, FilterError, compile_filters
+from notelab.db.index_advisor import IndexAdvisor
+from notelab.db.result_stream import ResultStream, columnar
+from notelab.db.sampling import METHODS, RowSampler
 from notelab.db.table_handler import TableHandler
+from notelab.db.utils import decode_cursor, encode_cursor
+from notelab.utils.app_logger import LazyMessage
+
+# Indexes dropped by a bulk load are recorded here until rebuilt, so a load that never finishes is repaired on restart
+DEFERRED_INDEXES_TABLE = '_notelab_deferred_indexes'
 
 class RowHandler:
 
-    def __init__(self, logger: logging.Logger, db_name: str, messages: dict, connection_handler: ConnectionHandler, table_handler: TableHandler):
+    def __init__(self, logger: logging.Logger, db_name: str, messages: dict, connection_handler: ConnectionHandler, table_handler: TableHandler, page_size: int = 100,
+                 index_advisor: Optional[IndexAdvisor] = None, bulk_pragmas: Optional[Dict[str, Union[str, int]]] = None,
+                 update_batch_rows: int = 50000):
         self.logger = logger
+        self.update_batch_rows = update_batch_rows
+        # PRAGMAs set on the connection for the duration of bulk_insert
+        self.bulk_pragmas = bulk_pragmas if bulk_pragmas is not None else {"synchronous": "OFF", "temp_store": "MEMORY"}
+        self.page_size = page_size
+        self.index_advisor = index_advisor
         self.MESSAGES = messages
         self.db_name = db_name
         self.connection_handler = connection_handler
@@ -24,15 +43,20 @@ class RowHandler:
 
     def validate_table_status(self, table_name: str, exist_condition: bool = False) -> Optional[Tuple[str, int]]:
         return self.table_handler.validate_table_status(table_name, exist_condition)
+
+    def compile_filters(self, table_name: str, conditions: Optional[List[str]], filters: Optional[List[Tuple[str, str]]]) -> CompiledFilter:
+        compiled = compile_filters(filters or [], self.table_handler.table_info(table_name))
+        if conditions:
+            compiled.where = list(conditions) + compiled.where
+        return compiled
+
+    def observe_query(self, table_name: str, compiled: CompiledFilter, query: str, params: list) -> None:
+        if self.index_advisor is not None:
+            self.index_advisor.observe(self.cursor(), table_name, compiled, query, params)
     
     def get_primary_key_column(self, table_name: str) -> Optional[str]:
-        self.cursor().execute(f"PRAGMA table_info({table_name})")
-        primary_key_column = None
-        for column_info in self.cursor().fetchall():
-            if column_info[5] == 1:  # pk flag is column 5 in PRAGMA table_info
-                primary_key_column = column_info[1]  # Index 1 is column name
-                break
-        return primary_key_column
+        table_info = self.table_handler.table_info(table_name)
+        return table_info.primary_key if table_info is not None else None
 
     """
     Retrieves a row based on primary key from table in SQLite Database
@@ -49,20 +73,21 @@ class RowHandler:
             if status is not None:
                 return None, status[1]
 
-            primary_key_column = self.get_primary_key_column(table_name)
+            # Tables without a declared primary key are addressed by rowid
+            primary_key_column = self.get_primary_key_column(table_name) or 'rowid'
 
             query = f"SELECT * FROM {table_name} WHERE {primary_key_column} = ?"
             self.cursor().execute(query, (primary_key_value,))
             row = self.cursor().fetchone()
 
             if row is None:
-                self.logger.info(self.MESSAGES["ROW_NOT_FOUND"].format(table_name=table_name, row_id=primary_key_value))
+                self.logger.info(LazyMessage(self.MESSAGES["ROW_NOT_FOUND"], table_name=table_name, row_id=primary_key_value))
                 return None, 404
 
             column_names = [description[0] for description in self.cursor().description]
             row_data = dict(zip(column_names, row))
 
-            self.logger.info(self.MESSAGES["ROW_RETRIEVAL_SUCCESS"].format(table_name=table_name, row_id=primary_key_value))
+            self.logger.info(LazyMessage(self.MESSAGES["ROW_RETRIEVAL_SUCCESS"], table_name=table_name, row_id=primary_key_value))
             return row_data, 200
 
         except Exception as e:
@@ -74,28 +99,252 @@ class RowHandler:
     Retrieves rows from table in SQLite Database based on conditions
     Parameters:
         - table_name (str) - The name of the table to retrieve rows from
-        - conditions (List[str]) - A list of conditions to filter the rows by
+        - conditions (List[str]) - A list of raw SQL conditions to filter the rows by
+        - limit (int) - If given, return a single page of at most this many rows
+        - after (str) - The opaque cursor returned as "next" by the previous page
+        - layout (str) - "rows" for a list of dictionaries, "columnar" for {"columns": [...], "data": {column: [...]}}
+        - filters (List[Tuple[str, str]]) - Structured (key, value) filters, see notelab.db.filters
     Returns:
-        - A list of dictionaries representing the rows of the table if found, None otherwise
+        - A list of dictionaries representing the rows of the table if found, None otherwise.
+          When paginated, a dictionary with the page "rows" and the "next" cursor (None on the last page)
         - HTTP Status Code (int)
     """
-    def get_rows(self, table_name: str, conditions: List[str]) -> Tuple[Optional[List[dict]], int]:
+    def get_rows(self, table_name: str, conditions: Optional[List[str]] = None, limit: Optional[int] = None, after: Optional[str] = None,
+                 layout: str = 'rows', filters: Optional[List[Tuple[str, str]]] = None) -> Tuple[Optional[Union[List[dict], dict]], int]:
         try:
             status = self.validate_table_status(table_name=table_name, exist_condition=True)
             if status is not None:
                 return None, status[1]
 
-            condition_str = " AND ".join(conditions) if conditions else "1=1"  # Select all if no conditions
-            query = f"SELECT * FROM {table_name} WHERE {condition_str}"
-            self.cursor().execute(query)
+            compiled = self.compile_filters(table_name, conditions, filters)
+            if limit is not None or after is not None:
+                return self.get_rows_page(table_name, compiled, limit, after, layout)
+
+            query = f"SELECT * FROM {table_name} WHERE {compiled.where_clause}{compiled.order_by_clause}"
+            self.observe_query(table_name, compiled, query, compiled.params)
+            self.cursor().execute(query, compiled.params)
             columns = [column[0] for column in self.cursor().description]
-            rows = [dict(zip(columns, row)) for row in self.cursor().fetchall()]
+            if layout == 'columnar':
+                rows = columnar(columns, [self.cursor().fetchall()])
+            else:
+                rows = [dict(zip(columns, row)) for row in self.cursor().fetchall()]
 
             message = self.MESSAGES["ROWS_FOUND"].format(table_name=table_name)
             self.logger.info(message)
 
             return rows, 200
 
+        except FilterError as e:
+            self.logger.warning(str(e))
+            return str(e), 400
+
+        except Exception as e:
+            message = f"{self.MESSAGES['ROWS_RETRIEVAL_FAILED'].format(table_name=table_name)}: {str(e)}"
+            self.logger.error(message)
+            return None, 500
+
+    """
+    Retrieves one page of rows using keyset pagination on the primary key (or rowid)
+    Each page is an index seek past the previous page's last key, so the cost does not grow with the page number
+    Parameters:
+        - table_name (str) - The name of the table to retrieve rows from
+        - compiled (CompiledFilter) - The compiled filters of the rows
+        - limit (int) - The maximum number of rows in the page
+        - after (str) - The cursor of the previous page, None for the first page
+        - layout (str) - "rows" for a list of dictionaries, "columnar" for {"columns": [...], "data": {column: [...]}}
+    Returns:
+        - A dictionary with the page "rows" (or "columns" and "data") and the "next" cursor
+        - HTTP Status Code (int)
+    """
+    def get_rows_page(self, table_name: str, compiled: CompiledFilter, limit: Optional[int], after: Optional[str], layout: str = 'rows') -> Tuple[Union[dict, str], int]:
+        limit = limit if limit is not None else self.page_size
+        if limit <= 0:
+            return "Page limit must be a positive integer.", 400
+        if compiled.order_by:
+            return "order_by cannot be combined with pagination, pages are ordered by key.", 400
+        try:
+            after_key = decode_cursor(after) if after else None
+        except ValueError as e:
+            self.logger.warning(str(e))
+            return str(e), 400
+
+        table_info = self.table_handler.table_info(table_name)
+        # A single-column primary key is used as the key; otherwise the implicit rowid
+        key_column = table_info.primary_key if len(table_info.primary_keys) == 1 else 'rowid'
+
+        conditions = list(compiled.where)
+        params = list(compiled.params)
+        if after_key is not None:
+            conditions.append(f"{key_column} > ?")
+            params.append(after_key)
+        condition_str = " AND ".join(conditions) if conditions else "1=1"
+
+        # Fetch one extra row to know whether another page follows
+        query = f"SELECT {key_column} AS __page_key__, * FROM {table_name} WHERE {condition_str} ORDER BY {key_column} LIMIT ?"
+        params.append(limit + 1)
+        self.observe_query(table_name, compiled, query, params)
+        self.cursor().execute(query, params)
+        columns = [column[0] for column in self.cursor().description][1:]
+        page = self.cursor().fetchall()
+
+        has_next = len(page) > limit
+        page = page[:limit]
+        next_cursor = encode_cursor(page[-1][0]) if has_next else None
+
+        self.logger.info(LazyMessage(self.MESSAGES["ROWS_FOUND"], table_name=table_name))
+        if layout == 'columnar':
+            return {**columnar(columns, [[row[1:] for row in page]]), "next": next_cursor}, 200
+        rows = [dict(zip(columns, row[1:])) for row in page]
+        return {"rows": rows, "next": next_cursor}, 200
+
+    """
+    Aggregates rows inside SQLite, so only the grouped result leaves the database
+    Parameters:
+        - table_name (str) - The name of the table to aggregate
+        - group_by (List[str]) - The columns to group by, none for a single row over all matching rows
+        - aggregates (List[str]) - Aggregate terms such as count, sum:price or p95:latency, see notelab.db.aggregates
+        - filters (List[Tuple[str, str]]) - Structured (key, value) filters, the same as for get_rows
+        - order_by (str) - Comma-separated group-by columns or aggregate aliases, prefix with - for descending
+        - limit (int) - If given, return at most this many groups
+        - index (str) - If given, an index of the table to force with INDEXED BY, e.g. one covering the filtered,
+          grouped and aggregated columns so the table itself is never read
+    Returns:
+        - A list of dictionaries, one per group, with the group-by columns and the aggregate aliases
+        - HTTP Status Code (int)
+    """
+    def aggregate_rows(self, table_name: str, group_by: Optional[List[str]] = None, aggregates: Optional[List[str]] = None,
+                       filters: Optional[List[Tuple[str, str]]] = None, order_by: Optional[str] = None, limit: Optional[int] = None,
+                       index: Optional[str] = None) -> Tuple[Union[List[dict], str, None], int]:
+        try:
+            status = self.validate_table_status(table_name=table_name, exist_condition=True)
+            if status is not None:
+                return None, status[1]
+            if limit is not None and limit <= 0:
+                return "limit must be a positive integer.", 400
+
+            table_info = self.table_handler.table_info(table_name)
+            aggregate = compile_aggregate(group_by or [], aggregates or [], order_by, table_info)
+            compiled = self.compile_filters(table_name, None, filters)
+
+            indexed_by = ""
+            if index:
+                self.cursor().execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ? AND tbl_name = ?", (index, table_name))
+                if self.cursor().fetchone() is None:
+                    return f"Index '{index}' not found on table '{table_name}'.", 404
+                indexed_by = f' INDEXED BY "{index}"'
+
+            query = (f"SELECT {', '.join(aggregate.select)} FROM {table_name}{indexed_by} WHERE {compiled.where_clause}"
+                     f"{aggregate.group_by_clause}{aggregate.order_by_clause}")
+            params = aggregate.params + compiled.params
+            if limit is not None:
+                query += " LIMIT ?"
+                params.append(limit)
+            self.cursor().execute(query, params)
+            rows = [dict(zip(aggregate.aliases, row)) for row in self.cursor().fetchall()]
+
+            self.logger.info(LazyMessage(self.MESSAGES["ROWS_FOUND"], table_name=table_name))
+            return rows, 200
+
+        except FilterError as e:
+            self.logger.warning(str(e))
+            return str(e), 400
+
+        except Exception as e:
+            message = f"{self.MESSAGES['ROWS_RETRIEVAL_FAILED'].format(table_name=table_name)}: {str(e)}"
+            self.logger.error(message)
+            return None, 500
+
+    """
+    Draws a random sample of rows, reading close to the sample size rather than the table, see notelab.db.sampling
+    Parameters:
+        - table_name (str) - The name of the table to sample
+        - method (str) - "uniform" for n rows, "bernoulli" for each row with probability fraction, or "stratified"
+          for up to n rows per distinct value of the by column
+        - n (int) - The sample size, per stratum when stratified
+        - fraction (float) - The inclusion probability of a bernoulli sample, in (0, 1]
+        - by (str) - The column to stratify by
+        - seed (int) - Seed of the draw, the same seed returns the same rows while the table is unchanged; random if omitted
+        - filters (List[Tuple[str, str]]) - Structured (key, value) filters, the same as for get_rows; the sample is
+          drawn from the matching rows
+    Returns:
+        - A dictionary with the "method", the "seed" to repeat the draw with and the sampled "rows" in rowid order
+          (grouped by stratum when stratified, with the per-stratum counts under "strata")
+        - HTTP Status Code (int)
+    """
+    def sample_rows(self, table_name: str, method: str = 'uniform', n: Optional[int] = None, fraction: Optional[float] = None,
+                    by: Optional[str] = None, seed: Optional[int] = None, filters: Optional[List[Tuple[str, str]]] = None) -> Tuple[Union[dict, str, None], int]:
+        try:
+            status = self.validate_table_status(table_name=table_name, exist_condition=True)
+            if status is not None:
+                return None, status[1]
+            if method not in METHODS:
+                return f"Unknown sampling method '{method}', expected one of {', '.join(METHODS)}.", 400
+            if method == 'bernoulli':
+                if fraction is None or not 0 < fraction <= 1:
+                    return "A bernoulli sample needs a fraction between 0 (exclusive) and 1.", 400
+            elif n is None or n <= 0:
+                return f"A {method} sample needs n, a positive integer.", 400
+
+            table_info = self.table_handler.table_info(table_name)
+            if method == 'stratified' and by not in table_info.types:
+                return f"A stratified sample needs by, one of the columns of table '{table_name}'.", 400
+            compiled = self.compile_filters(table_name, None, filters)
+            if compiled.order_by:
+                return "order_by cannot be combined with sampling, samples are ordered by rowid.", 400
+
+            seed = seed if seed is not None else random.SystemRandom().randrange(2 ** 32)
+            sampler = RowSampler(self.cursor(), table_name, compiled, random.Random(seed))
+            result = {"method": method, "seed": seed}
+            if method == 'uniform':
+                sample = sampler.uniform(n)
+            elif method == 'bernoulli':
+                sample = sampler.bernoulli(fraction)
+            else:
+                strata = sampler.stratified(by, n)
+                result["strata"] = [{"value": value, "rows": len(rows)} for value, rows in strata.items()]
+                sample = [row for rows in strata.values() for row in rows]
+            result["rows"] = [dict(zip(table_info.columns, row)) for _, row in sample]
+
+            self.logger.info(LazyMessage(self.MESSAGES["ROWS_FOUND"], table_name=table_name))
+            return result, 200
+
+        except FilterError as e:
+            self.logger.warning(str(e))
+            return str(e), 400
+
+        except Exception as e:
+            message = f"{self.MESSAGES['ROWS_RETRIEVAL_FAILED'].format(table_name=table_name)}: {str(e)}"
+            self.logger.error(message)
+            return None, 500
+
+    """
+    Streams rows from table in SQLite Database based on conditions
+    Parameters:
+        - table_name (str) - The name of the table to stream rows from
+        - conditions (List[str]) - A list of raw SQL conditions to filter the rows by
+        - batch_size (int) - The number of rows fetched per batch
+        - filters (List[Tuple[str, str]]) - Structured (key, value) filters, see notelab.db.filters
+    Returns:
+        - A ResultStream over the matching rows if the table exists, None otherwise
+        - HTTP Status Code (int)
+    """
+    def stream_rows(self, table_name: str, conditions: Optional[List[str]] = None, batch_size: int = 1000,
+                    filters: Optional[List[Tuple[str, str]]] = None) -> Tuple[Optional[Union[ResultStream, str]], int]:
+        try:
+            status = self.validate_table_status(table_name=table_name, exist_condition=True)
+            if status is not None:
+                return None, status[1]
+
+            compiled = self.compile_filters(table_name, conditions, filters)
+            query = f"SELECT * FROM {table_name} WHERE {compiled.where_clause}{compiled.order_by_clause}"
+            self.observe_query(table_name, compiled, query, compiled.params)
+            types = self.table_handler.table_info(table_name).types
+            return self.table_handler.open_stream(query, tuple(compiled.params), batch_size=batch_size, types=types), 200
+
+        except FilterError as e:
+            self.logger.warning(str(e))
+            return str(e), 400
+
         except Exception as e:
             message = f"{self.MESSAGES['ROWS_RETRIEVAL_FAILED'].format(table_name=table_name)}: {str(e)}"
             self.logger.error(message)
@@ -135,24 +384,23 @@ class RowHandler:
     Parameters:
         - table_name (str) - The name of the table to insert rows into
         - rows (List[List[str]]) - A list of row data to insert
+        - before_commit (Callable) - Called inside the transaction once the rows are written, so its own writes
+          commit with them
     Returns:
         Response message (str)
         HTTP Status Code (int)
     """
-    def insert_rows(self, table_name: str, rows: List[List[str]]) -> Tuple[str, int]:
+    def insert_rows(self, table_name: str, rows: List[List[str]], before_commit: Optional[Callable[[], None]] = None) -> Tuple[str, int]:
         try:
             status = self.validate_table_status(table_name=table_name, exist_condition=True)
             if status is not None:
                 return status
 
-            self.cursor().execute(f"PRAGMA table_info({table_name})")
-            columns_info = self.cursor().fetchall()
-            column_names = [info[1] for info in columns_info]
-
-            placeholders = ', '.join(['?' for _ in column_names])
-            insert_query = f"INSERT INTO {table_name} ({', '.join(column_names)}) VALUES ({placeholders})"
+            insert_query = self.table_handler.table_info(table_name).insert_sql
 
             self.cursor().executemany(insert_query, rows)
+            if before_commit is not None:
+                before_commit()
             self.db().commit()
 
             message = self.MESSAGES["ROWS_INSERTION_SUCCESS"].format(table_name=table_name)
@@ -165,15 +413,209 @@ class RowHandler:
             self.logger.error(message)
             return message, 500
 
+    """
+    Insert several batches of rows, possibly into different tables, in a single transaction
+    Each batch runs in its own savepoint so a failing batch is rolled back without affecting the others.
+    Parameters:
+        - batches (List[Tuple[str, List[List]]]) - (table_name, rows) pairs
+        - before_commit (Callable) - Called with the results inside the transaction once every batch is written
+    Returns:
+        - One (response message, HTTP Status Code) pair per batch, in order
+    """
+    def insert_row_batches(self, batches: List[Tuple[str, List[List]]],
+                           before_commit: Optional[Callable[[List[Tuple[str, int]]], None]] = None) -> List[Tuple[str, int]]:
+        results = []
+        try:
+            # Without an explicit BEGIN, releasing the savepoint would commit each batch on its own
+            if not self.db().in_transaction:
+                self.cursor().execute("BEGIN")
+            for table_name, rows in batches:
+                status = self.validate_table_status(table_name=table_name, exist_condition=True)
+                if status is not None:
+                    results.append(status)
+                    continue
+                self.cursor().execute("SAVEPOINT insert_batch")
+                try:
+                    self.cursor().executemany(self.table_handler.table_info(table_name).insert_sql, rows)
+                    self.cursor().execute("RELEASE insert_batch")
+                    results.append((self.MESSAGES["ROWS_INSERTION_SUCCESS"].format(table_name=table_name), 201))
+                except sqlite3.Error as e:
+                    self.cursor().execute("ROLLBACK TO insert_batch")
+                    self.cursor().execute("RELEASE insert_batch")
+                    message = self.MESSAGES["ROWS_INSERTION_FAIL"].format(table_name=table_name) + f" {str(e)}"
+                    self.logger.error(message)
+                    results.append((message, 500))
+            if before_commit is not None:
+                before_commit(results)
+            self.db().commit()
+            self.logger.info("Group committed %s insert batch(es) with %s rows", len(batches), sum(len(rows) for _, rows in batches))
+            return results
+
+        except Exception as e:
+            self.db().rollback()
+            self.logger.error("Group commit of %s insert batch(es) failed: %s", len(batches), e)
+            return [(self.MESSAGES["ROWS_INSERTION_FAIL"].format(table_name=table_name) + f" {str(e)}", 500) for table_name, _ in batches]
+
+    """
+    Bulk insert chunks of rows into a table in SQLite Database
+    Non-unique secondary indexes are dropped for the load and rebuilt once at the end, which is cheaper than
+    updating them row by row, and the connection runs with the bulk PRAGMAs until the load finishes.
+    UNIQUE indexes are kept so the load cannot insert duplicates, and an index that fails to rebuild fails the load.
+    synchronous=OFF keeps the database consistent if the process dies, but not if the machine loses power.
+    Parameters:
+        - table_name (str) - The name of the table to insert rows into
+        - columns (List[str]) - The table columns that the row values map to, in order
+        - row_chunks (Iterable[List[List]]) - The rows to insert, one list of rows per chunk
+        - transaction_rows (int) - The number of rows committed per transaction
+        - defer_indexes (bool) - Whether to rebuild secondary indexes after the load instead of maintaining them
+        - before_commit (Callable) - Called inside the last transaction once every chunk is written
+    Returns:
+        - A load report (rows, seconds, rows_per_second, chunks, transactions, deferred_indexes) or an error message
+        - HTTP Status Code (int)
+    """
+    def bulk_insert(self, table_name: str, columns: List[str], row_chunks: Iterable[List[List]], transaction_rows: int = 100000,
+                    defer_indexes: bool = True, before_commit: Optional[Callable[[], None]] = None) -> Tuple[Union[dict, str], int]:
+        status = self.validate_table_status(table_name=table_name, exist_condition=True)
+        if status is not None:
+            return status
+
+        table_info = self.table_handler.table_info(table_name)
+        unknown = [column for column in columns if column not in table_info.types]
+        if unknown:
+            message = f"{self.MESSAGES['INVALID_ROWS'].format(table_name=table_name)} Unknown column(s): {', '.join(unknown)}"
+            self.logger.error(message)
+            return message, 400
+
+        if list(columns) == table_info.columns:
+            insert_query = table_info.insert_sql
+        else:
+            insert_query = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join(['?' for _ in columns])})"
+
+        report = {"rows": 0, "seconds": 0.0, "rows_per_second": 0.0, "chunks": 0, "transactions": 0, "deferred_indexes": []}
+        saved_pragmas = self._apply_pragmas(self.bulk_pragmas)
+        deferred, failed = {}, {}
+        start = time.perf_counter()
+        pending = 0
+
+        try:
+            if defer_indexes:
+                deferred = self._drop_secondary_indexes(table_name)
+                report["deferred_indexes"] = list(deferred)
+
+            for rows in row_chunks:
+                self.cursor().executemany(insert_query, rows)
+                report["rows"] += len(rows)
+                report["chunks"] += 1
+                pending += len(rows)
+                if pending >= transaction_rows:
+                    self.db().commit()
+                    report["transactions"] += 1
+                    pending = 0
+            if before_commit is not None:
+                before_commit()
+            if self.db().in_transaction:
+                self.db().commit()
+                report["transactions"] += 1
+
+            message = self.MESSAGES["ROWS_INSERTION_SUCCESS"].format(table_name=table_name)
+            self.logger.info(message)
+            status = 201
+
+        except Exception as e:
+            self.db().rollback()
+            report["rows"] -= pending
+            message = self.MESSAGES["ROWS_INSERTION_FAIL"].format(table_name=table_name) + f" {str(e)}"
+            self.logger.error(message)
+            status = 500
+
+        finally:
+            failed = self._restore_indexes(deferred)
+            self._apply_pragmas(saved_pragmas)
+            report["seconds"] = time.perf_counter() - start
+            report["rows_per_second"] = report["rows"] / report["seconds"] if report["seconds"] else 0.0
+
+        self.logger.info("Bulk loaded %s rows into %s in %.2fs (%.0f rows/s)", report['rows'], table_name, report['seconds'], report['rows_per_second'])
+        if failed:
+            index_errors = "; ".join(f"{index_name}: {error}" for index_name, error in failed.items())
+            message = self.MESSAGES["INDEX_REBUILD_FAIL"].format(table_name=table_name, index_names=", ".join(failed)) + f" {index_errors}"
+            self.logger.error(message)
+            return message, 500
+        if status != 201:
+            return f"{message} ({report['rows']} rows committed before the failure)", status
+        return report, status
+
+    def _apply_pragmas(self, pragmas: Dict[str, Union[str, int]]) -> Dict[str, Union[str, int]]:
+        previous = {}
+        for pragma, value in pragmas.items():
+            if value is None or value == '':
+                continue
+            self.cursor().execute(f"PRAGMA {pragma}")
+            previous[pragma] = self.cursor().fetchone()[0]
+            self.cursor().execute(f"PRAGMA {pragma} = {value}")
+        return previous
+
+    def _drop_secondary_indexes(self, table_name: str) -> Dict[str, str]:
+        # Only indexes from CREATE INDEX (origin 'c') without UNIQUE are dropped: constraint indexes must stay,
+        # and dropping a UNIQUE index would let the load insert duplicates that fail its rebuild
+        self.cursor().execute(f"PRAGMA index_list({table_name})")
+        names = [row[1] for row in self.cursor().fetchall() if not row[2] and row[3] == 'c']
+        if not names:
+            return {}
+        self.cursor().execute(f"SELECT name, sql FROM sqlite_master WHERE type='index' AND name IN ({', '.join('?' * len(names))})", names)
+        indexes = dict(self.cursor().fetchall())
+
+        # The definitions are recorded in the transaction that drops the indexes
+        self.cursor().execute(f"CREATE TABLE IF NOT EXISTS {DEFERRED_INDEXES_TABLE} (index_name TEXT PRIMARY KEY, table_name TEXT NOT NULL, "
+                              "sql TEXT NOT NULL) WITHOUT ROWID")
+        self.cursor().executemany(f"INSERT OR REPLACE INTO {DEFERRED_INDEXES_TABLE} (index_name, table_name, sql) VALUES (?, ?, ?)",
+                                  [(index_name, table_name, create_sql) for index_name, create_sql in indexes.items()])
+        for index_name in indexes:
+            self.cursor().execute(f"DROP INDEX {index_name}")
+        self.db().commit()
+        return indexes
+
+    # Rebuilds deferred indexes, returning the ones that failed to their error; those stay recorded for the next restart
+    def _restore_indexes(self, indexes: Dict[str, str]) -> Dict[str, str]:
+        failed = {}
+        for index_name, create_sql in indexes.items():
+            try:
+                self.cursor().execute("SELECT 1 FROM sqlite_master WHERE type='index' AND name=?", (index_name,))
+                if self.cursor().fetchone() is None:
+                    self.cursor().execute(create_sql)
+                self.cursor().execute(f"DELETE FROM {DEFERRED_INDEXES_TABLE} WHERE index_name = ?", (index_name,))
+                self.db().commit()
+            except sqlite3.Error as e:
+                self.db().rollback()
+                failed[index_name] = str(e)
+                self.logger.error("Failed to rebuild index %s after bulk load: %s", index_name, e)
+        return failed
+
+    """
+    Rebuilds the indexes that a bulk load dropped and never restored, e.g. because the process died during the load
+    Returns:
+        A dictionary of the indexes that could not be rebuilt to their error
+    """
+    def restore_deferred_indexes(self) -> Dict[str, str]:
+        try:
+            self.cursor().execute(f"SELECT index_name, sql FROM {DEFERRED_INDEXES_TABLE}")
+        except sqlite3.OperationalError:
+            # The table is only created by the first load that defers an index
+            return {}
+        indexes = dict(self.cursor().fetchall())
+        if indexes:
+            self.logger.warning("Rebuilding index(es) left dropped by an unfinished bulk load: %s", ', '.join(indexes))
+        return self._restore_indexes(indexes)
+
     """
     Delete rows from table in SQLite Database
     Parameters:
         - table_name (str) - The name of the table to delete rows from
+        - before_commit (Callable) - Called inside the transaction once the rows are deleted
     Returns:
         - True if rows deleted, False otherwise
         - HTTP Status Code (int)
     """
-    def delete_rows(self, table_name: str, conditions: List[str]) -> Tuple[str, int]:
+    def delete_rows(self, table_name: str, conditions: List[str], before_commit: Optional[Callable[[], None]] = None) -> Tuple[str, int]:
         try:
             status = self.validate_table_status(table_name=table_name, exist_condition=True)
             if status is not None:
@@ -182,6 +624,8 @@ class RowHandler:
             condition_str = " AND ".join(conditions)
             delete_query = f"DELETE FROM {table_name} WHERE {condition_str}"
             self.cursor().execute(delete_query)
+            if before_commit is not None:
+                before_commit()
 
             self.db().commit()
 
@@ -196,54 +640,118 @@ class RowHandler:
 
     """
     Update multiple rows in a table in SQLite Database
+    Rows are staged in a temporary table and merged with a single UPDATE ... FROM per batch, so the cost is one
+    statement per batch rather than one per row. Rows are matched on the primary key (rowid if the table has none).
     Parameters:
         - table_name (str) - The name of the table to update rows in
-        - rows (List[List[str]]) - A list of tuples, each containing the unique identifier followed by the column data
+        - rows (List[Union[List, dict]]) - Either full rows with a value for every column in table order,
+          or dictionaries with the key column(s) and only the columns to update
+        - upsert (bool) - Insert the rows that match no existing key instead of ignoring them
+        - before_commit (Callable) - Called with the report inside the transaction once every batch is merged
     Returns:
-        Response message (str)
-        HTTP Status Code (int)
+        - A report with the totals and one entry per batch (rows, matched, changed, inserted, rejected), or an error message
+        - HTTP Status Code (int)
     """
-
-    def update_rows(self, table_name: str, rows: List[List[str]]) -> Tuple[str, int]:
+    def update_rows(self, table_name: str, rows: List[Union[List, dict]], upsert: bool = False,
+                    before_commit: Optional[Callable[[dict], None]] = None) -> Tuple[Union[dict, str], int]:
         try:
             status = self.validate_table_status(table_name=table_name, exist_condition=True)
             if status is not None:
                 return status
 
-            self.cursor().execute(f"PRAGMA table_info({table_name})")
-            columns_info = self.cursor().fetchall()
-            column_names = [info[1] for info in columns_info]
-
-            if len(column_names) < 2:
-                message = "Table must have at least a unique identifier and one field to update."
-                self.logger.warning(message)
-                return message, 400
-
-            identifier_col = column_names[0]
-            update_columns = column_names[1:]
-
-            set_clause = ', '.join([f"{column} = ?" for column in update_columns])
-            update_query_template = f"UPDATE {table_name} SET {set_clause} WHERE {identifier_col} = ?"
-
-            with self.db:
-                for row in rows:
-                    if len(row) != len(column_names):
-                        message = f"Row length {len(row)} does not match table column count {len(column_names)}"
-                        self.logger.error(message)
-                        continue
-
-                    unique_id = row[0]
-                    values = row[1:]
-
-                    self.cursor().execute(update_query_template, values + [unique_id])
+            table_info = self.table_handler.table_info(table_name)
+            report = {"rows": len(rows), "matched": 0, "changed": 0, "inserted": 0, "rejected": 0, "batches": []}
+
+            with self.db():
+                # The merge reads the table before writing it; a deferred transaction holding a read lock cannot wait
+                # for another writer's commit, so the write lock is taken up front and concurrent updates queue instead
+                if not self.db().in_transaction:
+                    self.cursor().execute("BEGIN IMMEDIATE")
+                for start in range(0, len(rows), self.update_batch_rows):
+                    batch = {"rows": 0, "matched": 0, "changed": 0, "inserted": 0, "rejected": 0}
+                    groups = self._group_update_rows(table_name, table_info, rows[start:start + self.update_batch_rows], batch)
+                    for columns, values in groups.items():
+                        self._merge_rows(table_info, list(columns), values, upsert, batch)
+                    report["batches"].append(batch)
+                    for counter in ("matched", "changed", "inserted", "rejected"):
+                        report[counter] += batch[counter]
+                if before_commit is not None:
+                    before_commit(report)
 
-            self.db().commit()
             message = self.MESSAGES["ROWS_UPDATE_SUCCESS"].format(table_name=table_name)
-            self.logger.info(message)
-
-            return message, 200
+            self.logger.info("%s matched=%s changed=%s inserted=%s rejected=%s", message, report['matched'], report['changed'], report['inserted'], report['rejected'])
+            return report, 200
 
         except Exception as e:
             message = self.MESSAGES["ROWS_UPDATE_FAIL"].format(table_name=table_name) + f" {str(e)}"
             self.logger.error(message)
-            return message, 500
\ No newline at end of file
+            return message, 500
+
+    def _group_update_rows(self, table_name: str, table_info, rows: List[Union[List, dict]], batch: dict) -> Dict[tuple, List[list]]:
+        # Rows are grouped by the set of columns they carry, each group is merged with its own statements
+        key_columns = table_info.key_columns
+        groups: Dict[tuple, List[list]] = {}
+        for row in rows:
+            batch["rows"] += 1
+            if not isinstance(row, dict):
+                # Positional rows map onto the table columns and carry no rowid
+                if len(row) != len(table_info.columns) or not table_info.primary_keys:
+                    self._reject_row(table_name, batch, f"Row length {len(row)} does not match table column count {len(table_info.columns)}"
+                                     if table_info.primary_keys else "Rows of a table without a primary key must be objects with a rowid")
+                    continue
+                row = dict(zip(table_info.columns, row))
+
+            unknown = [column for column in row if column not in table_info.types and column not in key_columns]
+            if unknown:
+                self._reject_row(table_name, batch, f"Unknown column(s): {', '.join(unknown)}")
+                continue
+            if any(row.get(column) is None for column in key_columns):
+                self._reject_row(table_name, batch, f"Missing value for key column(s): {', '.join(key_columns)}")
+                continue
+
+            columns = tuple(key_columns) + tuple(sorted(column for column in row if column not in key_columns))
+            groups.setdefault(columns, []).append([row[column] for column in columns])
+        return groups
+
+    def _reject_row(self, table_name: str, batch: dict, reason: str) -> None:
+        batch["rejected"] += 1
+        self.logger.warning("%s %s", LazyMessage(self.MESSAGES['INVALID_ROWS'], table_name=table_name), reason)
+
+    def _merge_rows(self, table_info, columns: List[str], values: List[list], upsert: bool, batch: dict) -> None:
+        table_name = table_info.name
+        key_columns = table_info.key_columns
+        set_columns = columns[len(key_columns):]
+        # Staging columns are positional so a rowid key does not clash with the staging table's own rowid
+        staged = [f"c{position}" for position in range(len(columns))]
+        key_staged, set_staged = staged[:len(key_columns)], staged[len(key_columns):]
+        join = " AND ".join(f"{table_name}.{column} = s.{stage}" for column, stage in zip(key_columns, key_staged))
+
+        # Declaring the target's types gives staged values the same affinity, so unchanged values compare equal
+        declared = [table_info.types.get(column) or ('INTEGER' if column == 'rowid' else '') for column in columns]
+        stage_columns = ", ".join(f"{stage} {declared_type}".strip() for stage, declared_type in zip(staged, declared))
+
+        cursor = self.cursor()
+        cursor.execute("DROP TABLE IF EXISTS temp._notelab_update_stage")
+        cursor.execute(f"CREATE TEMP TABLE _notelab_update_stage ({stage_columns}, PRIMARY KEY ({', '.join(key_staged)}))")
+        try:
+            # A later row for the same key replaces an earlier one, as if the rows had been applied in order
+            cursor.executemany(f"INSERT OR REPLACE INTO temp._notelab_update_stage VALUES ({', '.join(['?' for _ in staged])})", values)
+            staged_rows = cursor.execute("SELECT count(*) FROM temp._notelab_update_stage").fetchone()[0]
+            matched = cursor.execute(f"SELECT count(*) FROM temp._notelab_update_stage AS s JOIN {table_name} ON {join}").fetchone()[0]
+            batch["matched"] += matched
+
+            if set_columns:
+                set_clause = ", ".join(f"{column} = s.{stage}" for column, stage in zip(set_columns, set_staged))
+                differs = " OR ".join(f"{table_name}.{column} IS NOT s.{stage}" for column, stage in zip(set_columns, set_staged))
+                # Rows that already hold these values are skipped, so they cost no page writes
+                cursor.execute(f"UPDATE {table_name} SET {set_clause} FROM temp._notelab_update_stage AS s WHERE {join} AND ({differs})")
+                batch["changed"] += cursor.rowcount
+
+            if upsert and matched < staged_rows:
+                cursor.execute(
+                    f"INSERT INTO {table_name} ({', '.join(columns)}) SELECT {', '.join(staged)} FROM temp._notelab_update_stage AS s "
+                    f"WHERE NOT EXISTS (SELECT 1 FROM {table_name} WHERE {join})"
+                )
+                batch["inserted"] += cursor.rowcount
+        finally:
+            cursor.execute("DROP TABLE IF EXISTS temp._notelab_update_stage")
@@ -0,0 +1,224 @@
+"""
+This module draws random samples of rows without sorting or reading the whole table
+
+Three methods are supported:
+    uniform      n rows uniformly without replacement. Random rowids between min(rowid) and max(rowid) are
+                 looked up directly, skipping the ids of deleted or filtered-out rows, so the cost follows
+                 the sample size rather than the table size
+    bernoulli    every row independently with probability fraction. The rowids to look up are found by
+                 drawing the gaps between them from a geometric distribution
+    stratified   up to n rows uniformly from each distinct value of a column. Strata are filled by random
+                 rowid lookups; strata too small to fill that way share one scan of their rowids with a
+                 reservoir each, which an index on the column keeps to those strata
+
+A uniform draw falls back to a reservoir over a scan of the matching rowids when the sample is a large part
+of the rowid range or when most lookups miss, e.g. behind a very selective filter. Every draw comes from a
+random.Random seeded by the caller, so the same seed returns the same rows while the table is unchanged.
+"""
+
+import math
+import random
+import sqlite3
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .filters import CompiledFilter
+
+METHODS = ('uniform', 'bernoulli', 'stratified')
+
+# Rowids bound per lookup, below SQLite's historical limit of 999 variables
+LOOKUP_BATCH = 500
+# A uniform sample of more than 1/DENSE_RATIO of the rowid range is cheaper as a scan
+DENSE_RATIO = 4
+# Below this fraction of hits the lookups cost more than a scan of the matching rowids
+MIN_HIT_RATE = 0.05
+
+
+class RowSampler:
+
+    def __init__(self, cursor: sqlite3.Cursor, table_name: str, compiled: CompiledFilter, rng: random.Random):
+        self.cursor = cursor
+        self.table_name = table_name
+        self.compiled = compiled
+        self.rng = rng
+        self.cursor.execute(f"SELECT min(rowid), max(rowid) FROM {table_name}")
+        self.low, self.high = self.cursor.fetchone()
+        self.span = 0 if self.low is None else self.high - self.low + 1
+
+    """
+    Draws n rows uniformly without replacement
+    Returns:
+        A list of (rowid, row) tuples in rowid order
+    """
+    def uniform(self, n: int) -> List[Tuple[int, tuple]]:
+        if not self.span:
+            return []
+        if n * DENSE_RATIO < self.span:
+            picked, tried = [], set()
+            hits = 0
+            while len(picked) < n and len(tried) * 2 < self.span:
+                hit_rate = (hits + 1) / (len(tried) + 1)
+                if tried and hit_rate < MIN_HIT_RATE:
+                    break
+                # Enough candidates to finish at the hit rate seen so far, with some slack
+                candidates = self._draw(tried, min(math.ceil((n - len(picked)) / hit_rate * 1.2), self.span // 2 - len(tried) + 1))
+                found = self._lookup(candidates)
+                hits += len(found)
+                # Accepted in draw order, so stopping at n keeps the sample uniform
+                picked += [(rowid, found[rowid]) for rowid in candidates if rowid in found][:n - len(picked)]
+            if len(picked) == n:
+                return sorted(picked)
+        return sorted((row[0], row[1:]) for row in self._reservoir(n, "rowid AS __sample_key__, *"))
+
+    """
+    Includes each row independently with the given probability
+    Returns:
+        A list of (rowid, row) tuples in rowid order
+    """
+    def bernoulli(self, fraction: float) -> List[Tuple[int, tuple]]:
+        if fraction * DENSE_RATIO >= 1:
+            return sorted(self._lookup(list(self._skips(fraction))).items())
+        rows = []
+        candidates = []
+        for rowid in self._skips(fraction):
+            candidates.append(rowid)
+            if len(candidates) == LOOKUP_BATCH:
+                rows += sorted(self._lookup(candidates).items())
+                candidates = []
+        return rows + sorted(self._lookup(candidates).items())
+
+    """
+    Draws up to n rows uniformly from each distinct value of a column
+    Returns:
+        A dictionary of stratum value to its (rowid, row) tuples in rowid order, strata in ascending order
+    """
+    def stratified(self, column: str, n: int) -> Dict[object, List[Tuple[int, tuple]]]:
+        self.cursor.execute(f"SELECT DISTINCT {column} FROM {self.table_name} WHERE {self.compiled.where_clause} ORDER BY {column}",
+                            self.compiled.params)
+        strata = {row[0]: [] for row in self.cursor.fetchall()}
+        if not strata:
+            return strata
+
+        # Random lookups fill the large strata; the rest are left to a scan of their own rowids
+        budget = min(DENSE_RATIO * n * len(strata), self.span // 2)
+        tried = set()
+        unfilled = len(strata)
+        while unfilled and len(tried) < budget:
+            candidates = self._draw(tried, min(max(n * unfilled, LOOKUP_BATCH), budget - len(tried)))
+            found = self._lookup(candidates, extra=f"{column} AS __stratum__")
+            for rowid in candidates:
+                if rowid not in found:
+                    continue
+                # A stratum written since the DISTINCT query is skipped
+                picked = strata.get(found[rowid][0])
+                if picked is not None and len(picked) < n:
+                    picked.append((rowid, found[rowid][1:]))
+                    if len(picked) == n:
+                        unfilled -= 1
+
+        # The lookups stop at the first n rows of a stratum, a shorter list is discarded whole
+        short = [stratum for stratum, picked in strata.items() if len(picked) < n]
+        if short:
+            reservoirs = self._stratum_reservoirs(n, column, short)
+            found = self._lookup([rowid for rowids in reservoirs.values() for rowid in rowids])
+            for stratum, rowids in reservoirs.items():
+                strata[stratum] = [(rowid, found[rowid]) for rowid in rowids if rowid in found]
+        for picked in strata.values():
+            picked.sort()
+        return strata
+
+    # Distinct rowids in the rowid range not drawn before, in draw order
+    def _draw(self, tried: set, count: int) -> List[int]:
+        candidates = []
+        while len(candidates) < count:
+            rowid = self.low + int(self.rng.random() * self.span)
+            if rowid not in tried:
+                tried.add(rowid)
+                candidates.append(rowid)
+        return candidates
+
+    # Rowids from the range with probability fraction each: the gap to the next one is geometric
+    def _skips(self, fraction: float) -> Iterator[int]:
+        if not self.span:
+            return
+        rowid = self.low - 1
+        log_miss = math.log1p(-fraction) if fraction < 1 else None
+        while True:
+            rowid += 1 if log_miss is None else 1 + int(math.log(1.0 - self.rng.random()) / log_miss)
+            if rowid > self.high:
+                return
+            yield rowid
+
+    # Fetches the rows matching the filters among the given rowids, the extra expression ahead of the columns
+    def _lookup(self, rowids: List[int], extra: Optional[str] = None) -> Dict[int, tuple]:
+        found = {}
+        select = f"rowid AS __sample_key__, {extra + ', ' if extra else ''}*"
+        if len(rowids) * DENSE_RATIO >= self.span:
+            # A large part of the table: one scan beats a seek per row
+            wanted = set(rowids)
+            self.cursor.execute(f"SELECT {select} FROM {self.table_name} WHERE {self.compiled.where_clause}", self.compiled.params)
+            while True:
+                batch = self.cursor.fetchmany(LOOKUP_BATCH * 10)
+                if not batch:
+                    return found
+                found.update((row[0], row[1:]) for row in batch if row[0] in wanted)
+        for start in range(0, len(rowids), LOOKUP_BATCH):
+            batch = rowids[start:start + LOOKUP_BATCH]
+            self.cursor.execute(f"SELECT {select} FROM {self.table_name} WHERE rowid IN ({', '.join('?' * len(batch))}) "
+                                f"AND {self.compiled.where_clause}", batch + self.compiled.params)
+            for row in self.cursor.fetchall():
+                found[row[0]] = row[1:]
+        return found
+
+    # One pass over the rows of the given strata in rowid order, keeping an Algorithm L reservoir of k rowids per stratum
+    def _stratum_reservoirs(self, k: int, column: str, wanted: List[object]) -> Dict[object, List[int]]:
+        condition, params = "", []
+        values = [stratum for stratum in wanted if stratum is not None]
+        if len(values) <= LOOKUP_BATCH:
+            # Few enough strata to bind, so an index on the column reads only their rows
+            terms = [f"{column} IN ({', '.join('?' * len(values))})"] if values else []
+            terms += [f"{column} IS NULL"] if len(values) < len(wanted) else []
+            condition, params = f" AND ({' OR '.join(terms)})", values
+        self.cursor.execute(f"SELECT rowid, {column} FROM {self.table_name} WHERE {self.compiled.where_clause}{condition} ORDER BY rowid",
+                            self.compiled.params + params)
+        # stratum -> [reservoir, rows seen, weight, index of the next replaced row]
+        state = {stratum: [[], 0, 1.0, None] for stratum in wanted}
+        while True:
+            batch = self.cursor.fetchmany(LOOKUP_BATCH * 10)
+            if not batch:
+                return {stratum: entry[0] for stratum, entry in state.items()}
+            for rowid, stratum in batch:
+                entry = state.get(stratum)
+                if entry is None:
+                    continue
+                reservoir, seen = entry[0], entry[1]
+                entry[1] = seen + 1
+                if len(reservoir) < k:
+                    reservoir.append(rowid)
+                    if len(reservoir) == k:
+                        entry[2] = math.exp(math.log(self.rng.random() or 1e-300) / k)
+                        entry[3] = k + int(math.log(self.rng.random() or 1e-300) / math.log1p(-entry[2]))
+                elif seen == entry[3]:
+                    reservoir[self.rng.randrange(k)] = rowid
+                    entry[2] *= math.exp(math.log(self.rng.random() or 1e-300) / k)
+                    entry[3] += 1 + int(math.log(self.rng.random() or 1e-300) / math.log1p(-entry[2]))
+
+    # Algorithm L: a uniform reservoir of k rows from one pass over the matching rows in rowid order,
+    # jumping straight to the next replaced row instead of drawing a number per row
+    def _reservoir(self, k: int, select: str = "rowid") -> List[tuple]:
+        self.cursor.execute(f"SELECT {select} FROM {self.table_name} WHERE {self.compiled.where_clause} ORDER BY rowid", self.compiled.params)
+        reservoir, seen = [], 0
+        weight, next_index = 1.0, None
+        while True:
+            batch = self.cursor.fetchmany(LOOKUP_BATCH * 10)
+            if not batch:
+                return reservoir
+            if len(reservoir) < k:
+                reservoir += batch[:k - len(reservoir)]
+                if len(reservoir) == k:
+                    weight = math.exp(math.log(self.rng.random() or 1e-300) / k)
+                    next_index = k + int(math.log(self.rng.random() or 1e-300) / math.log1p(-weight))
+            while next_index is not None and next_index < seen + len(batch):
+                reservoir[self.rng.randrange(k)] = batch[next_index - seen]
+                weight *= math.exp(math.log(self.rng.random() or 1e-300) / k)
+                next_index += 1 + int(math.log(self.rng.random() or 1e-300) / math.log1p(-weight))
+            seen += len(batch)
@@ -0,0 +1,86 @@
+"""
+This class is responsible for caching table metadata so hot reads and writes skip catalog queries
+"""
+
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+
+class TableInfo:
+
+    def __init__(self, name: str, schema: List[Tuple]):
+        self.name = name
+        # Raw PRAGMA table_info rows: (cid, name, type, notnull, dflt_value, pk)
+        self.schema = schema
+        self.columns = [column[1] for column in schema]
+        self.types = {column[1]: column[2] for column in schema}
+        self.primary_keys = [column[1] for column in sorted(schema, key=lambda c: c[5]) if column[5] > 0]
+        self.primary_key = self.primary_keys[0] if self.primary_keys else None
+
+        placeholders = ', '.join(['?' for _ in self.columns])
+        self.insert_sql = f"INSERT INTO {name} ({', '.join(self.columns)}) VALUES ({placeholders})"
+
+        # update_rows identifies rows by the primary key, or by rowid when the table declares none
+        self.key_columns = self.primary_keys or ['rowid']
+
+
+class SchemaCatalog:
+
+    def __init__(self):
+        self._tables: Dict[str, Optional[TableInfo]] = {}
+        self._schema_version = None
+        # The cursor whose borrow already checked schema_version, a new cursor is opened for every borrow
+        self._checked_cursor = None
+        self._lock = threading.Lock()
+
+    """
+    Retrieves the cached metadata of a table, loading it on a cache miss
+    Parameters:
+        cursor (sqlite3.Cursor) - The cursor used to query the catalog on a miss
+        table_name (str) - The name of the table
+    Returns:
+        TableInfo if the table exists, None otherwise
+    """
+    def get(self, cursor: sqlite3.Cursor, table_name: str) -> Optional[TableInfo]:
+        self._check_schema_version(cursor)
+        with self._lock:
+            if table_name in self._tables:
+                return self._tables[table_name]
+
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?;", (table_name,))
+        info = None
+        if cursor.fetchone() is not None:
+            cursor.execute(f"PRAGMA table_info({table_name})")
+            info = TableInfo(table_name, cursor.fetchall())
+
+        with self._lock:
+            self._tables[table_name] = info
+        return info
+
+    """
+    Drops cached metadata
+    Parameters:
+        table_name (str) - The table to forget, or None to clear the whole catalog
+    """
+    def invalidate(self, table_name: Optional[str] = None) -> None:
+        with self._lock:
+            if table_name is None:
+                self._tables.clear()
+            else:
+                self._tables.pop(table_name, None)
+            # Force the next lookup to re-read schema_version
+            self._checked_cursor = None
+
+    def _check_schema_version(self, cursor: sqlite3.Cursor) -> None:
+        # schema_version is bumped by SQLite on every DDL statement, including ones from other connections and
+        # processes. It is read once per borrowed connection, a header read, so lookups within a request are free.
+        if cursor is self._checked_cursor:
+            return
+        cursor.execute("PRAGMA schema_version")
+        version = cursor.fetchone()[0]
+        with self._lock:
+            if version != self._schema_version:
+                self._tables.clear()
+                self._schema_version = version
+            self._checked_cursor = cursor
@@ -0,0 +1,135 @@
+"""
+This class is responsible for recording queries slower than a threshold, with their query plans, and ranking their shapes
+"""
+
+import json
+import re
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from ..utils.app_logger import setup_logger
+
+# Statements EXPLAIN QUERY PLAN can describe
+EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'REPLACE', 'UPDATE', 'DELETE')
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NAMED_PARAMETER = re.compile(r"[:@$][A-Za-z_]\w*")
+_NUMBER = re.compile(r"(?<![\w\"])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_VALUES_LIST = re.compile(r"\(\?\.\.\.\)(?:\s*,\s*\(\?\.\.\.\))+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+"""
+Reduces a statement to its shape, so statements differing only in literals or list lengths are grouped
+Parameters:
+    sql (str) - The SQL statement
+Returns:
+    The statement with literals and named parameters replaced by ?, placeholder lists collapsed to (?...) and whitespace collapsed
+"""
+def normalize_sql(sql: str) -> str:
+    sql = _STRING.sub('?', sql)
+    sql = _NAMED_PARAMETER.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _WHITESPACE.sub(' ', sql).strip()
+    sql = _PLACEHOLDER_LIST.sub('(?...)', sql)
+    return _VALUES_LIST.sub('(?...), ...', sql)
+
+"""
+Describes bound parameters by their types only, so values never reach the log
+"""
+def parameter_shape(parameters: Any) -> Any:
+    if parameters is None:
+        return None
+    if isinstance(parameters, dict):
+        return {name: type(value).__name__ for name, value in parameters.items()}
+    return [type(value).__name__ for value in parameters]
+
+
+class SlowQueryLog:
+
+    def __init__(self, threshold_ms: float = 100.0, max_shapes: int = 1000, logger=None):
+        self.threshold = threshold_ms / 1000
+        self.max_shapes = max_shapes
+        # One JSON object per line, kept apart from the application log so it can be parsed directly
+        self.logger = logger or setup_logger('SlowQueries', log_file='slow_queries', fmt='%(message)s')
+        # normalized sql -> aggregated statistics of its slow executions
+        self._shapes: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    """
+    Records a finished query if it exceeded the threshold
+    Parameters:
+        connection (sqlite3.Connection) - The connection the query ran on, used to capture its plan
+        sql (str) - The statement
+        parameters (Any) - The bound parameters, or None for executemany
+        seconds (float) - Time spent executing the statement and fetching its rows
+        rows (int) - Rows fetched, or rows changed for a write
+    """
+    def record(self, connection: sqlite3.Connection, sql: str, parameters: Any, seconds: float, rows: int) -> None:
+        if seconds < self.threshold:
+            return
+        shape = normalize_sql(sql)
+        params = parameter_shape(parameters)
+        plan = self.explain(connection, sql, parameters)
+        self.logger.warning(json.dumps({
+            "time": datetime.now(timezone.utc).isoformat(),
+            "sql": shape,
+            "params": params,
+            "seconds": round(seconds, 6),
+            "rows": rows,
+            "plan": plan,
+        }))
+
+        with self._lock:
+            entry = self._shapes.get(shape)
+            if entry is None:
+                if len(self._shapes) >= self.max_shapes:
+                    # Make room by forgetting the shape whose slowest run was the fastest
+                    del self._shapes[min(self._shapes, key=lambda key: self._shapes[key]["max_seconds"])]
+                entry = self._shapes[shape] = {"sql": shape, "count": 0, "total_seconds": 0.0, "max_seconds": 0.0, "max_rows": 0}
+            entry["count"] += 1
+            entry["total_seconds"] += seconds
+            entry["max_rows"] = max(entry["max_rows"], rows)
+            if seconds >= entry["max_seconds"]:
+                entry["max_seconds"] = seconds
+                entry["params"] = params
+                entry["plan"] = plan
+
+    """
+    Captures the EXPLAIN QUERY PLAN of a statement
+    Returns:
+        The plan as a list of (id, parent, detail) rows, or None if the statement cannot be explained
+    """
+    def explain(self, connection: sqlite3.Connection, sql: str, parameters: Any) -> Optional[List[dict]]:
+        words = sql.lstrip().split(None, 1)
+        if parameters is None or not words or words[0].upper() not in EXPLAINABLE:
+            return None
+        try:
+            # A plain cursor, so the EXPLAIN itself is neither timed nor recorded
+            cursor = sqlite3.Cursor(connection)
+            try:
+                return [{"id": row[0], "parent": row[1], "detail": row[3]}
+                        for row in cursor.execute(f"EXPLAIN QUERY PLAN {sql}", parameters).fetchall()]
+            finally:
+                cursor.close()
+        except sqlite3.Error:
+            return None
+
+    """
+    Retrieves the slowest query shapes seen since startup
+    Parameters:
+        limit (int) - The number of shapes to return
+    Returns:
+        A list of shapes ordered by their slowest execution, with execution count, total, mean and max duration
+    """
+    def top(self, limit: int = 20) -> List[dict]:
+        with self._lock:
+            entries = sorted(self._shapes.values(), key=lambda entry: entry["max_seconds"], reverse=True)[:limit]
+            return [{**entry, "mean_seconds": entry["total_seconds"] / entry["count"]} for entry in entries]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._shapes.clear()
@@ -0,0 +1,152 @@
+"""
+This module defines named SQLite performance profiles, applied to every pooled connection as it opens
+
+    default      SQLite's own defaults with a 256 statement cache, the database keeps its journal mode
+    read_heavy   a 1 GiB memory map and a 256 MiB page cache so hot pages are read without system calls, WAL
+                 so readers never wait for the writer
+    ingest       WAL with synchronous=NORMAL, a 128 MiB page cache, in-memory temp tables and a long busy
+                 timeout for writers queueing behind a bulk load
+    low_memory   no memory map, a 1 MiB page cache, temp tables on disk and a small statement cache
+
+Settings are the PRAGMAs mmap_size, cache_size (negative values are KiB, positive values pages), temp_store,
+synchronous, journal_mode and busy_timeout (ms), plus the per-connection statement_cache_size. A setting of
+None is left to SQLite, or for journal_mode to the database, which stores it persistently.
+"""
+
+import sqlite3
+from typing import Dict, Optional, Union
+
+PRAGMAS = ('journal_mode', 'synchronous', 'mmap_size', 'cache_size', 'temp_store', 'busy_timeout')
+SETTINGS = PRAGMAS + ('statement_cache_size',)
+
+_KEYWORDS = {
+    'journal_mode': ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'),
+    'synchronous': ('OFF', 'NORMAL', 'FULL', 'EXTRA'),
+    'temp_store': ('DEFAULT', 'FILE', 'MEMORY'),
+}
+
+PROFILES: Dict[str, Dict[str, Union[str, int, None]]] = {
+    'default': {
+        'journal_mode': None,
+        'synchronous': None,
+        'mmap_size': 0,
+        'cache_size': -2000,
+        'temp_store': 'DEFAULT',
+        'busy_timeout': 5000,
+        'statement_cache_size': 256,
+    },
+    'read_heavy': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 1024 ** 3,
+        'cache_size': -256 * 1024,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,
+        'statement_cache_size': 512,
+    },
+    'ingest': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 ** 2,
+        'cache_size': -128 * 1024,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 30000,
+        'statement_cache_size': 128,
+    },
+    'low_memory': {
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+        'mmap_size': 0,
+        'cache_size': -1024,
+        'temp_store': 'FILE',
+        'busy_timeout': 5000,
+        'statement_cache_size': 32,
+    },
+}
+
+
+class SqliteProfile:
+
+    def __init__(self, name: str, settings: Dict[str, Union[str, int, None]], overridden: Optional[list] = None):
+        self.name = name
+        self.settings = {setting: self._validate(setting, settings.get(setting)) for setting in SETTINGS}
+        # The settings replaced by an override of the named profile
+        self.overridden = overridden or []
+
+    @property
+    def statement_cache_size(self) -> int:
+        return self.settings['statement_cache_size'] if self.settings['statement_cache_size'] is not None else 128
+
+    @staticmethod
+    def _validate(setting: str, value: Union[str, int, None]) -> Union[str, int, None]:
+        if value is None or value == '':
+            return None
+        if setting in _KEYWORDS:
+            value = str(value).upper()
+            if value not in _KEYWORDS[setting]:
+                raise ValueError(f"Invalid {setting} '{value}', expected one of {', '.join(_KEYWORDS[setting])}")
+            return value
+        try:
+            return int(value)
+        except ValueError:
+            raise ValueError(f"Invalid {setting} '{value}', expected an integer") from None
+
+    """
+    Applies the profile's PRAGMAs to a newly opened connection
+    Parameters:
+        connection (sqlite3.Connection) - The connection to configure
+        read_only (bool) - Whether the connection is read-only, which cannot change journal_mode or synchronous
+        journal_mode (str) - A journal mode required by the caller, e.g. WAL for the writer in wal concurrency mode,
+          taking precedence over the profile's
+    Returns:
+        A dictionary of the PRAGMAs that could not be set to their error, e.g. a journal mode change while another
+        connection holds the database
+    """
+    def apply(self, connection: sqlite3.Connection, read_only: bool = False, journal_mode: Optional[str] = None) -> Dict[str, str]:
+        pragmas = dict(self.settings, journal_mode=journal_mode or self.settings['journal_mode'])
+        del pragmas['statement_cache_size']
+        if read_only:
+            del pragmas['journal_mode'], pragmas['synchronous']
+
+        failed = {}
+        for pragma in PRAGMAS:
+            value = pragmas.get(pragma)
+            if value is None:
+                continue
+            try:
+                if pragma == 'journal_mode':
+                    # Switching the journal needs the database to itself, so only when it differs
+                    if str(connection.execute("PRAGMA journal_mode").fetchone()[0]).upper() == value:
+                        continue
+                connection.execute(f"PRAGMA {pragma} = {value}").fetchall()
+            except sqlite3.Error as e:
+                failed[pragma] = str(e)
+        return failed
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "settings": dict(self.settings), "overridden": list(self.overridden)}
+
+
+"""
+Resolves the profile to apply to pooled connections
+Parameters:
+    name (str) - The profile name: default, read_heavy, ingest or low_memory
+    overrides (Dict[str, Union[str, int, None]]) - Settings replacing the profile's, None or '' keeps the profile's
+Returns:
+    SqliteProfile with the validated settings
+Raises:
+    ValueError if the profile name or a setting is invalid
+"""
+def resolve_profile(name: str, overrides: Optional[Dict[str, Union[str, int, None]]] = None) -> SqliteProfile:
+    name = (name or 'default').lower().replace('-', '_')
+    if name not in PROFILES:
+        raise ValueError(f"Unknown SQLite profile '{name}', expected one of {', '.join(PROFILES)}")
+    settings = dict(PROFILES[name])
+    overridden = []
+    for setting, value in (overrides or {}).items():
+        if setting not in SETTINGS:
+            raise ValueError(f"Unknown SQLite profile setting '{setting}', expected one of {', '.join(SETTINGS)}")
+        if value is not None and value != '':
+            settings[setting] = value
+            overridden.append(setting)
+    return SqliteProfile(name, settings, overridden)
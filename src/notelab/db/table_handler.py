@@ -2,6 +2,10 @@ import logging
 import sqlite3
 from typing import Any, Dict, List, Optional, Tuple
 from .connection_handler import ConnectionHandler
+from .result_stream import ResultStream, columnar
+from .schema_catalog import SchemaCatalog, TableInfo
+from .utils import verify_name
+from ..utils.app_logger import LazyMessage
 
 class TableHandler:
 
@@ -10,6 +14,7 @@ class TableHandler:
         self.MESSAGES = messages
         self.db_name = db_name
         self.connection_handler = connection_handler
+        self.catalog = SchemaCatalog()
 
     def connected(self) -> bool:
         return self.connection_handler.connected
@@ -20,6 +25,16 @@ class TableHandler:
     def db(self) -> sqlite3.Connection:
         return self.connection_handler.db
 
+    """
+    Retrieve cached table metadata
+    Parameters:
+        table_name (str) - The name of the table
+    Returns:
+        TableInfo if the table exists, None otherwise
+    """
+    def table_info(self, table_name: str) -> Optional[TableInfo]:
+        return self.catalog.get(self.cursor(), table_name)
+
     """
     Check if table exists
     Parameters:
@@ -33,23 +48,21 @@ class TableHandler:
             if status is not None:
                 return False
 
-            query = "SELECT name FROM sqlite_master WHERE type='table' AND name=?;"
-            self.cursor().execute(query, (table_name,))
-            self.logger.info(f"Checking if table {table_name} exists in database {self.db_name}...")
-            exists = self.cursor().fetchone() is not None
+            self.logger.debug("Checking if table %s exists in database %s...", table_name, self.db_name)
+            exists = self.table_info(table_name) is not None
             if exists:
                 status = 200
                 message = self.MESSAGES["TABLE_FOUND"].format(table_name=table_name)
-                self.logger.info(f"{message}, {status}")
+                self.logger.debug("%s, %s", message, status)
                 return True
             else:
                 status = 404
                 message = self.MESSAGES["TABLE_NOT_FOUND"].format(table_name=table_name)
-                self.logger.warning(f"{message}, {status}")
+                self.logger.warning("%s, %s", message, status)
                 return False
 
         except Exception as e:
-            self.logger.error(f"Failed to check if table {table_name} exists: {str(e)}")
+            self.logger.error("Failed to check if table %s exists: %s", table_name, e)
             return False
 
     """
@@ -66,7 +79,7 @@ class TableHandler:
         if not self.connected():
             message = self.MESSAGES["NOT_CONNECTED"]
             status = 400
-            self.logger.warning(f"{message}, {status}")
+            self.logger.warning("%s, %s", message, status)
             return message, status
 
         if force:
@@ -77,13 +90,13 @@ class TableHandler:
         if table_exists and exist_condition == False:
             message = self.MESSAGES["TABLE_EXISTS"].format(table_name=table_name)
             status = 409
-            self.logger.warning(f"{message}, {status}")
+            self.logger.warning("%s, %s", message, status)
             return message, status
 
         if not table_exists and exist_condition == True:
             message = self.MESSAGES["TABLE_NOT_FOUND"].format(table_name=table_name)
             status = 404
-            self.logger.warning(f"{message}, {status}")
+            self.logger.warning("%s, %s", message, status)
             return message, status
 
         return None
@@ -110,7 +123,7 @@ class TableHandler:
             if not rows:
                 message = self.MESSAGES["ROWS_NOT_FOUND"].format(table_name=table_name)
                 status = 200
-                self.logger.info(f"{message}, {status}")
+                self.logger.info("%s, %s", message, status)
                 return [], status
 
             columns = [column[0] for column in self.cursor().description]
@@ -118,69 +131,164 @@ class TableHandler:
 
             message = self.MESSAGES["TABLE_RETRIEVED"].format(table_name=table_name)
             status = 200
-            self.logger.info(f"{message}, {status}")
+            self.logger.info("%s, %s", message, status)
             return result, status
 
         except sqlite3.Error as e:
             message = f"Database error occurred while retrieving table {table_name}: {str(e)}"
             status = 500
-            self.logger.error(f"{message}, {status}")
+            self.logger.error("%s, %s", message, status)
             return None, status
 
         except Exception as e:
             message = f"Unexpected error occurred while retrieving table {table_name}: {str(e)}"
             status = 500
-            self.logger.error(f"{message}, {status}")
+            self.logger.error("%s, %s", message, status)
             return None, status
 
     """
-    Retrieves all table data from SQLite Database
+    Opens a streamed query on a dedicated pooled connection
+    Parameters:
+        query (str) - The SELECT statement to run
+        params (tuple) - The values bound to the statement
+        batch_size (int) - The number of rows fetched per batch
+        types (dict) - The declared types of the selected columns, if known
+    Returns:
+        A ResultStream that releases its connection when closed or exhausted
+    """
+    def open_stream(self, query: str, params: tuple = (), batch_size: int = 1000, types: Optional[Dict[str, str]] = None) -> ResultStream:
+        connection = self.connection_handler.acquire_connection()
+        try:
+            cursor = self.connection_handler.new_cursor(connection).execute(query, params)
+        except Exception:
+            self.connection_handler.release_connection(connection)
+            raise
+        return ResultStream(cursor, batch_size, on_close=lambda: self.connection_handler.release_connection(connection), types=types)
+
+    """
+    Stream table from SQLite Database in batches
+    Parameters:
+        table_name (str) - The name of the table to stream
+        batch_size (int) - The number of rows fetched per batch
+    Returns:
+        - A ResultStream over the rows of the table if found, None otherwise
+        - HTTP Status Code (int)
+    """
+    def stream_table(self, table_name: str, batch_size: int = 1000) -> Tuple[Optional[ResultStream], int]:
+        try:
+            status = self.validate_table_status(table_name=table_name, exist_condition=True)
+            if status is not None:
+                return None, status[1]
+
+            stream = self.open_stream(f"SELECT * FROM {table_name}", batch_size=batch_size, types=self.table_info(table_name).types)
+            self.logger.info("Streaming table %s in batches of %s", table_name, batch_size)
+            return stream, 200
+
+        except Exception as e:
+            self.logger.error("Unexpected error occurred while streaming table %s: %s, 500", table_name, e)
+            return None, 500
+
+    """
+    Retrieves the table catalog of the SQLite Database
+    Parameters:
+        - include_rows (bool) - Whether to also return the full contents of every table
+        - layout (str) - "rows" or "columnar", the layout of the contents when include_rows is set
     Returns:
         - A dictionary with the names of the tables as keys. Each value is another dictionary containing:
             - "columns": list of str, the names of the columns.
-            - "rows": list of tuples, where each tuple represents a row of data from the table.
-            Otherwise None If the database is not connected, or if there are no tables, or if an error occurs during retrieval.
+            - "types": list of str, the declared types of the columns.
+            - "primary_key": list of str, the primary key columns.
+            - "row_count": int, the row count recorded by the last ANALYZE in sqlite_stat1, or None if it has not run.
+            - "row_count_upper_bound": int, max(rowid), which counts deleted rows too; None for WITHOUT ROWID tables.
+            - "size_bytes" / "index_size_bytes": on-disk size of the table and of its indexes, None if dbstat is unavailable.
+            - "rows": list of tuples, only with include_rows.
+              With the columnar layout, "data" replaces "rows" and maps each column name to its values.
+            Otherwise None If the database is not connected, or if an error occurs during retrieval.
         - HTTP Status Code (int)
     """
-    def get_tables(self) -> Tuple[Optional[Dict[str, Dict[str, Any]]], int]:
+    def get_tables(self, include_rows: bool = False, layout: str = 'rows') -> Tuple[Optional[Dict[str, Dict[str, Any]]], int]:
         try:
-            if not self.connected:
+            if not self.connected():
                 self.logger.info(self.MESSAGES["NOT_CONNECTED"])
                 return None, 400
 
-            query = "SELECT name FROM sqlite_master WHERE type='table' AND name!='sqlite_sequence';"
+            # sqlite_ tables are SQLite's own, _notelab_ tables hold notelab's bookkeeping such as column statistics
+            query = "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' AND name NOT LIKE '\\_notelab\\_%' ESCAPE '\\';"
             self.cursor().execute(query)
-            table_names = self.cursor().fetchall()
+            table_names = [row[0] for row in self.cursor().fetchall()]
 
             if not table_names:
-                self.logger.info(self.MESSAGES["NO_TABLES_FOUND"])
+                self.logger.info(LazyMessage(self.MESSAGES["NO_TABLES_FOUND"], db_name=self.db_name))
                 return {"tables": {}}, 200
 
+            row_counts = self._analyzed_row_counts()
+            table_sizes, index_sizes = self._disk_sizes()
             all_table_data = {}
 
             for table_name in table_names:
-                table_name = table_name[0]
-                # Ensure the table_name is safe to use directly in a query
-                query = f"SELECT * FROM {table_name}"
-
-                # Execute query without additional bindings since no parameters are required
-                self.cursor().execute(query)
-                rows = self.cursor().fetchall()
-                column_names = [description[0] for description in self.cursor().description]
+                table_info = self.table_info(table_name)
                 table_data = {
-                    "columns": column_names,
-                    "rows": rows
+                    "columns": table_info.columns,
+                    "types": [table_info.types[column] for column in table_info.columns],
+                    "primary_key": table_info.primary_keys,
+                    "row_count": row_counts.get(table_name),
+                    "row_count_upper_bound": self._max_rowid(table_name),
+                    "size_bytes": table_sizes.get(table_name) if table_sizes is not None else None,
+                    "index_size_bytes": index_sizes.get(table_name, 0) if index_sizes is not None else None,
                 }
-                self.logger.info(f"Table {table_name} data retrieved.")
+
+                if include_rows:
+                    self.cursor().execute(f"SELECT * FROM {table_name}")
+                    rows = self.cursor().fetchall()
+                    if layout == 'columnar':
+                        table_data["data"] = columnar(table_info.columns, [rows])["data"]
+                    else:
+                        table_data["rows"] = rows
+                    self.logger.info("Table %s data retrieved.", table_name)
+
                 all_table_data[table_name] = table_data
 
-            self.logger.info("All table data retrieved.")
+            self.logger.info("Table catalog retrieved.")
             return {"tables": all_table_data}, 200
 
         except Exception as e:
-            self.logger.error(f"Unexpected error occurred while retrieving all table data: {str(e)}")
+            self.logger.error("Unexpected error occurred while retrieving all table data: %s", e)
             return None, 500
 
+    def _analyzed_row_counts(self) -> Dict[str, int]:
+        # sqlite_stat1 only exists once ANALYZE has run; the first number of each stat is the row count
+        self.cursor().execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='sqlite_stat1'")
+        if self.cursor().fetchone() is None:
+            return {}
+        self.cursor().execute("SELECT tbl, stat FROM sqlite_stat1")
+        row_counts = {}
+        for table_name, stat in self.cursor().fetchall():
+            if stat:
+                row_counts.setdefault(table_name, int(stat.split()[0]))
+        return row_counts
+
+    def _max_rowid(self, table_name: str) -> Optional[int]:
+        # max(rowid) is a b-tree seek, an upper bound on the row count that ignores deleted rows
+        try:
+            self.cursor().execute(f"SELECT max(rowid) FROM {table_name}")
+            return self.cursor().fetchone()[0] or 0
+        except sqlite3.OperationalError:
+            # WITHOUT ROWID tables have no rowid
+            return None
+
+    def _disk_sizes(self) -> Tuple[Optional[Dict[str, int]], Optional[Dict[str, int]]]:
+        # Aggregate mode returns one row per b-tree instead of one per page
+        try:
+            self.cursor().execute("SELECT name, pgsize FROM dbstat('main', 1)")
+            sizes = dict(self.cursor().fetchall())
+        except sqlite3.OperationalError:
+            return None, None
+        self.cursor().execute("SELECT name, tbl_name FROM sqlite_master WHERE type='index'")
+        index_sizes = {}
+        for index_name, table_name in self.cursor().fetchall():
+            index_sizes[table_name] = index_sizes.get(table_name, 0) + sizes.get(index_name, 0)
+        return sizes, index_sizes
+
     """
     Retrieves the schema of a specified table within the connected SQLite database.
     Parameters:
@@ -196,17 +304,16 @@ class TableHandler:
             if status is not None:
                 return None, status[1]
 
-            self.cursor().execute(f"PRAGMA table_info({table_name})")
-            schema = self.cursor().fetchall()
+            schema = self.table_info(table_name).schema
             if not schema:
-                self.logger.warning(f"Table {table_name} schema not found.")
+                self.logger.warning("Table %s schema not found.", table_name)
                 return None, 404
 
-            self.logger.info(self.MESSAGES["TABLE_SCHEMA_RETRIEVED"].format(table_name=table_name))
+            self.logger.info(LazyMessage(self.MESSAGES["TABLE_SCHEMA_RETRIEVED"], table_name=table_name))
             return schema, 200
 
         except Exception as e:
-            self.logger.error(f"Unexpected error occurred while retrieving table schema: {str(e)}")
+            self.logger.error("Unexpected error occurred while retrieving table schema: %s", e)
             return None, 500
 
     """
@@ -235,6 +342,7 @@ class TableHandler:
             self.cursor().execute(query)
 
             self.db().commit()
+            self.catalog.invalidate(table_name)
             message = self.MESSAGES["TABLE_CREATED"].format(table_name=table_name)
             self.logger.info(message)
 
@@ -263,6 +371,7 @@ class TableHandler:
             self.cursor().execute(f"DROP TABLE IF EXISTS {table_name}")
             self.cursor().execute(f"VACUUM")
             self.db().commit()
+            self.catalog.invalidate(table_name)
 
             message = self.MESSAGES["TABLE_DELETED"].format(table_name=table_name)
             self.logger.info(message)
@@ -272,4 +381,136 @@ class TableHandler:
         except Exception as e:
             message = f"{self.MESSAGES['TABLE_DELETION_FAIL'].format(table_name=table_name)}: {str(e)}"
             self.logger.error(message)
-            return message, 500
\ No newline at end of file
+            return message, 500
+
+    """
+    Lists the indexes of a table
+    Parameters:
+        table_name (str) - The name of the table
+    Returns:
+        - A list of dictionaries with the index "name", its "columns", whether it is "unique",
+          its "origin" (c: CREATE INDEX, u: UNIQUE constraint, pk: PRIMARY KEY) and whether it is "partial"
+        - HTTP Status Code (int)
+    """
+    def list_indexes(self, table_name: str) -> Tuple[Optional[List[dict]], int]:
+        try:
+            status = self.validate_table_status(table_name=table_name, exist_condition=True)
+            if status is not None:
+                return None, status[1]
+
+            self.cursor().execute(f"PRAGMA index_list({table_name})")
+            index_list = self.cursor().fetchall()
+            indexes = []
+            for _, index_name, unique, origin, partial in index_list:
+                self.cursor().execute(f"PRAGMA index_info({index_name})")
+                columns = [column[2] for column in sorted(self.cursor().fetchall())]
+                indexes.append({
+                    "name": index_name,
+                    "columns": columns,
+                    "unique": bool(unique),
+                    "origin": origin,
+                    "partial": bool(partial),
+                })
+
+            self.logger.info(LazyMessage(self.MESSAGES["INDEXES_RETRIEVED"], table_name=table_name))
+            return indexes, 200
+
+        except Exception as e:
+            self.logger.error("Unexpected error occurred while listing indexes of table %s: %s", table_name, e)
+            return None, 500
+
+    """
+    Creates an index on a table
+    Parameters:
+        table_name (str) - The name of the table
+        columns (List[str]) - The indexed columns, in order
+        index_name (str) - The name of the index, defaults to idx_<table>_<columns>
+        unique (bool) - Whether to create a UNIQUE index
+    Returns:
+        - Message (str)
+        - HTTP Status Code (int)
+    """
+    def create_index(self, table_name: str, columns: List[str], index_name: Optional[str] = None, unique: bool = False) -> Tuple[str, int]:
+        try:
+            status = self.validate_table_status(table_name=table_name, exist_condition=True)
+            if status is not None:
+                return status
+
+            if not columns:
+                message = "No columns provided for index creation."
+                self.logger.error(message)
+                return message, 400
+
+            table_info = self.table_info(table_name)
+            unknown = [column for column in columns if column not in table_info.types]
+            if unknown:
+                message = f"Unknown column(s) {', '.join(unknown)} for table '{table_name}'."
+                self.logger.error(message)
+                return message, 400
+
+            index_name = index_name or f"idx_{table_name}_{'_'.join(columns)}"
+            if not verify_name(index_name) or index_name.startswith('sqlite_'):
+                message = self.MESSAGES["INVALID_INDEX_NAME"].format(index_name=index_name)
+                self.logger.error(message)
+                return message, 400
+
+            self.cursor().execute("SELECT 1 FROM sqlite_master WHERE type='index' AND name=?", (index_name,))
+            if self.cursor().fetchone() is not None:
+                message = self.MESSAGES["INDEX_EXISTS"].format(index_name=index_name)
+                self.logger.warning(message)
+                return message, 409
+
+            unique_clause = "UNIQUE " if unique else ""
+            self.cursor().execute(f"CREATE {unique_clause}INDEX {index_name} ON {table_name} ({', '.join(columns)})")
+            self.db().commit()
+            self.catalog.invalidate(table_name)
+
+            message = self.MESSAGES["INDEX_CREATED"].format(index_name=index_name, table_name=table_name)
+            self.logger.info(message)
+            return message, 201
+
+        except Exception as e:
+            message = f"{self.MESSAGES['INDEX_CREATION_FAIL'].format(index_name=index_name)}: {str(e)}"
+            self.logger.error(message)
+            return message, 500
+
+    """
+    Drops an index from a table
+    Parameters:
+        table_name (str) - The name of the table
+        index_name (str) - The name of the index
+    Returns:
+        - Message (str)
+        - HTTP Status Code (int)
+    """
+    def drop_index(self, table_name: str, index_name: str) -> Tuple[str, int]:
+        try:
+            status = self.validate_table_status(table_name=table_name, exist_condition=True)
+            if status is not None:
+                return status
+
+            self.cursor().execute("SELECT sql FROM sqlite_master WHERE type='index' AND name=? AND tbl_name=?", (index_name, table_name))
+            index = self.cursor().fetchone()
+            if index is None:
+                message = self.MESSAGES["INDEX_NOT_FOUND"].format(index_name=index_name, table_name=table_name)
+                self.logger.warning(message)
+                return message, 404
+
+            # Indexes backing PRIMARY KEY and UNIQUE constraints have no SQL and cannot be dropped
+            if index[0] is None:
+                message = self.MESSAGES["INDEX_IMPLICIT"].format(index_name=index_name)
+                self.logger.warning(message)
+                return message, 400
+
+            self.cursor().execute(f"DROP INDEX {index_name}")
+            self.db().commit()
+            self.catalog.invalidate(table_name)
+
+            message = self.MESSAGES["INDEX_DELETED"].format(index_name=index_name)
+            self.logger.info(message)
+            return message, 200
+
+        except Exception as e:
+            message = f"{self.MESSAGES['INDEX_DELETION_FAIL'].format(index_name=index_name)}: {str(e)}"
+            self.logger.error(message)
+            return message, 500
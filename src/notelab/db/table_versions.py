@@ -0,0 +1,77 @@
+"""
+This class is responsible for counting the writes to each table, so readers can tell whether a table changed
+
+The counters live in this process and only see the writes made through it. When other processes write to the
+database too, e.g. several server workers or external tools, pass the database path: every commit by another
+connection then advances the version of every table, detected through PRAGMA data_version on a connection of its own.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+
+class TableVersions:
+
+    def __init__(self, db_path: Optional[str] = None):
+        # Versions restart at 0 with the process, the epoch keeps tags issued before a restart from matching
+        self.epoch = f"{os.getpid():x}.{time.time_ns():x}"
+        self.db_path = db_path
+        self._versions: Dict[str, int] = {}
+        # Commits seen from other connections; versions are the sum of both counters, so they only ever grow
+        self._external = 0
+        self._watcher: Optional[sqlite3.Connection] = None
+        self._data_version = None
+        self._lock = threading.Lock()
+
+    def get(self, table_name: str) -> int:
+        with self._lock:
+            self._poll()
+            return self._versions.get(table_name, 0) + self._external
+
+    def bump(self, table_name: str) -> int:
+        with self._lock:
+            version = self._versions.get(table_name, 0) + 1
+            self._versions[table_name] = version
+            return version + self._external
+
+    def close(self) -> None:
+        with self._lock:
+            if self._watcher is not None:
+                self._watcher.close()
+                self._watcher = None
+
+    def _poll(self) -> None:
+        # data_version changes after every commit by another connection, including this process's own pooled
+        # connections, so it cannot tell which table changed and advances them all
+        if self.db_path is None:
+            return
+        try:
+            if self._watcher is None:
+                # as_uri() percent-encodes the path, so a #, ? or % in it cannot end the path early
+                uri = f"{Path(self.db_path).resolve().as_uri()}?mode=ro"
+                self._watcher = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            # fetchall finishes the statement, so the watcher never holds a read lock between polls
+            data_version = self._watcher.execute("PRAGMA data_version").fetchall()[0][0]
+        except sqlite3.Error:
+            # Unknown is treated as changed, a spurious change only costs a cache miss
+            data_version = None
+        if data_version is None or data_version != self._data_version:
+            self._data_version = data_version
+            self._external += 1
+
+    """
+    Builds an entity tag for a read of a table
+    Parameters:
+        table_name (str) - The table the response is read from
+        query_key (str) - Everything else that shapes the response, e.g. the query string and the response format
+    Returns:
+        An opaque tag, unquoted, that changes whenever the table is written to
+    """
+    def etag(self, table_name: str, query_key: str = '') -> str:
+        digest = hashlib.blake2b(f"{self.epoch}:{table_name}:{self.get(table_name)}:{query_key}".encode(), digest_size=12)
+        return digest.hexdigest()
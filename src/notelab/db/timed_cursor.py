@@ -0,0 +1,100 @@
+"""
+This class is responsible for timing SQLite statement execution separately from fetching the result rows
+"""
+
+import sqlite3
+import time
+
+from ..utils.metrics import sqlite_execute_seconds, sqlite_fetch_seconds, sqlite_rows_fetched
+
+
+def statement_type(sql: str) -> str:
+    # The leading keyword keeps the label set small: SELECT, INSERT, UPDATE, PRAGMA, EXPLAIN...
+    words = sql.lstrip().split(None, 1)
+    return words[0].upper() if words else ''
+
+
+class TimedCursor(sqlite3.Cursor):
+    # Set by ConnectionHandler.new_cursor when slow queries are recorded
+    slow_query_log = None
+    # [sql, parameters, seconds, rows] of the statement whose rows are still being fetched
+    _query = None
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        start = time.perf_counter()
+        try:
+            result = super().execute(sql, parameters)
+        finally:
+            elapsed = time.perf_counter() - start
+            sqlite_execute_seconds.observe(elapsed, statement=statement_type(sql))
+        self._begin(sql, parameters, elapsed)
+        return result
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        start = time.perf_counter()
+        try:
+            result = super().executemany(sql, seq_of_parameters)
+        finally:
+            elapsed = time.perf_counter() - start
+            sqlite_execute_seconds.observe(elapsed, statement=statement_type(sql))
+        # The parameter sequence may be a generator that is already consumed
+        self._begin(sql, None, elapsed)
+        return result
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        elapsed = time.perf_counter() - start
+        sqlite_fetch_seconds.observe(elapsed, method='fetchone')
+        if row is not None:
+            sqlite_rows_fetched.inc()
+        self._fetched(elapsed, 0 if row is None else 1, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        start = time.perf_counter()
+        rows = super().fetchmany(size)
+        elapsed = time.perf_counter() - start
+        sqlite_fetch_seconds.observe(elapsed, method='fetchmany')
+        sqlite_rows_fetched.inc(len(rows))
+        self._fetched(elapsed, len(rows), len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        elapsed = time.perf_counter() - start
+        sqlite_fetch_seconds.observe(elapsed, method='fetchall')
+        sqlite_rows_fetched.inc(len(rows))
+        self._fetched(elapsed, len(rows), True)
+        return rows
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def _begin(self, sql, parameters, elapsed):
+        if self.slow_query_log is None:
+            return
+        self._query = [sql, parameters, elapsed, 0]
+        if self.description is None:
+            # Nothing to fetch: the statement is complete and rowcount holds the rows it changed
+            self._query[3] = max(self.rowcount, 0)
+            self._finish()
+
+    def _fetched(self, elapsed, rows, exhausted):
+        if self._query is None:
+            return
+        self._query[2] += elapsed
+        self._query[3] += rows
+        if exhausted:
+            self._finish()
+
+    # A query is recorded once its rows are exhausted, or when the cursor is reused or closed before that
+    def _finish(self):
+        query, self._query = self._query, None
+        if query is not None:
+            self.slow_query_log.record(self.connection, *query)
@@ -1,3 +1,5 @@
+import base64
+import json
 import re
 
 valid_name_pattern = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
@@ -8,3 +10,14 @@ def to_snake_case(name: str) -> str:
 
 def verify_name(name: str) -> bool:
     return valid_name_pattern.match(name) is not None
+
+def encode_cursor(key_value) -> str:
+    payload = json.dumps({"k": key_value}, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+def decode_cursor(token: str):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))["k"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid pagination cursor '{token}'") from e
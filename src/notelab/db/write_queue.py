@@ -0,0 +1,115 @@
+"""
+This class is responsible for coalescing small inserts from concurrent callers into group commits
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Tuple
+
+
+class PendingWrite:
+
+    def __init__(self, table_name: str, rows: List[List]):
+        self.table_name = table_name
+        self.rows = rows
+        self.future: Future = Future()
+
+
+class WriteQueue:
+
+    """
+    Starts the background thread that groups queued writes
+    Parameters:
+        flush (callable) - Writes a list of (table_name, rows) batches in one transaction and returns
+                           (one (message, status) result per batch, 200), or (message, status) if it could not connect
+        max_delay_ms (float) - How long the first write of a group waits for others to join it
+        max_rows (int) - Commit as soon as the group holds this many rows
+    """
+    def __init__(self, flush: Callable[[List[Tuple[str, List[List]]]], Tuple], max_delay_ms: float = 5.0, max_rows: int = 1000):
+        self.flush = flush
+        self.max_delay = max_delay_ms / 1000.0
+        self.max_rows = max(1, int(max_rows))
+        self._queue: "queue.Queue[Optional[PendingWrite]]" = queue.Queue()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._stats = {"writes": 0, "rows": 0, "commits": 0, "failed_commits": 0}
+        self._thread = threading.Thread(target=self._run, name='notelab-write-queue', daemon=True)
+        self._thread.start()
+
+    """
+    Queues rows for insertion in the next group commit
+    Parameters:
+        table_name (str) - The name of the table to insert rows into
+        rows (List[List]) - The rows to insert
+    Returns:
+        A Future resolved with (message, HTTP Status Code) once the group is committed
+    """
+    def submit(self, table_name: str, rows: List[List]) -> Future:
+        pending = PendingWrite(table_name, rows)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Write queue is closed.")
+            self._queue.put(pending)
+        return pending.future
+
+    """
+    Commits the writes still queued and stops the background thread
+    """
+    def close(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["pending"] = self._queue.qsize()
+        stats["rows_per_commit"] = stats["rows"] / stats["commits"] if stats["commits"] else 0.0
+        return stats
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            group, rows = [first], len(first.rows)
+            # The group closes when it is full or the first write has waited max_delay
+            deadline = time.monotonic() + self.max_delay
+            while rows < self.max_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    pending = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if pending is None:
+                    stopping = True
+                    break
+                group.append(pending)
+                rows += len(pending.rows)
+            # Writes queued before close() are ahead of the stop marker, so they are always committed
+            self._commit(group)
+
+    def _commit(self, group: List[PendingWrite]) -> None:
+        try:
+            results, status = self.flush([(pending.table_name, pending.rows) for pending in group])
+            if status != 200:
+                results = [(results, status)] * len(group)
+        except Exception as e:
+            results = [(str(e), 500)] * len(group)
+
+        committed = any(result_status < 300 for _, result_status in results)
+        with self._lock:
+            self._stats["writes"] += len(group)
+            self._stats["rows"] += sum(len(pending.rows) for pending, (_, result_status) in zip(group, results) if result_status < 300)
+            self._stats["commits" if committed else "failed_commits"] += 1
+
+        for pending, result in zip(group, results):
+            pending.future.set_result(result)
@@ -26,9 +26,61 @@ class AppConfig:
             self.server_port = _config.get('FLASK_PORT')
             self.server_url = f"https://{self.host}:{self.server_port}"
             self.db_path = _config.get('DB_PATH')
+            self.db_pool_size = int(_config.get('DB_POOL_SIZE') or 5)
+            self.db_pool_timeout = float(_config.get('DB_POOL_TIMEOUT') or 5.0)
+            self.db_pool_idle_timeout = float(_config.get('DB_POOL_IDLE_TIMEOUT') or 300.0)
+            # shared: one pool for reads and writes; wal: WAL journal, read-only pool and a single writer connection
+            self.db_concurrency_mode = (_config.get('DB_CONCURRENCY_MODE') or 'shared').lower()
+            self.db_writer_timeout = float(_config.get('DB_WRITER_TIMEOUT') or 30.0)
+            # Named SQLite performance profile: default, read_heavy, ingest or low_memory (see notelab.db.sqlite_profiles)
+            self.db_profile = (_config.get('DB_PROFILE') or 'default').lower()
+            # Per-setting overrides of the profile, unset keeps the profile's value
+            self.db_profile_overrides = {
+                "mmap_size": _config.get('DB_MMAP_SIZE'),
+                "cache_size": _config.get('DB_CACHE_SIZE'),
+                "temp_store": _config.get('DB_TEMP_STORE'),
+                "synchronous": _config.get('DB_SYNCHRONOUS'),
+                "journal_mode": _config.get('DB_JOURNAL_MODE'),
+                "busy_timeout": _config.get('DB_BUSY_TIMEOUT'),
+                "statement_cache_size": _config.get('DB_STATEMENT_CACHE_SIZE'),
+            }
+            self.stream_batch_size = int(_config.get('STREAM_BATCH_SIZE') or 1000)
+            self.page_size = int(_config.get('PAGE_SIZE') or 100)
+            self.write_queue_enabled = (_config.get('WRITE_QUEUE_ENABLED') or 'false').lower() in ('1', 'true', 'yes')
+            self.write_queue_max_delay_ms = float(_config.get('WRITE_QUEUE_MAX_DELAY_MS') or 5.0)
+            self.write_queue_max_rows = int(_config.get('WRITE_QUEUE_MAX_ROWS') or 1000)
+            # ETags and cached results follow this process's writes only. Set when other processes write to the
+            # database too (several workers, external tools): any commit then changes every table's ETag and cache entries
+            self.db_external_writers = (_config.get('DB_EXTERNAL_WRITERS') or 'false').lower() in ('1', 'true', 'yes')
+            # Memory budget of the query result cache, 0 disables it
+            self.result_cache_max_bytes = int(_config.get('RESULT_CACHE_MAX_BYTES') or 64 * 1024 * 1024)
+            # Queries slower than this are logged with their plan to logs/slow_queries.log, 0 disables it
+            self.slow_query_ms = float(_config.get('SLOW_QUERY_MS') or 100.0)
+            # Per-column statistics and sketches kept up to date as rows are inserted. Off by default: summarising
+            # every inserted value costs each write far more than the insert itself
+            self.column_stats_enabled = (_config.get('COLUMN_STATS_ENABLED') or 'false').lower() in ('1', 'true', 'yes')
+            self.metrics_enabled = (_config.get('METRICS_ENABLED') or 'true').lower() in ('1', 'true', 'yes')
+            self.bulk_transaction_rows = int(_config.get('BULK_TRANSACTION_ROWS') or 100000)
+            self.update_batch_rows = int(_config.get('UPDATE_BATCH_ROWS') or 50000)
+            self.bulk_pragmas = {
+                "synchronous": _config.get('BULK_SYNCHRONOUS') or 'OFF',
+                "journal_mode": _config.get('BULK_JOURNAL_MODE') or '',
+                "cache_size": _config.get('BULK_CACHE_SIZE') or -65536,
+                "temp_store": 'MEMORY',
+            }
+            # Internal API client (notelab.app.api.database_api)
+            self.api_connect_timeout = float(_config.get('API_CONNECT_TIMEOUT') or 3.05)
+            self.api_read_timeout = float(_config.get('API_READ_TIMEOUT') or 60.0)
+            self.api_retries = int(_config.get('API_RETRIES') or 3)
+            self.api_backoff_factor = float(_config.get('API_BACKOFF_FACTOR') or 0.5)
+            self.api_pool_size = int(_config.get('API_POOL_SIZE') or 10)
+            self.api_max_workers = int(_config.get('API_MAX_WORKERS') or 8)
+            # CA bundle used to verify the server certificate, e.g. the self-signed SSL_CERT_FILE
+            self.api_ca_bundle = _config.get('API_CA_BUNDLE')
+            self.index_advisor_max_covering_columns = int(_config.get('INDEX_ADVISOR_MAX_COVERING_COLUMNS') or 4)
             self.logger.info("Environment variables loaded successfully.")
         except Exception as e:
-            self.logger.error(f"Failed to load environment variables: {e}")
+            self.logger.error("Failed to load environment variables: %s", e)
             raise
 
     def _load_endpoints(self):
@@ -39,7 +91,7 @@ class AppConfig:
             self.database_endpoints = self.dict_to_namespace(endpoints.get('database', {}))
             self.logger.info("Endpoints loaded successfully.")
         except Exception as e:
-            self.logger.error(f"Failed to load endpoints: {e}")
+            self.logger.error("Failed to load endpoints: %s", e)
             raise
 
     def dict_to_namespace(self, d):
@@ -1,43 +1,125 @@
-import inspect
+import atexit
+import copy
 import logging
 import os
-from logging.handlers import RotatingFileHandler
-from typing import Optional
+import queue
+import random
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Optional
+
+from dotenv import dotenv_values
 
 log_dir = 'logs'
 if not os.path.exists(log_dir):
     os.makedirs(log_dir)
 
-def get_class_name() -> str:
-    frame = inspect.currentframe()
-    while frame:
-        if 'self' in frame.f_locals:
-            return frame.f_locals['self'].__class__.__name__
-        frame = frame.f_back
-    return 'root'
+DEFAULT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(funcName)s - %(message)s'
 
-def setup_logger(name: Optional[str] = None) -> logging.Logger:
-    if name is None:
-        name = get_class_name()
+# Every logger enqueues its records on the queue handler of its log file, with one listener thread per file.
+# The logging thread only merges the message arguments, the listener formats the record and writes it
+_queue_handlers: Dict[str, QueueHandler] = {}
+_listeners: Dict[str, QueueListener] = {}
+_loggers = set()
+_lock = threading.Lock()
 
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.DEBUG)
+class _RecordQueueHandler(QueueHandler):
+    """A QueueHandler that leaves formatting to the listener"""
 
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.DEBUG)
+    # The stock prepare() formats the whole record, traceback included, on the logging thread. Merging the
+    # arguments is enough to keep later changes to them out of the record; the listener's handler does the rest.
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
 
-    # Determine the log file name based on the environment
-    log_file = 'app_test' if os.getenv('TEST_ENV') == 'true' else 'app'
+def _setting(key: str, default: str) -> str:
+    # Read directly rather than through AppConfig, which itself logs through this module
+    return os.getenv(key) or dotenv_values(".env").get(key) or default
 
-    # Create a rotating file handler for each class
-    handler = RotatingFileHandler(f'logs/{log_file}.log', maxBytes=10000000, backupCount=3)
-    handler.setLevel(logging.DEBUG)
+def log_level() -> int:
+    level = logging.getLevelName(_setting('LOG_LEVEL', 'DEBUG').upper())
+    return level if isinstance(level, int) else logging.DEBUG
 
-    # Set formatter for logs
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(funcName)s - %(message)s')
-    handler.setFormatter(formatter)
+def _get_queue_handler(log_file: str, fmt: str) -> QueueHandler:
+    with _lock:
+        if log_file not in _queue_handlers:
+            file_handler = RotatingFileHandler(f'{log_dir}/{log_file}.log', maxBytes=10000000, backupCount=3)
+            file_handler.setLevel(logging.DEBUG)
+            file_handler.setFormatter(logging.Formatter(fmt))
 
-    # Add handler to logger
-    logger.addHandler(handler)
+            if not _listeners:
+                atexit.register(_shutdown)
+            _queue_handlers[log_file] = _RecordQueueHandler(queue.SimpleQueue())
+            _listeners[log_file] = QueueListener(_queue_handlers[log_file].queue, file_handler, respect_handler_level=True)
+            _listeners[log_file].start()
+        return _queue_handlers[log_file]
+
+def _shutdown() -> None:
+    # Flush the records still queued, then write directly for anything logged later in interpreter shutdown
+    with _lock:
+        for listener in _listeners.values():
+            listener.stop()
+        for logger in _loggers:
+            for log_file, queue_handler in _queue_handlers.items():
+                if queue_handler in logger.handlers:
+                    logger.removeHandler(queue_handler)
+                    for handler in _listeners[log_file].handlers:
+                        logger.addHandler(handler)
+
+"""
+Returns a logger writing to a file under logs/ through the background listener
+Parameters:
+    name (str) - The logger name
+    log_file (str) - The file name without extension, defaults to app (app_test when TEST_ENV is true)
+    fmt (str) - The record format used for that file
+"""
+def setup_logger(name: str = 'notelab', log_file: Optional[str] = None, fmt: str = DEFAULT_FORMAT) -> logging.Logger:
+    logger = logging.getLogger(name)
+    logger.setLevel(log_level())
+
+    if log_file is None:
+        # Determine the log file name based on the environment
+        log_file = 'app_test' if os.getenv('TEST_ENV') == 'true' else 'app'
+
+    # Loggers are shared by name, so repeated calls must not stack handlers
+    handler = _get_queue_handler(log_file, fmt)
+    if handler not in logger.handlers:
+        logger.addHandler(handler)
+        _loggers.add(logger)
 
     return logger
+
+
+class LazyMessage:
+    """A str.format template that is only formatted if the record is emitted"""
+
+    def __init__(self, template: str, **kwargs):
+        self.template = template
+        self.kwargs = kwargs
+
+    def __str__(self) -> str:
+        return self.template.format(**self.kwargs)
+
+
+class SampledLogger(logging.LoggerAdapter):
+    """Emits a random fraction of its records, for messages logged once per row or per request"""
+
+    def __init__(self, logger: logging.Logger, rate: Optional[float] = None):
+        super().__init__(logger, {})
+        self.rate = float(_setting('LOG_SAMPLE_RATE', '0.01')) if rate is None else rate
+
+    def log(self, level, msg, *args, **kwargs):
+        if self.rate < 1.0 and random.random() >= self.rate:
+            return
+        super().log(level, msg, *args, **kwargs)
+
+"""
+Wraps a logger so that only a fraction of its records are emitted
+Parameters:
+    logger (logging.Logger) - The logger to sample
+    rate (float) - The fraction of records kept, defaults to the LOG_SAMPLE_RATE setting (0.01)
+"""
+def sampled(logger: logging.Logger, rate: Optional[float] = None) -> SampledLogger:
+    return SampledLogger(logger, rate)
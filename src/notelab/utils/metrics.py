@@ -0,0 +1,146 @@
+"""
+This module is responsible for collecting in-process metrics and rendering them in the Prometheus text format
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Latency buckets in seconds, from 100µs to 10s
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Size buckets in bytes or rows, powers of 4 from 64 to 64M
+SIZE_BUCKETS = tuple(64 * 4 ** exponent for exponent in range(11))
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    escaped = (f'{key}="{_escape(value)}"' for key, value in pairs)
+    return '{' + ','.join(escaped) + '}'
+
+
+class Counter:
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_format_labels(labels)} {value}" for labels, value in values]
+        return lines
+
+
+class Histogram:
+
+    def __init__(self, name: str, help_text: str, buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last one is +Inf), sum]
+        self._values: Dict[Labels, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = _labels(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = [(labels, list(counts), total) for labels, (counts, total) in self._values.items()]
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(labels, ('le', le))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        # Callables returning gauge samples read at scrape time: [(name, help, [(labels, value)])]
+        self._collectors: List[Callable[[], List[Tuple[str, str, List[Tuple[dict, float]]]]]] = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._register(name, lambda: Counter(name, help_text))
+
+    def histogram(self, name: str, help_text: str, buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(name, lambda: Histogram(name, help_text, buckets))
+
+    def add_collector(self, collector: Callable[[], List[Tuple[str, str, List[Tuple[dict, float]]]]]) -> None:
+        with self._lock:
+            self._collectors.append(collector)
+
+    """
+    Renders every metric in the Prometheus text exposition format (version 0.0.4)
+    """
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines += metric.render()
+        for collector in collectors:
+            for name, help_text, samples in collector():
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+                lines += [f"{name}{_format_labels(_labels(labels))} {value}" for labels, value in samples]
+        return '\n'.join(lines) + '\n'
+
+    def _register(self, name: str, create: Callable):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = create()
+            return self._metrics[name]
+
+
+registry = MetricsRegistry()
+
+http_request_seconds = registry.histogram('notelab_http_request_duration_seconds', 'HTTP request latency by route, method and status.')
+http_response_bytes = registry.histogram('notelab_http_response_size_bytes', 'Size of non-streamed HTTP response bodies.', SIZE_BUCKETS)
+db_method_seconds = registry.histogram('notelab_db_method_duration_seconds', 'DBHandler method latency, connection borrowing included.')
+sqlite_execute_seconds = registry.histogram('notelab_sqlite_execute_seconds', 'Time spent in cursor execute/executemany by statement type.')
+sqlite_fetch_seconds = registry.histogram('notelab_sqlite_fetch_seconds', 'Time spent materialising result rows from SQLite.')
+sqlite_rows_fetched = registry.counter('notelab_sqlite_rows_fetched_total', 'Rows fetched from SQLite cursors.')
+serialization_seconds = registry.histogram('notelab_serialization_seconds', 'Time spent serialising response bodies by format.')
@@ -2,7 +2,8 @@
 This class uses SQLAlchemy to handle conversion to and from Pandas DataFrame & SQL
 """
 
-from typing import Type, Union, List
+from itertools import chain
+from typing import Iterable, Iterator, Optional, Type, Union, List
 import pandas as pd
 import pandas.api.types as ptypes
 import re
@@ -23,6 +24,45 @@ def _infer_sql_type(dtype) -> Type[Union[Integer, DateTime, String, Float]]:
             return sqt
     return String
 
+"""
+Maps a declared SQLite column type back to a pandas dtype, the inverse of _infer_sql_type
+Returns None when the declared type does not pin down a dtype (NUMERIC or no declared type)
+"""
+def dtype_from_sql(declared_type: Optional[str]) -> Optional[str]:
+    declared_type = (declared_type or '').upper()
+    if 'DATE' in declared_type or 'TIME' in declared_type:
+        return 'datetime64[ns]'
+    if 'INT' in declared_type:
+        # Nullable, so a NULL does not turn the column into floats
+        return 'Int64'
+    if any(token in declared_type for token in ('REAL', 'FLOA', 'DOUB')):
+        return 'float64'
+    if any(token in declared_type for token in ('CHAR', 'CLOB', 'TEXT', 'BLOB')):
+        return 'object'
+    return None
+
+"""
+Casts the columns of a DataFrame to the dtypes of their declared SQLite types
+Parameters:
+    df (DataFrame) - The frame to cast in place
+    schema (list) - The table schema as returned by get_table_schema: (cid, name, type, notnull, default, pk) rows
+Returns:
+    The same frame; columns whose values do not fit their declared type (SQLite does not enforce it) are left as they are
+"""
+def apply_schema_dtypes(df: pd.DataFrame, schema: List) -> pd.DataFrame:
+    for column in schema:
+        name, dtype = column[1], dtype_from_sql(column[2])
+        if dtype is None or name not in df.columns or str(df[name].dtype) == dtype:
+            continue
+        try:
+            if dtype == 'datetime64[ns]':
+                df[name] = pd.to_datetime(df[name])
+            else:
+                df[name] = df[name].astype(dtype)
+        except (TypeError, ValueError):
+            continue
+    return df
+
 def to_snake_case(name: str) -> str:
     name = re.sub(r'\s+', '_', name)
     return re.sub(r'[^\w_]', '', name).lower()
@@ -43,10 +83,56 @@ def columns_from_df(table_name: str, df: pd.DataFrame) -> list[str]:
 
 """
 Converts the rows to SQL format for use in INSERT statements
+Missing values (NaN, NaT, None, pd.NA) become None so they are stored as real NULLs.
+Each column is converted on its own, so integers stay int, floats stay float and
+datetimes become ISO 8601 strings instead of every value going through a shared object array.
 """
 def rows_from_df(df: pd.DataFrame) -> List:
     if df.empty:
         return []
-    else:
-        df_cleaned = df.fillna('NULL')
-        return df_cleaned.values.tolist()
+    columns = []
+    for _, series in df.items():
+        if ptypes.is_datetime64_any_dtype(series.dtype):
+            values = series.dt.strftime('%Y-%m-%d %H:%M:%S.%f')
+        elif ptypes.is_timedelta64_dtype(series.dtype):
+            values = series.dt.total_seconds()
+        else:
+            values = series
+        columns.append(values.astype(object).where(series.notna(), None).tolist())
+    return [list(row) for row in zip(*columns)]
+
+"""
+Splits a DataFrame, or an iterable of DataFrames such as pd.read_csv(..., chunksize=n), into chunks of at most chunk_size rows
+"""
+def iter_df_chunks(data: Union[pd.DataFrame, Iterable[pd.DataFrame]], chunk_size: int = 50000) -> Iterator[pd.DataFrame]:
+    frames = [data] if isinstance(data, pd.DataFrame) else data
+    for frame in frames:
+        for start in range(0, len(frame), chunk_size):
+            yield frame.iloc[start:start + chunk_size]
+
+"""
+Bulk loads a DataFrame, or an iterable of DataFrame chunks, into a table
+Parameters:
+    db (DBHandler) - The database handler to load through
+    table_name (str) - The target table, created from the first chunk's dtypes if it does not exist
+    data (DataFrame or Iterable[DataFrame]) - The rows to load
+    chunk_size (int) - The number of rows converted and inserted at a time
+    create (bool) - Whether to create the table when it does not exist
+Returns:
+    - A load report (rows, seconds, rows_per_second, chunks, transactions, deferred_indexes) or an error message
+    - HTTP Status Code (int)
+"""
+def bulk_load_df(db, table_name: str, data: Union[pd.DataFrame, Iterable[pd.DataFrame]], chunk_size: int = 50000, create: bool = True):
+    chunks = iter_df_chunks(data, chunk_size)
+    first = next(chunks, None)
+    if first is None:
+        return "No rows to load.", 400
+
+    if create:
+        message, status = db.create_table(to_snake_case(table_name), columns_from_df(table_name, first))
+        if status not in (201, 409):
+            return message, status
+
+    columns = [to_snake_case(column) for column in first.columns]
+    row_chunks = (rows_from_df(chunk) for chunk in chain([first], chunks))
+    return db.bulk_insert(to_snake_case(table_name), columns, row_chunks)
@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+from notelab.db.aggregates import Percentile, compile_aggregate
+from notelab.db.filters import FilterError
+from notelab.db.schema_catalog import TableInfo
+
+SCHEMA = [(0, 'id', 'INTEGER', 0, None, 1), (1, 'category', 'TEXT', 0, None, 0), (2, 'price', 'REAL', 0, None, 0)]
+
+
+@pytest.fixture
+def sales(db):
+    db.create_table('sales', ['id INTEGER PRIMARY KEY', 'category TEXT', 'price REAL'])
+    db.insert_rows('sales', [[1, 'a', 1.0], [2, 'a', 2.0], [3, 'a', 10.0], [4, 'b', 5.0], [5, 'b', None], [6, None, 7.0]])
+    return 'sales'
+
+
+def test_compile_aggregate():
+    compiled = compile_aggregate(['category'], ['count', 'sum:price', 'p99.9:price'], '-sum_price', TableInfo('sales', SCHEMA))
+    assert compiled.select == ['category', 'COUNT(*) AS count', 'SUM(price) AS sum_price', 'percentile(price, ?) AS p99_9_price']
+    assert compiled.params == [pytest.approx(0.999)]
+    assert compiled.group_by_clause == " GROUP BY category"
+    assert compiled.order_by_clause == " ORDER BY sum_price DESC"
+
+
+def test_compile_aggregate_defaults_to_count_ordered_by_group():
+    compiled = compile_aggregate(['category', ' '], [''], None, TableInfo('sales', SCHEMA))
+    assert compiled.aliases == ['category', 'count']
+    assert compiled.order_by_clause == " ORDER BY category ASC"
+
+
+@pytest.mark.parametrize('group_by, aggregates, order_by', [
+    (['missing'], [], None),
+    ([], ['sum:missing'], None),
+    ([], ['sum'], None),
+    ([], ['p101:price'], None),
+    ([], ['stddev:price'], None),
+    ([], ['count', 'count'], None),
+    ([], ['count'], 'price'),
+])
+def test_compile_aggregate_rejects_unknown_terms(group_by, aggregates, order_by):
+    with pytest.raises(FilterError):
+        compile_aggregate(group_by, aggregates, order_by, TableInfo('sales', SCHEMA))
+
+
+def test_percentile_interpolates_like_numpy():
+    values = [3, 1, 4, 1, 5, 9, 2, 6]
+    for fraction in (0, 0.25, 0.5, 0.95, 1):
+        percentile = Percentile()
+        for value in values + [None, 'x']:
+            percentile.step(value, fraction)
+        assert percentile.finalize() == pytest.approx(np.percentile(values, fraction * 100))
+    assert Percentile().finalize() is None
+
+
+def test_grouped_aggregates(db, sales):
+    rows, status = db.aggregate_rows(sales, ['category'], ['count', 'count:price', 'avg:price', 'median:price'])
+    assert status == 200
+    assert rows == [
+        {'category': None, 'count': 1, 'count_price': 1, 'avg_price': 7.0, 'median_price': 7.0},
+        {'category': 'a', 'count': 3, 'count_price': 3, 'avg_price': pytest.approx(13 / 3), 'median_price': 2.0},
+        {'category': 'b', 'count': 2, 'count_price': 1, 'avg_price': 5.0, 'median_price': 5.0},
+    ]
+
+
+def test_aggregate_with_filters_order_and_limit(db, sales):
+    rows, status = db.aggregate_rows(sales, ['category'], ['total:price'], [('price__gt', '1')], '-total_price', 1)
+    assert status == 200
+    assert rows == [{'category': 'a', 'total_price': 12.0}]
+
+
+def test_aggregate_over_all_rows(db, sales):
+    rows, _ = db.aggregate_rows(sales, [], ['count_distinct:category', 'min:price', 'max:price'])
+    assert rows == [{'count_distinct_category': 2, 'min_price': 1.0, 'max_price': 10.0}]
+
+
+def test_aggregate_forced_index(db, sales):
+    db.create_index(sales, ['category', 'price'], 'sales_category_price')
+    rows, status = db.aggregate_rows(sales, ['category'], ['sum:price'], index='sales_category_price')
+    assert status == 200
+    assert [row['sum_price'] for row in rows] == [7.0, 13.0, 5.0]
+    assert db.aggregate_rows(sales, ['category'], ['sum:price'], index='missing')[1] == 404
+
+
+def test_aggregate_errors(db, sales):
+    assert db.aggregate_rows(sales, ['missing'])[1] == 400
+    assert db.aggregate_rows(sales, limit=0)[1] == 400
+    assert db.aggregate_rows('missing')[1] == 404
+
+
+def test_aggregate_endpoint(client, db, sales):
+    response = client.get('/api/db/sales/rows/aggregate?group_by=category&agg=count,p50:price&order_by=-count&category__ne=b')
+    assert response.status_code == 200
+    assert response.json == [{'category': 'a', 'count': 3, 'p50_price': 2.0}]
+    assert client.get('/api/db/sales/rows/aggregate?limit=x').status_code == 400
+    assert client.get('/api/db/sales/rows/aggregate?agg=nope:price').status_code == 400
@@ -0,0 +1,92 @@
+import logging
+import queue
+import sys
+import threading
+import time
+
+from notelab.utils import app_logger
+from notelab.utils.app_logger import LazyMessage, sampled, setup_logger
+
+
+class RecordingFormatter(logging.Formatter):
+
+    def __init__(self):
+        super().__init__('%(message)s')
+        self.threads = []
+
+    def format(self, record):
+        self.threads.append(threading.current_thread())
+        return super().format(record)
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_records_are_formatted_by_the_listener():
+    logger = setup_logger('notelab.test.listener', log_file='app_test')
+    formatter = RecordingFormatter()
+    file_handler = app_logger._listeners['app_test'].handlers[0]
+    previous = file_handler.formatter
+    file_handler.setFormatter(formatter)
+    try:
+        logger.info("formatted %s", "later")
+        assert wait_for(lambda: formatter.threads)
+        assert formatter.threads[0] is not threading.current_thread()
+    finally:
+        file_handler.setFormatter(previous)
+
+
+def test_prepare_only_merges_arguments():
+    handler = app_logger._RecordQueueHandler(queue.SimpleQueue())
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = logging.LogRecord('x', logging.ERROR, __file__, 1, "failed %s", (["a"],), sys.exc_info())
+    prepared = handler.prepare(record)
+    assert prepared is not record
+    assert (prepared.msg, prepared.args) == ("failed ['a']", None)
+    # The traceback is left for the listener's formatter
+    assert prepared.exc_info is record.exc_info
+    assert prepared.exc_text is None
+
+
+def test_loggers_do_not_stack_handlers():
+    logger = setup_logger('notelab.test.repeat', log_file='app_test')
+    setup_logger('notelab.test.repeat', log_file='app_test')
+    assert logger.handlers.count(app_logger._queue_handlers['app_test']) == 1
+
+
+def test_lazy_messages_are_formatted_only_when_emitted():
+    calls = []
+
+    class Counting(LazyMessage):
+        def __str__(self):
+            calls.append(True)
+            return super().__str__()
+
+    logger = setup_logger('notelab.test.lazy', log_file='app_test')
+    logger.setLevel(logging.WARNING)
+    logger.info(Counting("rows of {table_name}", table_name='t'))
+    assert calls == []
+    logger.warning(Counting("rows of {table_name}", table_name='t'))
+    assert calls
+
+
+def test_sampled_logger_keeps_a_fraction():
+    logger = logging.getLogger('notelab.test.sampled')
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    try:
+        for _ in range(10):
+            sampled(logger, rate=0.0).info("dropped")
+            sampled(logger, rate=1.0).info("kept")
+    finally:
+        logger.removeHandler(handler)
+    assert [record.getMessage() for record in records] == ["kept"] * 10
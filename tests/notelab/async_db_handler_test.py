@@ -0,0 +1,49 @@
+import asyncio
+
+from notelab.db.async_db_handler import AsyncDBHandler
+
+
+def test_workers_stay_below_the_pool_size(make_db):
+    db = make_db(db_pool_size=4)
+    assert AsyncDBHandler(db).max_workers == 2
+    assert AsyncDBHandler(db, max_workers=10).max_workers == 3
+    assert AsyncDBHandler(make_db(db_pool_size=1)).max_workers == 1
+
+
+def test_calls_run_concurrently_on_pooled_connections(make_db):
+    db = make_db(db_pool_size=4)
+
+    async def main():
+        async with AsyncDBHandler(db) as handler:
+            assert (await handler.create_table('t', ['id INTEGER PRIMARY KEY', 'name TEXT']))[1] == 201
+            await handler.insert_rows('t', [[i, str(i)] for i in range(10)])
+            results = await asyncio.gather(*(handler.get_row('t', i) for i in range(10)))
+            assert [status for _, status in results] == [200] * 10
+            assert (await handler.delete_rows('t', ['id >= 5']))[1] == 200
+            rows, _ = await handler.get_rows('t')
+            assert len(rows) == 5
+            assert (await handler.get_cache_stats())[1] == 200
+            assert (await handler.get_slow_queries())[1] == 200
+            assert (await handler.get_pool_stats())[0]["in_use"] == 0
+
+    asyncio.run(main())
+
+
+def test_streams_fetch_batches_and_release_the_connection(make_db):
+    db = make_db(db_pool_size=4)
+    db.create_table('t', ['id INTEGER PRIMARY KEY'])
+    db.insert_rows('t', [[i] for i in range(25)])
+
+    async def main():
+        async with AsyncDBHandler(db) as handler:
+            stream, status = await handler.stream_table('t', batch_size=10)
+            assert status == 200
+            async with stream:
+                assert [len(batch) async for batch in stream.batches()] == [10, 10, 5]
+            stream, _ = await handler.stream_rows('t', filters=[('id__lt', '3')])
+            async with stream:
+                assert [row async for row in stream] == [{"id": 0}, {"id": 1}, {"id": 2}]
+            assert (await handler.stream_table('missing'))[1] == 404
+
+    asyncio.run(main())
+    assert db.get_pool_stats()[0]["in_use"] == 0
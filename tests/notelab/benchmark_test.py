@@ -0,0 +1,51 @@
+import importlib.util
+import os
+
+import pytest
+
+spec = importlib.util.spec_from_file_location(
+    'benchmark', os.path.join(os.path.dirname(__file__), '..', '..', 'benchmarks', 'notelab', 'benchmark.py'))
+benchmark = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(benchmark)
+
+
+def test_generated_rows_are_deterministic_and_chunked(monkeypatch):
+    monkeypatch.setattr(benchmark, 'GENERATION_CHUNK', 4)
+    chunks = list(benchmark.generate_rows('narrow', 10, 10, seed=1))
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+    assert [row[0] for chunk in chunks for row in chunk] == list(range(10, 20))
+    assert chunks == list(benchmark.generate_rows('narrow', 10, 10, seed=1))
+    assert len(next(benchmark.generate_rows('wide', 0, 1, seed=1))[0]) == 31
+
+
+def test_time_call_summarises_the_samples():
+    calls = []
+    timing = benchmark.time_call(lambda: calls.append(1), repeat=3, warmup=2)
+    assert len(calls) == 5
+    assert timing["repeat"] == 3
+    assert timing["min"] <= timing["median"] <= timing["max"]
+
+
+def test_compare_flags_regressions_beyond_the_threshold():
+    baseline = {"a": {"median": 1.0}, "b": {"median": 1.0}}
+    results = {"a": {"median": 1.1}, "b": {"median": 1.5}, "new": {"median": 1.0}}
+    report = {entry["name"]: entry["regressed"] for entry in benchmark.compare(results, baseline, 0.2)}
+    assert report == {"a": False, "b": True}
+
+
+def test_checked_rejects_unexpected_statuses():
+    assert benchmark.checked(("ok", 201), 201) == ("ok", 201)
+    with pytest.raises(RuntimeError):
+        benchmark.checked(("missing", 404))
+
+
+def test_benchmarks_run_against_a_small_table(db, client):
+    table = 'bench_narrow_200'
+    columns = ['id'] + [column.split()[0] for column in benchmark.SHAPES['narrow']]
+    db.create_table(table, ['id INTEGER PRIMARY KEY'] + benchmark.SHAPES['narrow'])
+    db.bulk_insert(table, columns, benchmark.generate_rows('narrow', 0, 200, seed=1))
+    results = {}
+    benchmark.run_db_benchmarks(db, table, 'narrow', 200, 1, results, seed=1)
+    benchmark.run_http_benchmarks(client, table, 'narrow', 200, 1, results, seed=1)
+    assert "db.get_rows_page[narrow,200]" in results
+    assert "http.GET table ndjson[narrow,200]" in results
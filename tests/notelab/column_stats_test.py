@@ -0,0 +1,179 @@
+import random
+import sqlite3
+
+import numpy as np
+import pytest
+
+from notelab.db.column_stats import ColumnStats, ColumnStatsStore, HyperLogLog, QuantileSketch
+from notelab.utils import app_config
+from notelab.utils.app_config import AppConfig
+
+
+@pytest.fixture
+def db(make_db):
+    return make_db(column_stats_enabled=True)
+
+
+@pytest.fixture
+def table(db):
+    db.create_table('t', ['id INTEGER PRIMARY KEY', 'name TEXT', 'score REAL'])
+    return 't'
+
+
+def columns(db, table_name='t'):
+    stats, status = db.get_column_stats(table_name)
+    assert status == 200
+    return stats
+
+
+def test_hyperloglog_estimates_distinct_values():
+    sketch = HyperLogLog()
+    sketch.update(range(20000))
+    sketch.update(str(value) for value in range(5000))
+    assert abs(sketch.estimate() - 25000) / 25000 < 0.05
+    other = HyperLogLog()
+    other.update(range(10000, 30000))
+    sketch.merge(other)
+    assert abs(sketch.estimate() - 35000) / 35000 < 0.05
+    assert HyperLogLog.from_dict(sketch.to_dict()).estimate() == sketch.estimate()
+
+
+def test_quantile_sketch_ranks_are_close():
+    rng = random.Random(7)
+    values = [rng.gauss(0, 1) for _ in range(20000)]
+    left, right = QuantileSketch(), QuantileSketch()
+    left.update(values[:12000])
+    right.update(values[12000:])
+    left.merge(right)
+    ordered = sorted(values)
+    for fraction, value in left.quantiles((0.05, 0.5, 0.95)).items():
+        rank = np.searchsorted(ordered, value) / len(ordered)
+        assert abs(rank - fraction) < 0.03
+    assert QuantileSketch().quantiles((0.5,)) == {0.5: None}
+
+
+def test_merged_statistics_match_one_pass():
+    rng = random.Random(3)
+    values = [rng.uniform(-5, 5) for _ in range(1000)] + [None, float('nan')]
+    whole, first, second = ColumnStats(), ColumnStats(), ColumnStats()
+    whole.update(values)
+    first.update(values[:400])
+    second.update(values[400:])
+    first.merge(ColumnStats.from_dict(second.to_dict()))
+    summary, expected = first.summary(), whole.summary()
+    assert (summary["count"], summary["nulls"], summary["min"], summary["max"]) == (1000, 2, expected["min"], expected["max"])
+    assert summary["mean"] == pytest.approx(np.mean(values[:1000]))
+    assert summary["variance"] == pytest.approx(np.var(values[:1000], ddof=1))
+
+
+def test_text_columns_report_min_max_only():
+    stats = ColumnStats()
+    stats.update(['b', 'a', 'c', 'a'])
+    summary = stats.summary()
+    assert (summary["min"], summary["max"], summary["distinct"], summary["mean"], summary["quantiles"]) == ('a', 'c', 3, None, None)
+
+
+def test_inserts_are_folded_into_the_statistics(db, table):
+    assert columns(db)["rows"] == 0
+    db.insert_rows(table, [[1, 'a', 1.0], [2, 'b', 3.0]])
+    db.insert_rows(table, [[3, 'a', None]])
+    stats = columns(db)
+    assert (stats["rows"], stats["stale"]) == (3, False)
+    assert stats["columns"]["score"]["nulls"] == 1
+    assert stats["columns"]["score"]["mean"] == 2.0
+    assert stats["columns"]["name"]["distinct"] == 2
+
+
+def test_group_commit_updates_the_statistics(db):
+    db.create_table('t', ['id INTEGER PRIMARY KEY', 'score REAL'])
+    results, _ = db.insert_row_batches([('t', [[1, 1.0]]), ('missing', [[1, 1.0]]), ('t', [[2, 2.0]])])
+    assert [status for _, status in results] == [201, 404, 201]
+    stats = columns(db)
+    assert (stats["rows"], stats["stale"]) == (2, False)
+    assert stats["columns"]["score"]["max"] == 2.0
+
+
+def test_bulk_insert_marks_the_statistics_stale_without_summarizing(db, monkeypatch):
+    db.create_table('t', ['id INTEGER PRIMARY KEY', 'score REAL'])
+    summarized = []
+    summarize = ColumnStatsStore.summarize_rows
+    monkeypatch.setattr(ColumnStatsStore, 'summarize_rows', lambda *args: summarized.append(args) or summarize(*args))
+    result, status = db.bulk_insert('t', ['id', 'score'], [[[i, float(i)] for i in range(start, start + 50)] for start in range(0, 200, 50)],
+                                    transaction_rows=100)
+    assert status == 201
+    assert summarized == []
+    monkeypatch.undo()
+    assert columns(db)["stale"] is True
+
+    stats, _ = db.get_column_stats('t', recompute=True)
+    assert (stats["rows"], stats["stale"], stats["columns"]["score"]["max"]) == (200, False, 199.0)
+
+
+def test_updates_and_deletes_mark_the_statistics_stale(db, table):
+    db.insert_rows(table, [[1, 'a', 1.0], [2, 'b', 2.0]])
+    db.update_rows(table, [{"id": 1, "score": 1.0}])
+    assert columns(db)["stale"] is False
+    db.update_rows(table, [{"id": 1, "score": 5.0}])
+    assert columns(db)["stale"] is True
+
+    stats, _ = db.get_column_stats(table, recompute=True)
+    assert (stats["stale"], stats["columns"]["score"]["max"]) == (False, 5.0)
+    db.delete_rows(table, ["id = 2"])
+    assert columns(db)["stale"] is True
+
+
+def test_statistics_commit_in_the_write_transaction(db, db_path, table, monkeypatch):
+    merge = ColumnStatsStore.merge
+    seen = []
+
+    def check(store, cursor, table_info, batch):
+        other = sqlite3.connect(db_path)
+        # The rows are written but not committed yet
+        seen.append((cursor.connection.in_transaction, other.execute("SELECT count(*) FROM t").fetchone()[0]))
+        other.close()
+        merge(store, cursor, table_info, batch)
+
+    monkeypatch.setattr(ColumnStatsStore, 'merge', check)
+    assert db.insert_rows(table, [[1, 'a', 1.0]])[1] == 201
+    assert seen == [(True, 0)]
+    assert columns(db)["rows"] == 1
+
+
+def test_failed_statistics_mark_the_table_stale_and_keep_the_rows(db, table, monkeypatch):
+    db.insert_rows(table, [[1, 'a', 1.0]])
+    monkeypatch.setattr(ColumnStatsStore, 'merge', lambda *args: 1 / 0)
+    assert db.insert_rows(table, [[2, 'b', 2.0]])[1] == 201
+    monkeypatch.undo()
+    assert [row["id"] for row in db.get_rows(table)[0]] == [1, 2]
+    stats = columns(db)
+    assert (stats["rows"], stats["stale"]) == (1, True)
+
+
+def test_statistics_of_tables_without_any_are_computed_once(db, db_path):
+    connection = sqlite3.connect(db_path)
+    connection.execute("CREATE TABLE legacy (id INTEGER PRIMARY KEY, value REAL)")
+    connection.executemany("INSERT INTO legacy VALUES (?, ?)", [(1, 2.0), (2, 4.0)])
+    connection.commit()
+    connection.close()
+    stats = columns(db, 'legacy')
+    assert (stats["rows"], stats["stale"], stats["columns"]["value"]["mean"]) == (2, False, 3.0)
+
+
+def test_column_stats_endpoint(client, db, table):
+    db.insert_rows(table, [[1, 'a', 1.0]])
+    response = client.get('/api/db/t/stats?recompute=true')
+    assert response.status_code == 200
+    assert response.json["columns"]["id"]["count"] == 1
+    assert client.get('/api/db/missing/stats').status_code == 404
+
+
+def test_statistics_are_disabled_by_default(make_db, monkeypatch):
+    monkeypatch.setattr(app_config, 'dotenv_values', lambda path: {})
+    config = object.__new__(AppConfig)
+    config._load_env()
+    assert config.column_stats_enabled is False
+
+    db = make_db(column_stats_enabled=False)
+    db.create_table('t', ['id INTEGER PRIMARY KEY'])
+    db.insert_rows('t', [[1]])
+    assert db.get_column_stats('t')[1] == 404
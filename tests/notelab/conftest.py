@@ -0,0 +1,75 @@
+import sqlite3
+
+import pytest
+
+from notelab.db.db_handler import DBHandler
+from notelab.utils.app_config import AppConfig
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / 'test.db'
+    sqlite3.connect(path).close()
+    return str(path)
+
+
+@pytest.fixture
+def make_db(monkeypatch, db_path):
+    """Builds a fresh DBHandler on a temporary database, with AppConfig settings overridden by keyword"""
+    handlers = []
+
+    def make(**settings):
+        config = AppConfig()
+        settings.setdefault('slow_query_ms', 0)
+        for key, value in settings.items():
+            monkeypatch.setattr(config, key, value)
+        # DBHandler is a singleton, each test gets its own instance
+        monkeypatch.setattr(DBHandler, '_instance', None)
+        handler = DBHandler('test', db_path)
+        handlers.append(handler)
+        return handler
+
+    yield make
+    for handler in handlers:
+        handler.close()
+
+
+@pytest.fixture
+def db(make_db):
+    return make_db()
+
+
+@pytest.fixture
+def client(db, monkeypatch):
+    from notelab.app.app import app
+    from notelab.app.routes import db_routes
+    from notelab.app.routes.db import table_routes
+    monkeypatch.setattr(db_routes, 'db', db)
+    monkeypatch.setattr(table_routes, 'db', db)
+    client = app.test_client()
+    # Talisman redirects plain HTTP to HTTPS, it trusts the proxy header
+    client.environ_base['HTTP_X_FORWARDED_PROTO'] = 'https'
+    return client
+
+
+@pytest.fixture
+def api_server(client):
+    """Serves the app over HTTP on a free local port for the API client, returns its base URL"""
+    import threading
+    from werkzeug.serving import make_server
+    from notelab.app.app import app
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    thread.join()
+
+
+@pytest.fixture
+def api_client(api_server):
+    from notelab.app.api.database_api import DatabaseClient
+    with DatabaseClient(api_server, retries=0, max_workers=4) as api_client:
+        # Talisman redirects plain HTTP to HTTPS, it trusts the proxy header
+        api_client.session.headers['X-Forwarded-Proto'] = 'https'
+        yield api_client
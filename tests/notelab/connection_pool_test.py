@@ -0,0 +1,78 @@
+import sqlite3
+import threading
+
+import pytest
+
+from notelab.db.connection_pool import ConnectionPool, PoolTimeoutError
+
+
+def test_released_connection_is_reused(db_path):
+    pool = ConnectionPool(db_path, max_size=2)
+    connection = pool.acquire()
+    pool.release(connection)
+    assert pool.acquire() is connection
+    stats = pool.stats()
+    assert (stats["hits"], stats["misses"], stats["open"]) == (1, 1, 1)
+
+
+def test_acquire_times_out_when_pool_is_exhausted(db_path):
+    pool = ConnectionPool(db_path, max_size=1, timeout=0.05)
+    pool.acquire()
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire()
+    assert pool.stats()["timeouts"] == 1
+
+
+def test_waiter_gets_connection_released_by_another_thread(db_path):
+    pool = ConnectionPool(db_path, max_size=1, timeout=5)
+    connection = pool.acquire()
+    timer = threading.Timer(0.05, pool.release, args=(connection,))
+    timer.start()
+    assert pool.acquire() is connection
+    assert pool.stats()["waits"] >= 1
+
+
+def test_release_rolls_back_open_transaction(db_path):
+    pool = ConnectionPool(db_path, max_size=1)
+    connection = pool.acquire()
+    connection.execute("CREATE TABLE t (a INTEGER)")
+    connection.commit()
+    connection.execute("INSERT INTO t VALUES (1)")
+    pool.release(connection)
+    assert not connection.in_transaction
+    assert pool.acquire().execute("SELECT count(*) FROM t").fetchone()[0] == 0
+
+
+def test_idle_connections_are_evicted(db_path):
+    pool = ConnectionPool(db_path, max_size=2, idle_timeout=0)
+    pool.release(pool.acquire())
+    pool.acquire()
+    assert pool.stats()["evictions"] == 1
+
+
+def test_closed_pool_refuses_borrows(db_path):
+    pool = ConnectionPool(db_path)
+    pool.release(pool.acquire())
+    pool.close()
+    assert pool.stats()["open"] == 0
+    with pytest.raises(sqlite3.ProgrammingError):
+        pool.acquire()
+
+
+def test_handler_calls_share_pooled_connections(db):
+    db.create_table('t', ['id INTEGER PRIMARY KEY', 'v TEXT'])
+    for i in range(20):
+        assert db.insert_rows('t', [[i, 'x']])[1] == 201
+        assert db.get_rows('t')[1] == 200
+    stats, _ = db.get_pool_stats()
+    assert stats["open"] <= stats["max_size"]
+    assert stats["in_use"] == 0
+    assert stats["hits"] > stats["misses"]
+
+
+def test_nested_calls_reuse_the_borrowed_connection(db):
+    db.create_table('t', ['id INTEGER PRIMARY KEY'])
+    before = db.get_pool_stats()[0]
+    db.get_index_advice()
+    after = db.get_pool_stats()[0]
+    assert after["hits"] + after["misses"] == before["hits"] + before["misses"] + 1
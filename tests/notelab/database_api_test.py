@@ -0,0 +1,76 @@
+import pandas as pd
+import requests
+
+from notelab.app.api import database_api
+from notelab.app.api.database_api import DatabaseClient, format_endpoint_template
+
+
+def test_format_endpoint_template_quotes_values():
+    assert format_endpoint_template("/tables/<string:table_name>/rows/<int:row_id>", table_name='a b/c', row_id=7) == \
+        "/tables/a%20b%2Fc/rows/7"
+
+
+def test_table_and_row_round_trip(api_client):
+    # Table routes report the handler's status in the body
+    result, status = api_client.create_table('notes', ['id INTEGER PRIMARY KEY', 'title TEXT'])
+    assert (status, result['status']) == (200, 201)
+    assert api_client.insert_rows('notes', [[1, 'a'], [2, 'b']])[1] == 201
+    assert 'notes' in str(api_client.get_tables()[0])
+
+    rows, status = api_client.get_rows('notes', {'id__gt': 1})
+    assert status == 200
+    assert 'b' in str(rows) and "'a'" not in str(rows)
+
+    assert api_client.update_rows('notes', [{'id': 2, 'title': 'c'}])[1] == 200
+    assert 'c' in str(api_client.get_table('notes')[0])
+
+    assert api_client.drop_table('notes')[1] == 200
+    assert 'notes' not in str(api_client.get_tables()[0])
+
+
+def test_http_errors_return_the_server_status_and_body(api_client):
+    result, status = api_client.insert_rows('missing', [[1]])
+    assert status == 404
+    assert '404' in result['error']
+    assert 'missing' in str(result['response'])
+
+
+def test_connection_errors_return_500():
+    with DatabaseClient('http://127.0.0.1:9', retries=0, connect_timeout=0.5) as client:
+        result, status = client.get_tables()
+    assert status == 500
+    assert 'error' in result
+
+
+def test_concurrent_calls_keep_item_order(api_client):
+    api_client.create_table('notes', ['id INTEGER PRIMARY KEY', 'title TEXT'])
+    rows = [[i, f't{i}'] for i in range(25)]
+    results = api_client.insert_rows_concurrent('notes', rows, chunk_size=10)
+    assert len(results) == 3
+    assert [status for _, status in results] == [201] * 3
+
+    updates = api_client.update_rows_concurrent('notes', [{'id': i, 'title': 'u'} for i in range(25)], chunk_size=5)
+    assert [status for _, status in updates] == [200] * 5
+
+    api_client.create_table('other', ['id INTEGER PRIMARY KEY'])
+    tables = api_client.get_tables_concurrent(['notes', 'other', 'missing'])
+    assert list(tables) == ['notes', 'other', 'missing']
+    assert tables['notes'][1] == 200 and tables['missing'][1] == 404
+
+
+def test_client_reuses_one_session(api_client, monkeypatch):
+    sends = []
+    original = requests.Session.request
+    monkeypatch.setattr(requests.Session, 'request', lambda session, *args, **kwargs: sends.append(session) or original(session, *args, **kwargs))
+    api_client.get_tables()
+    api_client.get_tables()
+    assert sends == [api_client.session, api_client.session]
+
+
+def test_module_functions_use_the_shared_client(api_client, monkeypatch):
+    monkeypatch.setattr(database_api, '_client', api_client)
+    assert database_api.get_client() is api_client
+    assert database_api.create_table('notes', ['id INTEGER PRIMARY KEY'])[0]['status'] == 201
+    df, status = database_api.read_table_df('notes')
+    assert status == 200
+    assert isinstance(df, pd.DataFrame) and list(df.columns) == ['id']
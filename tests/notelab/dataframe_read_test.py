@@ -0,0 +1,59 @@
+import pandas as pd
+import pytest
+
+from notelab.app.api import database_api
+from notelab.app.routes import representations
+
+
+@pytest.fixture
+def notes(api_client):
+    api_client.create_table('notes', ['id INTEGER PRIMARY KEY', 'title TEXT', 'score REAL', 'rank INT'])
+    api_client.insert_rows('notes', [[1, 'a', 1.5, 10], [2, 'b', None, None], [3, 'c', 3.5, 30]])
+    return 'notes'
+
+
+def check_frame(df):
+    assert list(df.columns) == ['id', 'title', 'score', 'rank']
+    assert df['id'].tolist() == [1, 2, 3]
+    assert str(df['rank'].dtype) == 'Int64'
+    assert df['rank'].isna().tolist() == [False, True, False]
+    assert str(df['score'].dtype) == 'float64'
+
+
+def test_read_table_df_over_arrow(api_client, notes, monkeypatch):
+    columnar = []
+    monkeypatch.setattr(api_client, '_read_columnar', lambda *args: columnar.append(args))
+    df, status = api_client.read_table_df(notes)
+    assert status == 200
+    assert columnar == []
+    check_frame(df)
+
+
+def test_read_table_df_falls_back_to_columnar_without_client_pyarrow(api_client, notes, monkeypatch):
+    monkeypatch.setattr(database_api, 'pa', None)
+    df, status = api_client.read_table_df(notes)
+    assert status == 200
+    check_frame(df)
+
+
+def test_read_rows_df_falls_back_to_columnar_on_406(api_client, notes, monkeypatch):
+    monkeypatch.setattr(representations, 'arrow_available', lambda: False)
+    formats = []
+    send = api_client._send
+    monkeypatch.setattr(api_client, '_send', lambda method, url, params=None, query=None, stream=False:
+                        formats.append((query or {}).get('format')) or send(method, url, params, query, stream))
+    df, status = api_client.read_rows_df(notes, {'id__ge': 2})
+    assert status == 200
+    assert formats == [None, 'arrow', 'columnar']
+    assert df['title'].tolist() == ['b', 'c']
+
+
+def test_read_df_of_an_empty_result_keeps_the_columns(api_client, notes, monkeypatch):
+    monkeypatch.setattr(database_api, 'pa', None)
+    df, status = api_client.read_rows_df(notes, {'id__gt': 99})
+    assert status == 200
+    assert df.empty and list(df.columns) == ['id', 'title', 'score', 'rank']
+
+
+def test_read_df_of_a_missing_table(api_client):
+    assert api_client.read_table_df('missing')[1] == 404
@@ -0,0 +1,72 @@
+import sqlite3
+
+import pytest
+
+from notelab.db.filters import FilterError, compile_filters
+from notelab.db.schema_catalog import TableInfo
+
+TABLE = TableInfo('t', [(0, 'id', 'INTEGER', 0, None, 1), (1, 'name', 'TEXT', 0, None, 0), (2, 'score', 'REAL', 0, None, 0),
+                        (3, 'code', '', 0, None, 0)])
+
+
+def ids(db, filters):
+    rows, status = db.get_rows('t', filters=filters)
+    assert status == 200
+    return [row["id"] for row in rows]
+
+
+@pytest.fixture
+def table(db):
+    db.create_table('t', ['id INTEGER PRIMARY KEY', 'name TEXT', 'score REAL', 'code'])
+    db.insert_rows('t', [[1, 'apple', 1.0, 123], [2, 'Apricot', 2.5, 'A1'], [3, 'apricot', None, 'a*'],
+                         [4, None, 4.0, 1234], [5, 'banana', 5.5, 'b'], [6, 'ap', 6.0, None]])
+    return 't'
+
+
+def test_values_are_bound_and_coerced():
+    compiled = compile_filters([('id__ge', '2'), ('score__lt', '3.5'), ('name', 'x')], TABLE)
+    assert compiled.where == ['id >= ?', 'score < ?', 'name = ?']
+    assert compiled.params == [2, 3.5, 'x']
+    assert compiled.predicates == [('id', 'ge'), ('score', 'lt'), ('name', 'eq')]
+
+
+def test_invalid_filters_raise():
+    for filters in ([('missing', '1')], [('id__like', '1')], [('id', 'abc')], [('name__isnull', 'maybe')], [('order_by', 'missing')]):
+        with pytest.raises(FilterError):
+            compile_filters(filters, TABLE)
+
+
+def test_prefix_on_text_is_a_case_sensitive_range():
+    compiled = compile_filters([('name__prefix', 'ap')], TABLE)
+    assert compiled.where == ['name >= ? AND name < ?']
+    assert compiled.params == ['ap', 'aq']
+    assert compile_filters([('name__prefix', 'a\U0010ffff')], TABLE).params == ['a\U0010ffff', 'b']
+    assert compile_filters([('name__prefix', '')], TABLE).where == ['name >= ?']
+
+
+def test_prefix_rows(db, table):
+    assert ids(db, [('name__prefix', 'ap')]) == [1, 3, 6]
+    assert ids(db, [('name__prefix', 'Ap')]) == [2]
+    assert ids(db, [('name__prefix', 'a%')]) == []
+    # Untyped columns match on the text form, GLOB characters are literal
+    assert ids(db, [('code__prefix', '123')]) == [1, 4]
+    assert ids(db, [('code__prefix', 'a*')]) == [3]
+
+
+def test_prefix_seeks_an_index(db, table, db_path):
+    db.create_index('t', ['name'])
+    compiled = compile_filters([('name__prefix', 'ap')], TABLE)
+    with sqlite3.connect(db_path) as connection:
+        plan = connection.execute(f"EXPLAIN QUERY PLAN SELECT * FROM t WHERE {compiled.where_clause}", compiled.params).fetchall()
+    assert 'USING INDEX' in plan[0][3]
+
+
+def test_ne_excludes_nulls(db, table):
+    assert ids(db, [('name__ne', 'apple')]) == [2, 3, 5, 6]
+    assert ids(db, [('name__ne', 'apple'), ('name__isnull', 'false')]) == [2, 3, 5, 6]
+
+
+def test_in_isnull_and_order_by(db, table):
+    assert ids(db, [('id__in', '5,1,3')]) == [1, 3, 5]
+    assert ids(db, [('score__isnull', 'true')]) == [3]
+    assert ids(db, [('score__gt', '2'), ('order_by', '-score')]) == [6, 5, 4, 2]
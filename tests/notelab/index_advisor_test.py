@@ -0,0 +1,49 @@
+import pytest
+
+
+@pytest.fixture
+def table(db):
+    db.create_table('t', ['id INTEGER PRIMARY KEY', 'name TEXT', 'age INTEGER', 'city TEXT', 'code', 'score REAL'])
+    db.insert_rows('t', [[i, f'n{i}', i % 50, f'c{i % 7}', i, i / 2] for i in range(200)])
+    return 't'
+
+
+def advice(db, **kwargs):
+    result, status = db.get_index_advice(**kwargs)
+    assert status == 200
+    return result["recommendations"]
+
+
+def test_scanned_shapes_are_recommended_equality_first(db, table):
+    # Values are bound, so every age is the same shape; equal calls would be served from the result cache
+    for age in (10, 20, 30):
+        db.get_rows('t', filters=[('age__gt', str(age)), ('city', 'c1')])
+    db.get_rows('t', filters=[('score__lt', '5')])
+    recommendations = advice(db)
+    assert [r["columns"][:2] for r in recommendations] == [['city', 'age'], ['score']]
+    assert recommendations[0]["hits"] == 3
+    assert recommendations[0]["covering"] is False
+    assert advice(db, min_hits=2)[0]["columns"][:2] == ['city', 'age']
+
+
+def test_prefix_is_a_range_on_text_columns_only(db, table):
+    db.get_rows('t', filters=[('name__prefix', 'n1')])
+    db.get_rows('t', filters=[('code__prefix', '1')])
+    assert [r["columns"] for r in advice(db)] == [['name']]
+
+
+def test_applied_advice_builds_indexes_and_clears_the_shape(db, table):
+    db.get_rows('t', filters=[('city', 'c1'), ('name__prefix', 'n')])
+    result, _ = db.get_index_advice(apply=True)
+    assert [created["status"] for created in result["created"]] == [201]
+    db.get_rows('t', filters=[('city', 'c1'), ('name__prefix', 'n')])
+    assert advice(db) == []
+
+
+def test_small_tables_get_covering_indexes(make_db):
+    db = make_db(index_advisor_max_covering_columns=4)
+    db.create_table('s', ['id INTEGER PRIMARY KEY', 'name TEXT', 'age INTEGER'])
+    db.get_rows('s', filters=[('age', '3')])
+    recommendation = advice(db)[0]
+    assert recommendation["columns"] == ['age', 'id', 'name']
+    assert recommendation["covering"] is True
@@ -0,0 +1,59 @@
+import re
+
+from notelab.utils.metrics import Counter, Histogram, MetricsRegistry
+
+
+def sample(text, name, **labels):
+    for line in text.splitlines():
+        if line.startswith(name + '{') or line.startswith(name + ' '):
+            if all(f'{key}="{value}"' in line for key, value in labels.items()):
+                return float(line.rsplit(' ', 1)[1])
+    return None
+
+
+def test_counter_renders_one_sample_per_label_set():
+    counter = Counter('rows_total', 'Rows.')
+    counter.inc(2, table='t')
+    counter.inc(table='t')
+    counter.inc(table='u"1')
+    lines = counter.render()
+    assert lines[:2] == ['# HELP rows_total Rows.', '# TYPE rows_total counter']
+    assert 'rows_total{table="t"} 3.0' in lines
+    assert 'rows_total{table="u\\"1"} 1.0' in lines
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram('latency_seconds', 'Latency.', buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 5.0):
+        histogram.observe(value, route='/r')
+    text = '\n'.join(histogram.render())
+    assert sample(text, 'latency_seconds_bucket', le='0.1') == 2
+    assert sample(text, 'latency_seconds_bucket', le='1.0') == 3
+    assert sample(text, 'latency_seconds_bucket', le='+Inf') == 4
+    assert sample(text, 'latency_seconds_count') == 4
+    assert sample(text, 'latency_seconds_sum') == 5.65
+
+
+def test_registry_reuses_metrics_and_reads_collectors_at_scrape_time():
+    registry = MetricsRegistry()
+    assert registry.counter('a_total', 'A.') is registry.counter('a_total', 'A.')
+    value = [1]
+    registry.add_collector(lambda: [('open', 'Open.', [({"pool": 'read'}, value[0])])])
+    value[0] = 7
+    text = registry.render()
+    assert '# TYPE open gauge' in text
+    assert sample(text, 'open', pool='read') == 7
+
+
+def test_metrics_endpoint(db, client):
+    db.create_table('t', ['id INTEGER PRIMARY KEY'])
+    db.insert_rows('t', [[1], [2]])
+    client.get('/api/db/t/rows')
+    response = client.get('/metrics')
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    # Routes are labelled by rule, not by path
+    assert re.search(r'^notelab_http_request_duration_seconds_count\{method="GET",route="[^"]*/<string:table_name>/rows",status="200"\} [1-9]\d*$', text, re.M)
+    assert sample(text, 'notelab_db_method_duration_seconds_count', method='get_rows') >= 1
+    assert sample(text, 'notelab_pool_max_size', pool='shared') == db.get_pool_stats()[0]["max_size"]
+    assert re.search(r'^notelab_sqlite_rows_fetched_total [1-9]', text, re.M)
@@ -0,0 +1,65 @@
+from notelab.db.utils import decode_cursor, encode_cursor
+
+
+def walk(db, table_name, limit, conditions=None):
+    pages, after = [], None
+    while True:
+        page, status = db.get_rows(table_name, conditions, limit=limit, after=after)
+        assert status == 200
+        pages.append(page["rows"])
+        after = page["next"]
+        if after is None:
+            return pages
+
+
+def test_cursor_round_trip():
+    for key in (0, 42, 'b/c+d', 1.5):
+        token = encode_cursor(key)
+        assert '=' not in token
+        assert decode_cursor(token) == key
+
+
+def test_pages_cover_the_table_in_key_order(db):
+    db.create_table('t', ['id INTEGER PRIMARY KEY', 'name TEXT'])
+    db.insert_rows('t', [[i, f'n{i}'] for i in range(1, 26)])
+    pages = walk(db, 't', 10)
+    assert [len(page) for page in pages] == [10, 10, 5]
+    assert [row["id"] for page in pages for row in page] == list(range(1, 26))
+
+
+def test_exact_multiple_has_no_empty_last_page(db):
+    db.create_table('t', ['id INTEGER PRIMARY KEY'])
+    db.insert_rows('t', [[i] for i in range(1, 21)])
+    assert [len(page) for page in walk(db, 't', 10)] == [10, 10]
+
+
+def test_text_primary_key_and_filters(db):
+    db.create_table('t', ['code TEXT PRIMARY KEY', 'kind TEXT'])
+    db.insert_rows('t', [[f'c{i:02d}', 'odd' if i % 2 else 'even'] for i in range(20)])
+    pages = walk(db, 't', 3, conditions=["kind = 'odd'"])
+    assert [row["code"] for page in pages for row in page] == [f'c{i:02d}' for i in range(1, 20, 2)]
+
+
+def test_composite_primary_key_pages_by_rowid(db):
+    db.create_table('t', ['a INTEGER', 'b INTEGER', 'PRIMARY KEY (a, b)'])
+    db.insert_rows('t', [[i % 3, i] for i in range(10)])
+    pages = walk(db, 't', 4)
+    assert [row["b"] for page in pages for row in page] == list(range(10))
+
+
+def test_invalid_pages_are_rejected(db):
+    db.create_table('t', ['id INTEGER PRIMARY KEY'])
+    assert db.get_rows('t', limit=0)[1] == 400
+    assert db.get_rows('t', limit=10, after='not a cursor')[1] == 400
+
+
+def test_rows_route_pages(db, client):
+    db.create_table('t', ['id INTEGER PRIMARY KEY'])
+    db.insert_rows('t', [[i] for i in range(1, 6)])
+    first = client.get('/api/db/t/rows?limit=3').get_json()
+    assert [row["id"] for row in first["rows"]] == [1, 2, 3]
+    second = client.get(f'/api/db/t/rows?limit=3&after={first["next"]}').get_json()
+    assert second == {"rows": [{"id": 4}, {"id": 5}], "next": None}
+    assert client.get('/api/db/t/rows?limit=many').status_code == 400
+    # Without limit or after the plain list is returned
+    assert len(client.get('/api/db/t/rows').get_json()) == 5
@@ -0,0 +1,46 @@
+import pyarrow as pa
+import pytest
+
+
+@pytest.fixture
+def table(db):
+    db.create_table('t', ['id INTEGER PRIMARY KEY', 'name TEXT', 'score REAL'])
+    db.insert_rows('t', [[1, 'a', 0.5], [2, None, 1.5], [3, 'c', None]])
+    return 't'
+
+
+def test_columnar_format(client, table):
+    for query, headers in (('?format=columnar', {}), ('', {'Accept': 'application/vnd.notelab.columnar+json'})):
+        response = client.get(f'/api/db/{table}{query}', headers=headers)
+        assert response.status_code == 200
+        assert response.get_json() == {"columns": ['id', 'name', 'score'],
+                                       "data": {"id": [1, 2, 3], "name": ['a', None, 'c'], "score": [0.5, 1.5, None]}}
+
+
+def test_arrow_format_is_typed_from_the_declared_schema(client, table):
+    response = client.get(f'/api/db/{table}', headers={'Accept': 'application/vnd.apache.arrow.stream'})
+    assert response.status_code == 200
+    arrow_table = pa.ipc.open_stream(response.get_data()).read_all()
+    assert arrow_table.schema.types == [pa.int64(), pa.string(), pa.float64()]
+    assert arrow_table.to_pydict() == {"id": [1, 2, 3], "name": ['a', None, 'c'], "score": [0.5, 1.5, None]}
+
+
+def test_filtered_rows_in_columnar_format(client, table):
+    response = client.get(f'/api/db/{table}/rows?format=columnar&name=c')
+    assert response.get_json()["data"]["id"] == [3]
+
+
+def test_unknown_format_is_406(client, table):
+    assert client.get(f'/api/db/{table}?format=xml').status_code == 406
+
+
+def test_admin_routes_do_not_shadow_tables(db, client):
+    for name in ('pool', 'cache', 'profile', 'slow_queries'):
+        db.create_table(name, ['id INTEGER PRIMARY KEY'])
+        db.insert_rows(name, [[1]])
+        assert client.get(f'/api/db/{name}').get_json() == [{"id": 1}]
+    assert client.get('/api/db/_admin/pool').get_json()["max_size"] > 0
+    assert "enabled" in client.get('/api/db/_admin/cache').get_json()
+    assert client.get('/api/db/_admin/profile').get_json()["name"] == 'default'
+    assert client.get('/api/db/_admin/slow_queries').status_code == 200
+    assert client.get('/api/db/_admin/indexes/advice').status_code == 200
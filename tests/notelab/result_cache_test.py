@@ -0,0 +1,67 @@
+from notelab.db.result_cache import ResultCache, estimate_size
+from notelab.db.table_versions import TableVersions
+
+
+def test_estimate_grows_with_the_result():
+    small = [{"id": i, "name": 'x' * 10} for i in range(10)]
+    large = [{"id": i, "name": 'x' * 10} for i in range(1000)]
+    assert estimate_size(large) > 50 * estimate_size(small) > 0
+
+
+def test_least_recently_used_entries_are_evicted():
+    value = list(range(100))
+    cache = ResultCache(max_bytes=estimate_size(value) * 2)
+    cache.put('a', 't', value, 0)
+    cache.put('b', 't', value, 0)
+    assert cache.get('a') == value
+    cache.put('c', 't', value, 0)
+    assert cache.get('b') is None
+    assert cache.get('a') == value
+    stats = cache.stats()
+    assert (stats["entries"], stats["evictions"], stats["hits"], stats["misses"]) == (2, 1, 2, 1)
+    assert stats["bytes"] <= stats["max_bytes"]
+
+
+def test_oversized_results_are_not_cached():
+    cache = ResultCache(max_bytes=100)
+    cache.put('a', 't', list(range(1000)), 0)
+    assert cache.get('a') is None
+
+
+def test_results_read_before_a_write_are_not_stored():
+    versions = TableVersions()
+    cache = ResultCache(versions=versions)
+    version = cache.version('t')
+    versions.bump('t')
+    cache.put('a', 't', [1], version)
+    assert cache.get('a') is None
+
+
+def test_invalidation_is_per_table():
+    cache = ResultCache()
+    cache.put('a', 't', [1], 0)
+    cache.put('b', 'u', [2], 0)
+    cache.invalidate('t')
+    assert cache.get('a') is None
+    assert cache.get('b') == [2]
+
+
+def test_handler_reads_are_cached_until_a_write(make_db):
+    db = make_db(result_cache_max_bytes=1024 * 1024)
+    db.create_table('t', ['id INTEGER PRIMARY KEY'])
+    db.insert_rows('t', [[1]])
+    assert db.get_rows('t', filters=[('id', '1')]) == ([{"id": 1}], 200)
+    assert db.get_rows('t', filters=[('id', '1')]) == ([{"id": 1}], 200)
+    assert db.get_cache_stats()[0]["hits"] == 1
+    db.insert_rows('t', [[2]])
+    assert db.get_rows('t') == ([{"id": 1}, {"id": 2}], 200)
+    # Errors are never cached
+    assert db.get_rows('missing')[1] == 404
+    assert db.get_rows('missing')[1] == 404
+    # The insert dropped the filtered read, only the full read is cached
+    assert db.get_cache_stats()[0]["entries"] == 1
+
+
+def test_cache_can_be_disabled(make_db):
+    db = make_db(result_cache_max_bytes=0)
+    assert db.get_cache_stats() == ({"enabled": False}, 200)
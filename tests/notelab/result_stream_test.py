@@ -0,0 +1,56 @@
+import json
+import sqlite3
+
+from notelab.db.result_stream import ResultStream, columnar
+
+
+def make_stream(rows, batch_size, on_close=None):
+    connection = sqlite3.connect(':memory:')
+    connection.execute("CREATE TABLE t (id INTEGER, name TEXT)")
+    connection.executemany("INSERT INTO t VALUES (?, ?)", rows)
+    return ResultStream(connection.execute("SELECT * FROM t"), batch_size, on_close=on_close)
+
+
+def test_batches_are_bounded_and_close_the_stream_once():
+    closed = []
+    stream = make_stream([(i, str(i)) for i in range(7)], 3, on_close=lambda: closed.append(True))
+    assert [len(batch) for batch in stream.batches()] == [3, 3, 1]
+    stream.close()
+    assert closed == [True]
+
+
+def test_rows_are_yielded_as_dictionaries():
+    stream = make_stream([(1, 'a'), (2, 'b')], 10)
+    assert list(stream) == [{"id": 1, "name": "a"}, {"id": 2, "name": "b"}]
+
+
+def test_columnar_layout():
+    assert columnar(['id', 'name'], [[(1, 'a')], [], [(2, 'b')]]) == {"columns": ['id', 'name'], "data": {"id": [1, 2], "name": ['a', 'b']}}
+    assert make_stream([], 10).to_columnar() == {"columns": ['id', 'name'], "data": {"id": [], "name": []}}
+
+
+def test_table_streams_as_ndjson_and_releases_its_connection(db, client):
+    db.create_table('t', ['id INTEGER PRIMARY KEY', 'name TEXT'])
+    db.insert_rows('t', [[i, f'n{i}'] for i in range(2500)])
+    for query, headers in (('?stream=1', {}), ('?format=ndjson', {}), ('', {'Accept': 'application/x-ndjson'})):
+        response = client.get(f'/api/db/t{query}', headers=headers)
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        lines = response.get_data(as_text=True).splitlines()
+        assert len(lines) == 2500
+        assert json.loads(lines[-1]) == {"id": 2499, "name": "n2499"}
+        response.close()
+    assert db.get_pool_stats()[0]["in_use"] == 0
+
+
+def test_filtered_rows_stream_as_ndjson(db, client):
+    db.create_table('t', ['id INTEGER PRIMARY KEY', 'name TEXT'])
+    db.insert_rows('t', [[i, 'even' if i % 2 == 0 else 'odd'] for i in range(10)])
+    response = client.get('/api/db/t/rows?stream=1&name=odd')
+    assert [json.loads(line)["id"] for line in response.get_data(as_text=True).splitlines()] == [1, 3, 5, 7, 9]
+    response.close()
+
+
+def test_streaming_a_missing_table_is_404(db, client):
+    assert client.get('/api/db/missing?stream=1').status_code == 404
+    assert db.get_pool_stats()[0]["in_use"] == 0
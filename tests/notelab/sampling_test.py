@@ -0,0 +1,104 @@
+import random
+import sqlite3
+from collections import Counter
+
+import pytest
+
+from notelab.db.filters import compile_filters
+from notelab.db.sampling import RowSampler
+from notelab.db.schema_catalog import TableInfo
+
+
+@pytest.fixture
+def connection():
+    connection = sqlite3.connect(':memory:')
+    connection.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, kind TEXT, value INTEGER)")
+    # Skewed strata: a holds most rows, b a few, c two and NULL one
+    rows = [(i, 'a', i % 10) for i in range(1, 2001)] + [(i, 'b', 1) for i in range(2001, 2011)]
+    rows += [(3001, 'c', 1), (3002, 'c', 2), (3003, None, 1)]
+    connection.executemany("INSERT INTO t VALUES (?, ?, ?)", rows)
+    return connection
+
+
+def sampler(connection, seed=1, filters=()):
+    table_info = TableInfo('t', connection.execute("PRAGMA table_info(t)").fetchall())
+    return RowSampler(connection.cursor(), 't', compile_filters(filters, table_info), random.Random(seed))
+
+
+def test_uniform_returns_distinct_matching_rows(connection):
+    sample = sampler(connection, filters=[('value', '3')]).uniform(50)
+    assert len({rowid for rowid, _ in sample}) == 50
+    assert all(row[2] == 3 for _, row in sample)
+    assert [rowid for rowid, _ in sample] == sorted(rowid for rowid, _ in sample)
+
+
+def test_uniform_is_repeatable_by_seed(connection):
+    assert sampler(connection, seed=5).uniform(20) == sampler(connection, seed=5).uniform(20)
+    assert sampler(connection, seed=5).uniform(20) != sampler(connection, seed=6).uniform(20)
+
+
+def test_uniform_larger_than_the_matches_returns_them_all(connection):
+    assert [rowid for rowid, _ in sampler(connection, filters=[('kind', 'b')]).uniform(100)] == list(range(2001, 2011))
+
+
+def test_bernoulli_includes_rows_at_the_fraction(connection):
+    sample = sampler(connection, filters=[('kind', 'a')]).bernoulli(0.1)
+    assert 120 < len(sample) < 280
+    assert len(sampler(connection).bernoulli(1.0)) == 2013
+
+
+def test_stratified_fills_every_stratum(connection):
+    strata = sampler(connection).stratified('kind', 5)
+    assert list(strata) == [None, 'a', 'b', 'c']
+    assert {stratum: len(rows) for stratum, rows in strata.items()} == {None: 1, 'a': 5, 'b': 5, 'c': 2}
+    for stratum, rows in strata.items():
+        assert all(row[1] == stratum for _, row in rows)
+        assert len({rowid for rowid, _ in rows}) == len(rows)
+
+
+def test_under_filled_strata_share_one_scan(connection):
+    statements = []
+    connection.set_trace_callback(statements.append)
+    sampler(connection).stratified('kind', 5)
+    scans = [sql for sql in statements if 'ORDER BY rowid' in sql]
+    assert len(scans) == 1
+    assert 'IN (' in scans[0] and 'IS NULL' in scans[0]
+
+
+def test_under_filled_strata_use_an_index_on_the_column(connection):
+    connection.execute("CREATE INDEX t_kind ON t (kind)")
+    statements = []
+    connection.set_trace_callback(statements.append)
+    sampler(connection).stratified('kind', 5)
+    connection.set_trace_callback(None)
+    # The traced statement has its values bound in
+    scan = next(sql for sql in statements if 'ORDER BY rowid' in sql)
+    assert any('t_kind' in row[3] for row in connection.execute(f"EXPLAIN QUERY PLAN {scan}"))
+
+
+def test_stratum_reservoirs_are_uniform(connection):
+    counts = Counter()
+    for seed in range(400):
+        reservoirs = sampler(connection, seed)._stratum_reservoirs(3, 'kind', ['b'])
+        counts.update(reservoirs['b'])
+    # 400 draws of 3 out of 10 rows: 120 picks per row on average
+    assert set(counts) == set(range(2001, 2011))
+    assert all(80 < count < 160 for count in counts.values())
+
+
+def test_stratified_respects_filters(connection):
+    strata = sampler(connection, filters=[('value', '1')]).stratified('kind', 3)
+    assert {stratum: len(rows) for stratum, rows in strata.items()} == {None: 1, 'a': 3, 'b': 3, 'c': 1}
+    assert all(row[2] == 1 for rows in strata.values() for _, row in rows)
+
+
+def test_sample_rows_endpoint(client, db):
+    db.create_table('t', ['id INTEGER PRIMARY KEY', 'kind TEXT'])
+    db.insert_rows('t', [[i, 'a' if i % 4 else 'b'] for i in range(1, 101)])
+    response = client.get('/api/db/t/rows/sample?method=stratified&by=kind&n=4&seed=9')
+    assert response.status_code == 200
+    assert response.json["strata"] == [{"value": 'a', "rows": 4}, {"value": 'b', "rows": 4}]
+    assert client.get('/api/db/t/rows/sample?method=stratified&by=kind&n=4&seed=9').json == response.json
+    assert client.get('/api/db/t/rows/sample?method=stratified&by=missing&n=4').status_code == 400
+    assert client.get('/api/db/t/rows/sample?method=bernoulli&fraction=2').status_code == 400
+    assert client.get('/api/db/t/rows/sample?n=x').status_code == 400
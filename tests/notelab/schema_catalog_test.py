@@ -0,0 +1,66 @@
+import sqlite3
+
+from notelab.db.schema_catalog import SchemaCatalog
+
+
+class CountingCursor(sqlite3.Cursor):
+    statements = []
+
+    def execute(self, sql, parameters=()):
+        self.statements.append(sql)
+        return super().execute(sql, parameters)
+
+
+def open_cursor(db_path):
+    CountingCursor.statements = []
+    return sqlite3.connect(db_path).cursor(CountingCursor)
+
+
+def test_lookups_within_a_borrow_are_cached(db_path):
+    sqlite3.connect(db_path).execute("CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT)")
+    catalog = SchemaCatalog()
+    cursor = open_cursor(db_path)
+    info = catalog.get(cursor, 't')
+    assert info.columns == ['id', 'name']
+    assert info.primary_key == 'id'
+    queries = len(cursor.statements)
+    assert catalog.get(cursor, 't') is info
+    assert len(cursor.statements) == queries
+
+
+def test_missing_tables_are_cached_as_none(db_path):
+    catalog = SchemaCatalog()
+    cursor = open_cursor(db_path)
+    assert catalog.get(cursor, 'missing') is None
+    assert catalog.get(cursor, 'missing') is None
+    assert sum('sqlite_master' in sql for sql in cursor.statements) == 1
+
+
+def test_ddl_from_another_connection_is_seen_on_the_next_borrow(db_path):
+    other = sqlite3.connect(db_path)
+    other.execute("CREATE TABLE t (id INTEGER)")
+    catalog = SchemaCatalog()
+    assert catalog.get(open_cursor(db_path), 't').columns == ['id']
+
+    other.execute("ALTER TABLE t ADD COLUMN added TEXT")
+    other.commit()
+    assert catalog.get(open_cursor(db_path), 't').columns == ['id', 'added']
+
+
+def test_invalidate_forgets_a_table(db_path):
+    connection = sqlite3.connect(db_path)
+    catalog = SchemaCatalog()
+    cursor = connection.cursor()
+    assert catalog.get(cursor, 't') is None
+    connection.execute("CREATE TABLE t (id INTEGER)")
+    catalog.invalidate('t')
+    assert catalog.get(cursor, 't').columns == ['id']
+
+
+def test_handler_serves_schema_changed_by_another_process(db, db_path):
+    db.create_table('t', ['id INTEGER PRIMARY KEY'])
+    assert [column[1] for column in db.get_table_schema('t')[0]] == ['id']
+    with sqlite3.connect(db_path) as other:
+        other.execute("ALTER TABLE t ADD COLUMN name TEXT")
+    assert [column[1] for column in db.get_table_schema('t')[0]] == ['id', 'name']
+    assert db.insert_rows('t', [[1, 'a']])[1] == 201
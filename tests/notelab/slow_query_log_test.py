@@ -0,0 +1,97 @@
+import logging
+import sqlite3
+
+from notelab.db.slow_query_log import SlowQueryLog, normalize_sql, parameter_shape
+
+
+def make_log(threshold_ms=0.0, max_shapes=1000):
+    return SlowQueryLog(threshold_ms, max_shapes, logger=logging.getLogger('slow_query_log_test'))
+
+
+def test_normalize_sql_groups_statements_by_shape():
+    assert normalize_sql("SELECT * FROM t WHERE a = 'x''y' AND b = 12.5") == "SELECT * FROM t WHERE a = ? AND b = ?"
+    assert normalize_sql("SELECT * FROM t WHERE id IN (?, ?, ?)") == normalize_sql("SELECT * FROM t WHERE id IN (?)")
+    assert normalize_sql("INSERT INTO t VALUES (1, 2), (3, 4)\n, (5, 6)") == "INSERT INTO t VALUES (?...), ..."
+    assert normalize_sql("SELECT col1 FROM t2 WHERE c = :name") == "SELECT col1 FROM t2 WHERE c = ?"
+
+
+def test_parameter_shape_keeps_types_only():
+    assert parameter_shape(None) is None
+    assert parameter_shape([1, 'secret', None]) == ['int', 'str', 'NoneType']
+    assert parameter_shape({'name': 'secret'}) == {'name': 'str'}
+
+
+def test_record_ignores_queries_under_the_threshold():
+    log = make_log(threshold_ms=1000)
+    log.record(sqlite3.connect(':memory:'), "SELECT 1", [], 0.5, 1)
+    assert log.top() == []
+
+
+def test_record_aggregates_shapes_and_keeps_the_slowest_plan():
+    connection = sqlite3.connect(':memory:')
+    connection.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT)")
+    log = make_log()
+    log.record(connection, "SELECT * FROM t WHERE name = ?", ['a'], 0.2, 3)
+    log.record(connection, "SELECT * FROM t WHERE name = ?", ['b'], 0.4, 1)
+    log.record(connection, "SELECT 1", [], 0.1, 1)
+
+    top = log.top()
+    assert [entry["sql"] for entry in top] == ["SELECT * FROM t WHERE name = ?", "SELECT ?"]
+    entry = top[0]
+    assert entry["count"] == 2
+    assert entry["max_seconds"] == 0.4
+    assert entry["max_rows"] == 3
+    assert abs(entry["mean_seconds"] - 0.3) < 1e-9
+    assert entry["params"] == ['str']
+    assert any('SCAN' in step["detail"] for step in entry["plan"])
+    assert log.top(limit=1) == top[:1]
+
+
+def test_explain_skips_executemany_and_unexplainable_statements():
+    connection = sqlite3.connect(':memory:')
+    log = make_log()
+    assert log.explain(connection, "INSERT INTO t VALUES (?)", None) is None
+    assert log.explain(connection, "PRAGMA table_info(t)", []) is None
+    assert log.explain(connection, "SELECT * FROM missing", []) is None
+
+
+def test_full_log_forgets_the_fastest_shape():
+    connection = sqlite3.connect(':memory:')
+    log = make_log(max_shapes=2)
+    log.record(connection, "SELECT 1", [], 0.3, 1)
+    log.record(connection, "SELECT 1 + 1", [], 0.1, 1)
+    log.record(connection, "SELECT 1 + 1 + 1", [], 0.2, 1)
+    assert [entry["sql"] for entry in log.top()] == ["SELECT ?", "SELECT ? + ? + ?"]
+
+
+def test_handler_reports_slow_queries(make_db):
+    db = make_db(slow_query_ms=1e-6)
+    db.create_table('notes', ['id INTEGER PRIMARY KEY', 'title TEXT'])
+    db.insert_rows('notes', [{'id': 1, 'title': 'a'}])
+    db.get_rows('notes')
+
+    result, status = db.get_slow_queries()
+    assert status == 200
+    assert result["enabled"] is True
+    assert result["threshold_ms"] == 1e-6
+    assert any(entry["sql"].startswith("SELECT") and "notes" in entry["sql"] for entry in result["queries"])
+
+
+def test_handler_reports_disabled_log(db):
+    assert db.get_slow_queries() == ({"enabled": False}, 200)
+
+
+def test_slow_queries_endpoint(make_db, monkeypatch):
+    from notelab.app.app import app
+    from notelab.app.routes import db_routes
+    db = make_db(slow_query_ms=1e-6)
+    monkeypatch.setattr(db_routes, 'db', db)
+    db.create_table('notes', ['id INTEGER PRIMARY KEY', 'title TEXT'])
+    db.get_rows('notes')
+    client = app.test_client()
+    client.environ_base['HTTP_X_FORWARDED_PROTO'] = 'https'
+
+    response = client.get('/api/db/_admin/slow_queries?limit=1')
+    assert response.status_code == 200
+    assert response.json["enabled"] is True
+    assert len(response.json["queries"]) == 1
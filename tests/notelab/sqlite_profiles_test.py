@@ -0,0 +1,97 @@
+import sqlite3
+
+import pytest
+
+from notelab.db.sqlite_profiles import PROFILES, SETTINGS, resolve_profile
+
+
+def pragma(connection, name):
+    return connection.execute(f"PRAGMA {name}").fetchone()[0]
+
+
+def test_every_profile_defines_every_setting():
+    for name, settings in PROFILES.items():
+        assert set(settings) == set(SETTINGS), name
+        assert resolve_profile(name).settings == {setting: settings[setting] for setting in SETTINGS}
+
+
+def test_resolve_profile_normalizes_names_and_applies_overrides():
+    profile = resolve_profile('Read-Heavy', {'cache_size': '-1000', 'synchronous': 'full', 'mmap_size': '', 'busy_timeout': None})
+    assert profile.name == 'read_heavy'
+    assert profile.settings['cache_size'] == -1000
+    assert profile.settings['synchronous'] == 'FULL'
+    assert profile.settings['mmap_size'] == PROFILES['read_heavy']['mmap_size']
+    assert profile.overridden == ['cache_size', 'synchronous']
+    assert resolve_profile(None).name == 'default'
+
+
+@pytest.mark.parametrize('name, overrides', [
+    ('fastest', None),
+    ('default', {'page_size': 4096}),
+    ('default', {'journal_mode': 'sideways'}),
+    ('default', {'cache_size': 'lots'}),
+])
+def test_resolve_profile_rejects_invalid_settings(name, overrides):
+    with pytest.raises(ValueError):
+        resolve_profile(name, overrides)
+
+
+def test_statement_cache_size_defaults_when_unset():
+    assert resolve_profile('low_memory').statement_cache_size == 32
+    assert resolve_profile('default', {'statement_cache_size': None}).statement_cache_size == 256
+
+
+def test_apply_sets_the_pragmas(tmp_path):
+    connection = sqlite3.connect(tmp_path / 'a.db')
+    assert resolve_profile('ingest').apply(connection) == {}
+    assert pragma(connection, 'journal_mode') == 'wal'
+    assert pragma(connection, 'synchronous') == 1
+    assert pragma(connection, 'cache_size') == -128 * 1024
+    assert pragma(connection, 'temp_store') == 2
+    assert pragma(connection, 'busy_timeout') == 30000
+
+
+def test_apply_on_a_read_only_connection_leaves_journal_and_synchronous(tmp_path):
+    path = tmp_path / 'a.db'
+    sqlite3.connect(path).execute("CREATE TABLE t (id INTEGER)")
+    connection = sqlite3.connect(f"{path.as_uri()}?mode=ro", uri=True)
+    synchronous = pragma(connection, 'synchronous')
+    assert resolve_profile('read_heavy').apply(connection, read_only=True) == {}
+    assert pragma(connection, 'journal_mode') == 'delete'
+    assert pragma(connection, 'synchronous') == synchronous
+    assert pragma(connection, 'temp_store') == 2
+
+
+def test_apply_reports_a_journal_mode_it_cannot_set(tmp_path):
+    path = tmp_path / 'a.db'
+    holder = sqlite3.connect(path)
+    holder.execute("CREATE TABLE t (id INTEGER)")
+    holder.execute("BEGIN EXCLUSIVE")
+    connection = sqlite3.connect(path, timeout=0)
+    failed = resolve_profile('default', {'busy_timeout': 0}).apply(connection, journal_mode='WAL')
+    assert 'journal_mode' in failed
+    holder.rollback()
+
+
+def test_handler_applies_the_configured_profile(make_db):
+    db = make_db(db_profile='low_memory', db_profile_overrides={'cache_size': '-512'})
+    profile, status = db.get_profile()
+    assert status == 200
+    assert (profile["name"], profile["overridden"], profile["mode"]) == ('low_memory', ['cache_size'], 'shared')
+    assert profile["effective"]["cache_size"] == -512
+    assert profile["effective"]["journal_mode"] == 'delete'
+    assert profile["effective"]["temp_store"] == 1
+
+
+def test_wal_writer_keeps_wal_whatever_the_profile(make_db):
+    db = make_db(db_profile='low_memory', db_concurrency_mode='wal')
+    profile, _ = db.get_profile()
+    assert profile["mode"] == 'wal'
+    assert profile["effective"]["journal_mode"] == 'wal'
+
+
+def test_profile_endpoint(client):
+    response = client.get('/api/db/_admin/profile')
+    assert response.status_code == 200
+    assert response.json["name"] == 'default'
+    assert set(response.json["effective"]) == {'journal_mode', 'synchronous', 'mmap_size', 'cache_size', 'temp_store', 'busy_timeout'}
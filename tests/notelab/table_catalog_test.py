@@ -0,0 +1,40 @@
+import sqlite3
+
+
+def test_catalog_returns_metadata_without_rows(db):
+    db.create_table('t', ['id INTEGER PRIMARY KEY', 'name TEXT'])
+    db.insert_rows('t', [[i, str(i)] for i in range(1, 11)])
+    tables, status = db.get_tables()
+    assert status == 200
+    table = tables["tables"]["t"]
+    assert table["columns"] == ['id', 'name']
+    assert table["types"] == ['INTEGER', 'TEXT']
+    assert table["primary_key"] == ['id']
+    assert "rows" not in table
+
+
+def test_row_count_comes_from_analyze_and_max_rowid_is_only_a_bound(db, db_path):
+    db.create_table('t', ['id INTEGER PRIMARY KEY', 'name TEXT'])
+    db.insert_rows('t', [[i, str(i)] for i in range(1, 11)])
+    db.delete_rows('t', ['id <= 4'])
+    table = db.get_tables()[0]["tables"]["t"]
+    assert table["row_count"] is None
+    assert table["row_count_upper_bound"] == 10
+
+    with sqlite3.connect(db_path) as connection:
+        connection.execute("ANALYZE")
+    assert db.get_tables()[0]["tables"]["t"]["row_count"] == 6
+
+
+def test_without_rowid_tables_have_no_upper_bound(db, db_path):
+    with sqlite3.connect(db_path) as connection:
+        connection.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT) WITHOUT ROWID")
+    assert db.get_tables()[0]["tables"]["t"]["row_count_upper_bound"] is None
+
+
+def test_include_rows(db, client):
+    db.create_table('t', ['id INTEGER PRIMARY KEY', 'name TEXT'])
+    db.insert_rows('t', [[1, 'a'], [2, 'b']])
+    assert client.get('/api/db/tables?include=rows').get_json()["tables"]["t"]["rows"] == [[1, 'a'], [2, 'b']]
+    columnar = client.get('/api/db/tables?include=rows&format=columnar').get_json()["tables"]["t"]
+    assert columnar["data"] == {"id": [1, 2], "name": ['a', 'b']}
@@ -0,0 +1,80 @@
+import sqlite3
+
+from notelab.db.table_versions import TableVersions
+
+
+def test_versions_only_grow_per_table():
+    versions = TableVersions()
+    assert versions.get('t') == 0
+    versions.bump('t')
+    assert (versions.get('t'), versions.get('u')) == (1, 0)
+
+
+def test_etags_depend_on_table_version_and_query():
+    versions = TableVersions()
+    tag = versions.etag('t', 'rows')
+    assert versions.etag('t', 'rows') == tag
+    assert versions.etag('t', 'table') != tag
+    assert versions.etag('u', 'rows') != tag
+    versions.bump('t')
+    assert versions.etag('t', 'rows') != tag
+    assert TableVersions().etag('t', 'rows') != versions.etag('t', 'rows')
+
+
+def test_commits_by_other_connections_advance_every_version(db_path):
+    versions = TableVersions(db_path)
+    before = versions.get('t')
+    assert versions.get('t') == before
+    with sqlite3.connect(db_path) as connection:
+        connection.execute("CREATE TABLE u (id INTEGER)")
+    assert versions.get('t') > before
+    versions.close()
+
+
+def test_watcher_does_not_block_writers(db_path):
+    versions = TableVersions(db_path)
+    versions.get('t')
+    connection = sqlite3.connect(db_path, timeout=0)
+    connection.execute("CREATE TABLE u (id INTEGER)")
+    connection.execute("INSERT INTO u VALUES (1)")
+    connection.commit()
+    connection.close()
+    versions.close()
+
+
+def test_conditional_get(db, client):
+    db.create_table('t', ['id INTEGER PRIMARY KEY'])
+    db.insert_rows('t', [[1]])
+    response = client.get('/api/db/t/rows')
+    etag = response.headers['ETag']
+    assert client.get('/api/db/t/rows', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get('/api/db/t/rows?id=1', headers={'If-None-Match': etag}).status_code == 200
+    db.insert_rows('t', [[2]])
+    assert client.get('/api/db/t/rows', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_external_writes_are_seen_when_enabled(make_db, db_path, monkeypatch):
+    db = make_db(db_external_writers=True)
+    db.create_table('t', ['id INTEGER PRIMARY KEY'])
+    db.insert_rows('t', [[1]])
+    etag = db.table_etag('t', 'rows')
+    assert db.get_rows('t') == ([{"id": 1}], 200)
+    with sqlite3.connect(db_path) as connection:
+        connection.execute("INSERT INTO t VALUES (2)")
+    assert db.table_etag('t', 'rows') != etag
+    assert db.get_rows('t') == ([{"id": 1}, {"id": 2}], 200)
+
+
+def test_watcher_opens_paths_with_uri_characters(tmp_path):
+    directory = tmp_path / 'a#b?c%d'
+    directory.mkdir()
+    path = directory / 'x.db'
+    sqlite3.connect(path).close()
+    versions = TableVersions(str(path))
+    before = versions.get('t')
+    assert versions.get('t') == before
+    with sqlite3.connect(path) as connection:
+        connection.execute("CREATE TABLE t (id INTEGER)")
+    assert versions.get('t') > before
+    versions.close()
+    assert sorted(item.name for item in tmp_path.iterdir()) == ['a#b?c%d']
@@ -0,0 +1,66 @@
+import pytest
+
+
+@pytest.fixture
+def table(db):
+    db.create_table('t', ['id INTEGER PRIMARY KEY', 'name TEXT', 'score REAL'])
+    db.insert_rows('t', [[1, 'a', 1.0], [2, 'b', 2.0], [3, 'c', 3.0]])
+    return 't'
+
+
+def rows(db, table_name='t'):
+    return db.get_rows(table_name)[0]
+
+
+def test_partial_and_full_rows(db, table):
+    report, status = db.update_rows('t', [{"id": 1, "score": 10.0}, [2, 'B', 2.0], {"id": 9, "name": 'x'}])
+    assert status == 200
+    assert (report["rows"], report["matched"], report["changed"], report["inserted"], report["rejected"]) == (3, 2, 2, 0, 0)
+    assert rows(db) == [{"id": 1, "name": 'a', "score": 10.0}, {"id": 2, "name": 'B', "score": 2.0}, {"id": 3, "name": 'c', "score": 3.0}]
+
+
+def test_unchanged_rows_are_not_written(db, table):
+    report, _ = db.update_rows('t', [[1, 'a', 1.0], {"id": 2, "score": 2}])
+    assert (report["matched"], report["changed"]) == (2, 0)
+
+
+def test_upsert_inserts_unmatched_rows_and_last_row_wins(db, table):
+    report, _ = db.update_rows('t', [{"id": 3, "name": 'first'}, {"id": 3, "name": 'last'}, {"id": 4, "name": 'd'}], upsert=True)
+    assert (report["changed"], report["inserted"]) == (1, 1)
+    assert rows(db)[2:] == [{"id": 3, "name": 'last', "score": 3.0}, {"id": 4, "name": 'd', "score": None}]
+
+
+def test_invalid_rows_are_rejected(db, table):
+    report, status = db.update_rows('t', [{"id": 1, "missing": 1}, {"name": 'no key'}, [1, 'short']])
+    assert status == 200
+    assert report["rejected"] == 3
+    assert report["changed"] == 0
+
+
+def test_tables_without_primary_key_match_on_rowid(db):
+    db.create_table('n', ['name TEXT', 'score REAL'])
+    db.insert_rows('n', [['a', 1.0], ['b', 2.0]])
+    report, _ = db.update_rows('n', [{"rowid": 2, "score": 5.0}, ['a', 9.0]])
+    assert (report["changed"], report["rejected"]) == (1, 1)
+    assert rows(db, 'n') == [{"name": 'a', "score": 1.0}, {"name": 'b', "score": 5.0}]
+
+
+def test_batches_are_reported(make_db):
+    db = make_db(update_batch_rows=2)
+    db.create_table('t', ['id INTEGER PRIMARY KEY', 'name TEXT'])
+    report, _ = db.update_rows('t', [{"id": i, "name": str(i)} for i in range(5)], upsert=True)
+    assert [batch["inserted"] for batch in report["batches"]] == [2, 2, 1]
+
+
+def test_put_route(db, table, client):
+    response = client.put('/api/db/t/rows', json={"rows": [{"id": 5, "name": 'e'}], "upsert": True})
+    assert response.status_code == 200
+    assert response.get_json()["inserted"] == 1
+    assert client.put('/api/db/t/rows', data='rows').status_code == 400
+
+
+def test_concurrent_updates_queue_for_the_write_lock(db, table):
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(lambda i: db.update_rows('t', [{"id": 1 + i % 3, "score": float(i)}]), range(40)))
+    assert [status for _, status in results] == [200] * 40
@@ -0,0 +1,55 @@
+import sqlite3
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def wal_db(make_db):
+    db = make_db(db_concurrency_mode='wal', db_pool_size=4)
+    db.create_table('t', ['id INTEGER PRIMARY KEY', 'name TEXT'])
+    db.insert_rows('t', [[1, 'a']])
+    return db
+
+
+def test_database_is_switched_to_wal(wal_db, db_path):
+    with sqlite3.connect(db_path) as connection:
+        assert connection.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+    stats = wal_db.get_pool_stats()[0]
+    assert stats["writer"]["max_size"] == 1
+
+
+def test_reads_run_on_read_only_connections(wal_db, db_path):
+    wal_db.connection_handler.connect(db_path)
+    try:
+        with pytest.raises(sqlite3.OperationalError, match='readonly'):
+            wal_db.connection_handler.cursor.execute("INSERT INTO t VALUES (2, 'b')")
+    finally:
+        wal_db.connection_handler.disconnect()
+
+
+def test_readers_see_the_last_commit_while_a_write_is_open(wal_db, db_path):
+    writer = sqlite3.connect(db_path, timeout=0)
+    writer.execute("BEGIN IMMEDIATE")
+    writer.execute("INSERT INTO t VALUES (2, 'b')")
+    try:
+        # Shared-mode readers would wait on the lock; WAL readers read their snapshot
+        result = []
+        reader = threading.Thread(target=lambda: result.append(wal_db.get_rows('t', filters=[('id__ge', '1')])))
+        reader.start()
+        reader.join(5)
+        assert result == [([{"id": 1, "name": 'a'}], 200)]
+    finally:
+        writer.rollback()
+        writer.close()
+
+
+def test_writes_nested_in_reads_borrow_the_writer(wal_db):
+    # get_index_advice reads, then builds indexes with apply=True
+    wal_db.get_rows('t', filters=[('name', 'a')])
+    result, status = wal_db.get_index_advice(apply=True)
+    assert status == 200
+    assert [created["status"] for created in result["created"]] == [201]
+    stats = wal_db.get_pool_stats()[0]
+    assert stats["in_use"] == 0
+    assert stats["writer"]["in_use"] == 0
@@ -0,0 +1,77 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from notelab.db.write_queue import WriteQueue
+
+
+class RecordingFlush:
+
+    def __init__(self, fail: bool = False):
+        self.groups = []
+        self.fail = fail
+
+    def __call__(self, batches):
+        self.groups.append(batches)
+        if self.fail:
+            raise RuntimeError("disk full")
+        return [("ok", 201) for _ in batches], 200
+
+
+def test_concurrent_writes_share_a_commit():
+    flush = RecordingFlush()
+    write_queue = WriteQueue(flush, max_delay_ms=200, max_rows=1000)
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(lambda i: write_queue.submit('t', [[i]]).result(), range(8)))
+    write_queue.close()
+    assert results == [("ok", 201)] * 8
+    assert sum(len(group) for group in flush.groups) == 8
+    assert len(flush.groups) < 8
+    stats = write_queue.stats()
+    assert (stats["writes"], stats["rows"], stats["commits"]) == (8, 8, len(flush.groups))
+
+
+def test_a_full_group_commits_without_waiting():
+    flush = RecordingFlush()
+    write_queue = WriteQueue(flush, max_delay_ms=60000, max_rows=2)
+    futures = [write_queue.submit('t', [[1], [2]]), write_queue.submit('t', [[3], [4]])]
+    assert [future.result(timeout=5) for future in futures] == [("ok", 201)] * 2
+    write_queue.close()
+
+
+def test_close_commits_queued_writes_and_rejects_new_ones():
+    flush = RecordingFlush()
+    write_queue = WriteQueue(flush, max_delay_ms=60000)
+    future = write_queue.submit('t', [[1]])
+    write_queue.close()
+    assert future.result(timeout=0) == ("ok", 201)
+    with pytest.raises(RuntimeError):
+        write_queue.submit('t', [[2]])
+
+
+def test_a_failed_flush_fails_every_write_of_the_group():
+    write_queue = WriteQueue(RecordingFlush(fail=True), max_delay_ms=1)
+    assert write_queue.submit('t', [[1]]).result(timeout=5) == ("disk full", 500)
+    write_queue.close()
+    assert write_queue.stats()["failed_commits"] == 1
+
+
+def test_queued_inserts_through_the_handler(make_db):
+    db = make_db(write_queue_enabled=True, write_queue_max_delay_ms=50)
+    db.create_table('t', ['id INTEGER PRIMARY KEY', 'name TEXT'])
+    barrier = threading.Barrier(6)
+
+    def insert(i):
+        barrier.wait()
+        # A row of the wrong length fails its own batch only
+        return db.insert_rows('t', [[i, str(i)]] if i else [[i]])
+
+    with ThreadPoolExecutor(6) as executor:
+        statuses = [status for _, status in executor.map(insert, range(6))]
+    assert statuses[0] != 201
+    assert statuses[1:] == [201] * 5
+    assert [row["id"] for row in db.get_rows('t')[0]] == [1, 2, 3, 4, 5]
+    stats = db.get_pool_stats()[0]["write_queue"]
+    assert stats["writes"] == 6
+    assert stats["commits"] < 6